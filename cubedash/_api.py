@@ -1,5 +1,4 @@
 import logging
-from datetime import date, datetime
 
 import flask
 from dateutil import tz
@@ -8,12 +7,14 @@ from flask import Blueprint, abort, request
 from cubedash import _utils
 
 from . import _model
-from ._utils import as_geojson, as_json
+from ._utils import as_encoded, as_geojson
 from .summary import ItemSort
 
 _LOG = logging.getLogger(__name__)
 bp = Blueprint("api", __name__, url_prefix="/api")
 
+MAX_TILE_ZOOM = 24
+
 
 @bp.route("/datasets/<product_name>")
 @bp.route("/datasets/<product_name>/<int:year>")
@@ -70,12 +71,32 @@ def datasets_geojson(
 @bp.route("/footprint/<product_name>/<int:year>")
 @bp.route("/footprint/<product_name>/<int:year>/<int:month>")
 @bp.route("/footprint/<product_name>/<int:year>/<int:month>/<int:day>")
+@_model.conditional_on_summaries()
 def footprint_geojson(
     product_name: str, year: int = None, month: int = None, day: int = None
 ):
-    return as_geojson(
-        _model.get_footprint_geojson(product_name, year, month, day),
+    """
+    The footprint of the time period.
+
+    Give a map ``zoom`` level or a ``resolution`` (in metres per pixel) to get only
+    as much detail as it needs.
+    """
+    resolution = request.args.get("resolution", type=float)
+    zoom = request.args.get("zoom", type=int)
+    if resolution is None and zoom is not None:
+        resolution = _utils.zoom_resolution(zoom)
+    resolution = _model.footprint_level_resolution(
+        product_name, year, month, day, resolution
+    )
+    footprint = _model.get_footprint_body(product_name, year, month, day, resolution)
+    if footprint is None:
+        return as_geojson(
+            None, downloadable_filename_prefix=_utils.api_path_as_filename_prefix()
+        )
+    return as_encoded(
+        footprint,
         downloadable_filename_prefix=_utils.api_path_as_filename_prefix(),
+        filename_suffix=".geojson",
     )
 
 
@@ -83,39 +104,69 @@ def footprint_geojson(
 @bp.route("/regions/<product_name>/<int:year>")
 @bp.route("/regions/<product_name>/<int:year>/<int:month>")
 @bp.route("/regions/<product_name>/<int:year>/<int:month>/<int:day>")
+@_model.conditional_on_summaries()
 def regions_geojson(
     product_name: str, year: int = None, month: int = None, day: int = None
 ):
-    regions = _model.get_regions_geojson(product_name, year, month, day)
+    regions = _model.get_regions_body(product_name, year, month, day)
     if regions is None:
         abort(404, f"{product_name} does not have regions")
-    return as_geojson(
-        regions, downloadable_filename_prefix=_utils.api_path_as_filename_prefix()
+    return as_encoded(
+        regions,
+        downloadable_filename_prefix=_utils.api_path_as_filename_prefix(),
+        filename_suffix=".geojson",
     )
 
 
+@bp.route("/tiles/<product_name>/<layer>/<int:z>/<int:x>/<int:y>.mvt")
+@_model.conditional_on_summaries()
+def product_tile(product_name: str, layer: str, z: int, x: int, y: int):
+    """
+    A Mapbox Vector Tile of the product's "regions", "footprint" or "datasets".
+
+    Optionally for a time period, with ``year``, ``month`` and ``day`` arguments.
+    """
+    if not (0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z):
+        abort(404, f"Tile {z}/{x}/{y} is out of range")
+    try:
+        _model.STORE.get_dataset_type(product_name)
+    except KeyError:
+        abort(404, f"Unknown product {product_name!r}")
+
+    try:
+        tile = _model.get_tile(
+            product_name,
+            layer,
+            z,
+            x,
+            y,
+            year=request.args.get("year", type=int),
+            month=request.args.get("month", type=int),
+            day=request.args.get("day", type=int),
+            limit=flask.current_app.config["CUBEDASH_HARD_API_LIMIT"],
+        )
+    except ValueError as e:
+        abort(404, str(e))
+    if tile is None:
+        abort(404, f"Product {product_name!r} has not been summarised")
+    return flask.Response(tile, content_type="application/vnd.mapbox-vector-tile")
+
+
 @bp.route("/dataset-timeline/<product_name>")
 @bp.route("/dataset-timeline/<product_name>/<int:year>")
 @bp.route("/dataset-timeline/<product_name>/<int:year>/<int:month>")
 @bp.route("/dataset-timeline/<product_name>/<int:year>/<int:month>/<int:day>")
+@_model.conditional_on_summaries()
 def dataset_timeline(
     product_name: str, year: int = None, month: int = None, day: int = None
 ):
-    summary = _model.get_time_summary(product_name, year, month, day)
-    if summary is None:
+    timeline = _model.get_timeline_body(product_name, year, month, day)
+    if timeline is None:
         abort(
             404,
             f"No known information for product "
             f"{product_name!r} {year or 'all'} {month or 'all'} {day or 'all'}",
         )
-
-    def _datekey(k):
-        # The timezone is the global grouping timezone: we don't want it in json.
-        if type(k) is date:
-            k = datetime(k.year, k.month, k.day)
-        return k.replace(tzinfo=None).isoformat()
-
-    return as_json(
-        {_datekey(k): v for k, v in summary.timeline_dataset_counts.items()},
-        downloadable_filename_prefix=_utils.api_path_as_filename_prefix(),
+    return as_encoded(
+        timeline, downloadable_filename_prefix=_utils.api_path_as_filename_prefix()
     )
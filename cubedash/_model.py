@@ -1,15 +1,22 @@
+import functools
+import hashlib
+import inspect
 import json
 import os
+import threading
 import time
+from datetime import date, datetime
 from pathlib import Path
-from typing import Counter, Dict, List, Optional, Tuple
+from typing import Counter, Dict, List, Optional, Sequence, Tuple, cast
 
 import flask
+import orjson
 import sentry_sdk
 import structlog
 from datacube.index import index_connect
 from datacube.model import DatasetType
 from flask_caching import Cache
+from flask_caching.backends import NullCache
 from flask_cors import CORS
 from flask_themer import Themer
 
@@ -39,42 +46,82 @@ NAME = "cubedash"
 BASE_DIR = Path(__file__).parent.parent
 
 
-if os.getenv("SENTRY_DSN"):
-    sentry_sdk.init(
-        dsn=os.getenv("SENTRY_DSN"),
-        environment=(
-            os.getenv("SENTRY_ENV_TAG")
-            if os.getenv("SENTRY_ENV_TAG")
-            else "dev-explorer"
-        ),
-        integrations=[
-            FlaskIntegration(),
-        ],
-        # Set traces_sample_rate to 1.0 to capture 100%
-        # of transactions for performance monitoring.
-        # We recommend adjusting this value in production.
-        traces_sample_rate=1.0,
-        # By default the SDK will try to use the SENTRY_RELEASE
-        # environment variable, or infer a git commit
-        # SHA as release, however you may want to set
-        # something more human-readable.
-        # release="myapp@1.0.0",
-    )
+def _init_sentry():
+    if os.getenv("SENTRY_DSN"):
+        sentry_sdk.init(
+            dsn=os.getenv("SENTRY_DSN"),
+            environment=(
+                os.getenv("SENTRY_ENV_TAG")
+                if os.getenv("SENTRY_ENV_TAG")
+                else "dev-explorer"
+            ),
+            integrations=[
+                FlaskIntegration(),
+            ],
+            # Set traces_sample_rate to 1.0 to capture 100%
+            # of transactions for performance monitoring.
+            # We recommend adjusting this value in production.
+            traces_sample_rate=1.0,
+            # By default the SDK will try to use the SENTRY_RELEASE
+            # environment variable, or infer a git commit
+            # SHA as release, however you may want to set
+            # something more human-readable.
+            # release="myapp@1.0.0",
+        )
+
 
 cache = Cache()
 
 DEFAULT_GROUPING_TIMEZONE = DEFAULT_TIMEZONE
 
+
+class _LazySummaryStore:
+    """
+    The app's SummaryStore, connected to the datacube on first use.
+
+    So importing the app (such as in a gunicorn master before it forks) doesn't
+    read datacube config or create a connection pool.
+    """
+
+    def __init__(self) -> None:
+        self._store: Optional[SummaryStore] = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> SummaryStore:
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = SummaryStore.create(
+                        index_connect(application_name=NAME, validate_connection=False),
+                        grouping_time_zone=DEFAULT_TIMEZONE,
+                    )
+        return self._store
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
 # Thread and multiprocess safe.
-# As long as we don't run queries (ie. open db connections) before forking
-# (hence validate=False).
-STORE: SummaryStore = SummaryStore.create(
-    index_connect(application_name=NAME, validate_connection=False),
-    grouping_time_zone=DEFAULT_TIMEZONE,
-)
+# As long as we don't run queries (ie. open db connections) before forking, or
+# close them first (see `close_connections()`).
+STORE: SummaryStore = cast(SummaryStore, _LazySummaryStore())
+
+
+def close_connections():
+    """
+    Close the store's pooled database connections, if it has any.
+
+    Forked processes can't share them: call this before forking (such as after
+    warming caches in a gunicorn master). New ones are made when next used.
+    """
+    store = STORE._store if isinstance(STORE, _LazySummaryStore) else STORE
+    if store is not None:
+        store.close()
 
 
 def create_app(test_config=None):
+    _init_sentry()
     app = flask.Flask(NAME)
 
     # Also part of the fix from ^
@@ -178,18 +225,261 @@ def create_app(test_config=None):
 
 _LOG = structlog.get_logger()
 
+# Cached results are keyed on the version of their products' summaries, so they stay
+# valid until cubedash-gen changes them. This timeout only stops old versions from
+# lingering in the cache.
+VERSIONED_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def product_versions() -> Dict[str, Optional[datetime]]:
+    """
+    The current version of each product's summaries, by product name: the time
+    they were last generated.
+
+    (see `SummaryStore.get_product_versions()`. Loaded once per request.)
+    """
+    if not flask.has_app_context():
+        return STORE.get_product_versions()
+    if "product_versions" not in flask.g:
+        flask.g.product_versions = STORE.get_product_versions()
+    return flask.g.product_versions
+
+
+def all_products_version() -> str:
+    """
+    A version string for the summaries of all products together.
+    """
+    return hashlib.sha1(
+        repr(sorted(product_versions().items())).encode("utf-8")
+    ).hexdigest()
+
+
+def _is_caching() -> bool:
+    return flask.has_app_context() and not isinstance(cache.cache, NullCache)
+
+
+def _versioned_memoize(per_product: bool = True):
+    """
+    Memoize a function until its product's summaries change.
+
+    The function's first argument must be the product name, unless it isn't
+    `per_product`, in which case it's cached until any product changes.
+
+    With a shared cache backend (such as ``CACHE_TYPE="FileSystemCache"``) all
+    workers will share each result.
+    """
+
+    def decorate(f):
+        signature = inspect.signature(f)
+
+        def cached(version: str, *args):
+            return f(*args)
+
+        # Each function needs its own namespace in the cache.
+        cached.__module__ = f.__module__
+        cached.__name__, cached.__qualname__ = f.__name__, f.__qualname__
+        cached = cache.memoize(timeout=VERSIONED_CACHE_TIMEOUT)(cached)
+
+        def versioned_args(args, kwargs) -> tuple:
+            # Give the cache the same key, however the arguments were passed.
+            call = signature.bind(*args, **kwargs)
+            call.apply_defaults()
+            if per_product:
+                version = product_versions().get(call.args[0], "-")
+            else:
+                version = all_products_version()
+            return (version, *call.args)
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            # Don't bother looking up versions when nothing will be cached.
+            if not _is_caching():
+                return f(*args, **kwargs)
+            return cached(*versioned_args(args, kwargs))
+
+        def prime(result, *args, **kwargs):
+            """Cache an already-known result for the given arguments."""
+            if not _is_caching():
+                return
+            cache.set(
+                cached.make_cache_key(cached.uncached, *versioned_args(args, kwargs)),
+                result,
+                timeout=VERSIONED_CACHE_TIMEOUT,
+            )
+
+        wrapper.prime = prime
+        return wrapper
+
+    return decorate
+
+
+def versioned_body(per_product: bool = True, content_type: str = "application/json"):
+    """
+    Memoize a function's json-able result as a response body, pre-compressed for
+    each content-encoding, until its product's summaries change.
+
+    (see `_versioned_memoize()`. Use `utils.as_encoded()` to return the body.)
+    """
+
+    def decorate(f):
+        @_versioned_memoize(per_product)
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs) -> Optional[utils.EncodedBody]:
+            result = f(*args, **kwargs)
+            if result is None:
+                return None
+            # Only compress what will be cached, rather than on every request.
+            return utils.EncodedBody.of_json(
+                result, content_type=content_type, compress=_is_caching()
+            )
 
-@cache.memoize(timeout=60)
+        return wrapper
+
+    return decorate
+
+
+def conditional_on_summaries(product_arg: Optional[str] = "product_name"):
+    """
+    Give a view's responses an ETag and Last-Modified time from the version of its
+    product's summaries, and answer conditional requests for them with a 304
+    before the view is called.
+
+    The product name is the view's `product_arg` argument. If None, the response
+    depends on all products (such as pages with the product menu), and is versioned
+    on them all.
+    """
+
+    def decorate(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if product_arg is None:
+                version = all_products_version()
+                generation_times = product_versions().values()
+            else:
+                product_name = kwargs.get(product_arg)
+                version = product_versions().get(product_name)
+                if version is None:
+                    # Unknown or unsummarised: leave it to the view.
+                    return view(*args, **kwargs)
+                generation_times = [version]
+
+            etag = hashlib.sha1(f"{__version__}/{version}".encode("utf-8")).hexdigest()
+            last_modified = max((t for t in generation_times if t), default=None)
+
+            if _is_not_modified(flask.request, etag, last_modified):
+                response = flask.Response(status=304)
+            else:
+                response = flask.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            _set_version_headers(response, etag, last_modified)
+            return response
+
+        return wrapper
+
+    return decorate
+
+
+def _is_not_modified(
+    request: flask.Request, etag: str, last_modified: Optional[datetime]
+) -> bool:
+    # If-None-Match takes precedence when both are given (RFC 7232, section 6)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        # HTTP dates have no fractional seconds.
+        return request.if_modified_since >= last_modified.replace(microsecond=0)
+    return False
+
+
+def _set_version_headers(
+    response: flask.Response, etag: str, last_modified: Optional[datetime]
+):
+    # Weak: the same version may be rendered differently (eg. json formatting).
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Caches may keep it, but must check that it's still current before reuse.
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+
+
+# (year, month, day)
+TimePeriod = Tuple[Optional[int], Optional[int], Optional[int]]
+
+
+@_versioned_memoize()
 def get_time_summary(
     product_name: str,
     year: Optional[int] = None,
     month: Optional[int] = None,
     day: Optional[int] = None,
+    fields: Optional[Tuple[str, ...]] = None,
 ) -> Optional[TimePeriodOverview]:
-    return STORE.get(product_name, year, month, day)
+    """
+    Get a time summary, loading only the named optional fields if given.
+    (see `SummaryStore.get()`)
+    """
+    loaded = _request_time_summaries().get((product_name, year, month, day))
+    if loaded is not None:
+        loaded_fields, summary = loaded
+        if loaded_fields is None or (
+            fields is not None and set(fields) <= set(loaded_fields)
+        ):
+            return summary
+
+    return STORE.get(product_name, year, month, day, fields=fields)
+
+
+def get_time_summaries(
+    product_name: str,
+    periods: Sequence[TimePeriod],
+    fields: Optional[Tuple[str, ...]] = None,
+    period_fields: Optional[Sequence[Optional[Tuple[str, ...]]]] = None,
+) -> List[Optional[TimePeriodOverview]]:
+    """
+    Get the summaries of several time periods of a product in one query.
+
+    The same optional `fields` are loaded for each, unless `period_fields` gives
+    them per period. (see `SummaryStore.get_many()`)
+
+    They're kept for the rest of the request, so that `get_time_summary()` calls
+    for the same periods (such as for the page's footprint and regions) don't query
+    them again.
+    """
+    periods = tuple(periods)
+    if period_fields is None:
+        period_fields = (fields,) * len(periods)
+    period_fields = tuple(period_fields)
+    summaries = _get_time_summaries(product_name, periods, period_fields)
+
+    loaded = _request_time_summaries()
+    for (year, month, day), fields, summary in zip(periods, period_fields, summaries):
+        loaded[(product_name, year, month, day)] = (fields, summary)
+    return summaries
+
+
+@_versioned_memoize()
+def _get_time_summaries(
+    product_name: str,
+    periods: Tuple[TimePeriod, ...],
+    period_fields: Tuple[Optional[Tuple[str, ...]], ...],
+) -> List[Optional[TimePeriodOverview]]:
+    return STORE.get_many(product_name, periods, period_fields=period_fields)
+
 
+def _request_time_summaries() -> Dict[Tuple, Tuple]:
+    """
+    The time summaries loaded during the current request, by product and period.
+    """
+    if not flask.has_app_context():
+        return {}
+    if "time_summaries" not in flask.g:
+        flask.g.time_summaries = {}
+    return flask.g.time_summaries
 
-@cache.memoize(timeout=60)
+
+@_versioned_memoize(per_product=False)
 def get_time_summary_all_products() -> Dict[Tuple[str, int, int], int]:
     return STORE.get_all_dataset_counts()
 
@@ -201,14 +491,14 @@ def get_product_summary(product_name: str) -> ProductSummary:
 ProductWithSummary = Tuple[DatasetType, Optional[ProductSummary]]
 
 
-@cache.memoize(timeout=120)
+@_versioned_memoize(per_product=False)
 def get_products() -> List[ProductWithSummary]:
     """
     The list of all products that we have generated reports for.
     """
+    summaries = STORE.get_all_product_summaries()
     products = [
-        (product, get_product_summary(product.name))
-        for product in STORE.all_dataset_types()
+        (product, summaries.get(product.name)) for product in STORE.all_dataset_types()
     ]
     if products and not STORE.list_complete_products():
         raise RuntimeError(
@@ -218,7 +508,7 @@ def get_products() -> List[ProductWithSummary]:
     return products
 
 
-@cache.memoize(timeout=120)
+@_versioned_memoize(per_product=False)
 def get_products_with_summaries() -> List[ProductWithSummary]:
     """The list of products that we have generated summaries for."""
     return [
@@ -226,24 +516,42 @@ def get_products_with_summaries() -> List[ProductWithSummary]:
     ]
 
 
-@cache.memoize(timeout=60)
+@_versioned_memoize()
 def get_footprint_geojson(
     product_name: str,
     year: Optional[int] = None,
     month: Optional[int] = None,
     day: Optional[int] = None,
+    resolution: Optional[float] = None,
 ) -> Optional[Dict]:
-    period = get_time_summary(product_name, year, month, day)
-    if period is None:
-        return None
+    """
+    The period's footprint as a GeoJSON feature.
 
-    footprint = _get_footprint(period)
-    if not footprint:
+    Optionally with only the detail needed at a resolution (in metres per pixel).
+    """
+    period = get_time_summary(
+        product_name, year, month, day, fields=("footprint_wgs84_geojson",)
+    )
+    if period is None or not period.dataset_count:
         return None
 
+    if period.footprint_wgs84_geojson:
+        # Projected when it was generated.
+        geometry = orjson.loads(period.footprint_wgs84_geojson_at(resolution))
+    else:
+        # Days aren't stored, and older summaries may lack it.
+        if period.footprint_geometry is None and period.footprint_crs:
+            period = get_time_summary(
+                product_name, year, month, day, fields=("footprint_geometry",)
+            )
+        footprint = _get_footprint(period)
+        if not footprint:
+            return None
+        geometry = footprint.__geo_interface__
+
     return dict(
         type="Feature",
-        geometry=footprint.__geo_interface__,
+        geometry=geometry,
         properties=dict(
             dataset_count=period.footprint_count,
             product_name=product_name,
@@ -252,7 +560,40 @@ def get_footprint_geojson(
     )
 
 
-@cache.memoize(timeout=60)
+def footprint_level_resolution(
+    product_name: str,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+    resolution: Optional[float] = None,
+) -> Optional[float]:
+    """
+    Snap a requested footprint resolution to that of the stored level it would get.
+
+    So that the (arbitrary) resolutions of requests don't each become a cached
+    footprint: there are only a few levels per period.
+    """
+    if resolution is None or day is not None:
+        # Days aren't stored, so they only have the one level.
+        return None
+    period = get_time_summary(product_name, year, month, day, fields=())
+    if period is None:
+        return None
+    return period.footprint_wgs84_resolution_at(resolution)
+
+
+@versioned_body(content_type="application/geo+json")
+def get_footprint_body(
+    product_name: str,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+    resolution: Optional[float] = None,
+) -> Optional[Dict]:
+    return get_footprint_geojson(product_name, year, month, day, resolution)
+
+
+@_versioned_memoize()
 def get_regions_geojson(
     product_name: str,
     year: Optional[int] = None,
@@ -290,6 +631,54 @@ def get_regions_geojson(
     return regions
 
 
+@versioned_body(content_type="application/geo+json")
+def get_regions_body(
+    product_name: str,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+) -> Optional[Dict]:
+    return get_regions_geojson(product_name, year, month, day)
+
+
+@versioned_body()
+def get_timeline_body(
+    product_name: str,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+) -> Optional[Dict[str, int]]:
+    """
+    The period's dataset count for each day (or month) of its timeline.
+    """
+    summary = get_time_summary(product_name, year, month, day)
+    if summary is None:
+        return None
+
+    def _datekey(k):
+        # The timezone is the global grouping timezone: we don't want it in json.
+        if type(k) is date:
+            k = datetime(k.year, k.month, k.day)
+        return k.replace(tzinfo=None).isoformat()
+
+    return {_datekey(k): v for k, v in summary.timeline_dataset_counts.items()}
+
+
+@_versioned_memoize()
+def get_tile(
+    product_name: str,
+    layer: str,
+    z: int,
+    x: int,
+    y: int,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+    limit: int = 4000,
+) -> Optional[bytes]:
+    return STORE.get_tile(product_name, layer, z, x, y, year, month, day, limit=limit)
+
+
 def _get_footprint(period: TimePeriodOverview) -> Optional[MultiPolygon]:
     if not period or not period.dataset_count:
         return None
@@ -298,11 +687,6 @@ def _get_footprint(period: TimePeriodOverview) -> Optional[MultiPolygon]:
         return None
     start = time.time()
     footprint_wgs84 = period.footprint_wgs84
-    _LOG.info(
-        "overview.footprint_size_diff",
-        from_len=len(period.footprint_geometry.wkt),
-        to_len=len(footprint_wgs84.wkt),
-    )
     _LOG.debug("overview.footprint_proj", time_sec=time.time() - start)
 
     return footprint_wgs84
@@ -344,3 +728,49 @@ def _get_regions_geojson(
             if region_info.region(region_code) is not None
         ],
     }
+
+
+def warm_up(app: flask.Flask):
+    """
+    Load the summaries that most pages need into the app's cache.
+
+    This is run in a gunicorn master before forking workers, if
+    ``CUBEDASH_WARMUP`` is set (see `gunicorn_config.py`). With an in-memory
+    cache the workers inherit a copy, with a shared cache they all use it.
+
+    If a ``CUBEDASH_CACHE_SNAPSHOT`` file was written by ``cubedash-gen
+    --snapshot``, the overviews of products that haven't changed since are taken
+    from it rather than the database.
+    """
+    start = time.time()
+    with app.app_context():
+        snapshot_path = app.config.get("CUBEDASH_CACHE_SNAPSHOT")
+        from_snapshot = {}
+        if snapshot_path:
+            try:
+                from_snapshot = STORE.read_snapshot(snapshot_path)
+            except FileNotFoundError:
+                _LOG.warning("warmup.no_snapshot", path=snapshot_path)
+            except (OSError, ValueError):
+                # Unreadable or truncated. The overviews will be loaded from the
+                # database instead.
+                _LOG.warning(
+                    "warmup.unreadable_snapshot", path=snapshot_path, exc_info=True
+                )
+        for product_name, overview in from_snapshot.items():
+            get_time_summary.prime(overview, product_name)
+
+        products = get_products_with_summaries()
+        get_products()
+        get_time_summary_all_products()
+        for product, _ in products:
+            get_time_summary(product.name)
+            get_footprint_body(product.name)
+            get_regions_body(product.name)
+
+    _LOG.info(
+        "warmup.done",
+        product_count=len(products),
+        from_snapshot=len(from_snapshot),
+        time_sec=time.time() - start,
+    )
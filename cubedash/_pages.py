@@ -1,13 +1,13 @@
 import decimal
 import re
 from datetime import datetime, timedelta
-from typing import List, Tuple
+from typing import List, NamedTuple, Tuple
 
 import datacube
 import dateutil.parser
 import flask
 import structlog
-from datacube.model import DatasetType, Range
+from datacube.model import DatasetType, MetadataType, Range
 from datacube.scripts.dataset import build_dataset_info
 from dateutil import tz
 from flask import (
@@ -75,6 +75,7 @@ def legacy_product_page(
 @bp.route("/products/<product_name>/<int:year>")
 @bp.route("/products/<product_name>/<int:year>/<int:month>")
 @bp.route("/products/<product_name>/<int:year>/<int:month>/<int:day>")
+@_model.conditional_on_summaries(product_arg=None)
 def product_page(
     product_name: str = None, year: int = None, month: int = None, day: int = None
 ):
@@ -99,7 +100,9 @@ def product_page(
         # Which data to preload with the page?
         regions_geojson=region_geojson,
         datasets_geojson=None,  # _model.get_datasets_geojson(product_name, year, month, day),
-        footprint_geojson=_model.get_footprint_geojson(product_name, year, month, day),
+        footprint_geojson=_model.get_footprint_geojson(
+            product_name, year, month, day, resolution=_PAGE_FOOTPRINT_RESOLUTION
+        ),
         product=product,
         product_region_info=(
             _model.STORE.get_product_region_info(product_name)
@@ -154,7 +157,7 @@ def search_page(
         selected_summary,
         year_selector_summary,
         time_selector_summary,
-    ) = _load_product(product_name, year, month, day)
+    ) = _load_product(product_name, year, month, day, selected_fields=())
     time_range = utils.as_time_range(
         year, month, day, tzinfo=tz.gettz(_model.DEFAULT_GROUPING_TIMEZONE)
     )
@@ -310,7 +313,7 @@ def region_page(
         selected_summary,
         year_selector_summary,
         time_selector_summary,
-    ) = _load_product(product_name, year, month, day)
+    ) = _load_product(product_name, year, month, day, selected_fields=())
 
     region_info = _model.STORE.get_product_region_info(product_name)
     if not region_info:
@@ -425,8 +428,17 @@ def timeline_page(product_name: str):
     return redirect(url_for("pages.product_page", product_name=product_name))
 
 
+# The detail of footprints embedded in product pages, in metres.
+# (the map can be zoomed further than this, but summary footprints are usually
+#  combined at this tolerance anyway. See TimePeriodOverview.add_periods())
+_PAGE_FOOTPRINT_RESOLUTION = 1000.0
+
+# The summary fields used by the year and time selectors of product pages.
+_SELECTOR_SUMMARY_FIELDS = ("timeline_dataset_counts",)
+
+
 def _load_product(
-    product_name, year, month, day
+    product_name, year, month, day, selected_fields: Tuple[str, ...] = None
 ) -> Tuple[
     DatasetType,
     ProductSummary,
@@ -442,9 +454,30 @@ def _load_product(
             abort(404, f"Unknown product {product_name!r}")
 
     product_summary = _model.get_product_summary(product_name)
-    time_summary = _model.get_time_summary(product_name, year, month, day)
-    year_selector_summary = _model.get_time_summary(product_name, None, None, None)
-    time_selector_summary = _model.get_time_summary(product_name, year, None, None)
+    # The selected period is loaded with the fields the page needs, and the time
+    # selectors' periods (unless they're the same period) with only their own.
+    selected_period = (year, month, day)
+    selector_periods = [(None, None, None), (year, None, None)]
+    periods = [selected_period, *(p for p in selector_periods if p != selected_period)]
+
+    fields = selected_fields
+    if fields is not None and len(periods) <= len(selector_periods):
+        fields = tuple(sorted({*fields, *_SELECTOR_SUMMARY_FIELDS}))
+    summaries = dict(
+        zip(
+            periods,
+            _model.get_time_summaries(
+                product_name,
+                periods,
+                period_fields=[fields]
+                + [_SELECTOR_SUMMARY_FIELDS] * (len(periods) - 1),
+            ),
+        )
+    )
+    time_summary = summaries[selected_period]
+    year_selector_summary, time_selector_summary = (
+        summaries[p] for p in selector_periods
+    )
     return (
         product,
         product_summary,
@@ -474,15 +507,16 @@ def inject_globals():
         if product_summary:
             last_updated = product_summary.last_successful_summary_time
 
+    navigation = _get_navigation()
     return dict(
         # Only the known, summarised products in groups.
-        grouped_products=_get_grouped_products(),
+        grouped_products=navigation.grouped_products,
         # All products in the datacube, summarised or not.
-        datacube_products=list(_model.STORE.index.products.get_all()),
+        datacube_products=navigation.datacube_products,
         hidden_product_list=current_app.config.get(
             "CUBEDASH_HIDE_PRODUCTS_BY_NAME_LIST", []
         ),
-        datacube_metadata_types=list(_model.STORE.index.metadata_types.get_all()),
+        datacube_metadata_types=navigation.datacube_metadata_types,
         current_time=datetime.utcnow(),
         datacube_version=datacube.__version__,
         app_version=cubedash.__version__,
@@ -497,6 +531,50 @@ def inject_globals():
     )
 
 
+class _Navigation(NamedTuple):
+    """
+    The product and metadata type menus shown on every page.
+    """
+
+    grouped_products: List[Tuple[str, List[ProductWithSummary]]]
+    datacube_products: Tuple[DatasetType, ...]
+    datacube_metadata_types: Tuple[MetadataType, ...]
+
+
+def _get_navigation() -> _Navigation:
+    """
+    Get the page menus, which are only rebuilt when the products change.
+
+    (They're kept per app, as the grouping is configurable.)
+    """
+    products = _model.STORE.all_dataset_types()
+    metadata_types = _model.STORE.all_metadata_types()
+    version = _model.all_products_version()
+
+    cached = current_app.extensions.get("cubedash_navigation")
+    if cached is not None:
+        cached_version, cached_products, cached_metadata_types, navigation = cached
+        if (
+            cached_version == version
+            and cached_products is products
+            and cached_metadata_types is metadata_types
+        ):
+            return navigation
+
+    navigation = _Navigation(
+        grouped_products=_get_grouped_products(),
+        datacube_products=products,
+        datacube_metadata_types=metadata_types,
+    )
+    current_app.extensions["cubedash_navigation"] = (
+        version,
+        products,
+        metadata_types,
+        navigation,
+    )
+    return navigation
+
+
 HREF = str
 SHOULD_LINK = bool
 
@@ -108,6 +108,7 @@ def legacy_raw_product_doc(name):
 
 
 @bp.route("/products/<name>.odc-product.yaml")
+@_model.conditional_on_summaries(product_arg="name")
 def raw_product_doc(name):
     product = _model.STORE.index.products.get_by_name(name)
     if not product:
@@ -164,6 +165,7 @@ def raw_metadata_type_doc(name):
 
 
 @bp.route("/products.odc-product.yaml")
+@_model.conditional_on_summaries(product_arg=None)
 def raw_all_products_doc():
     resp = utils.as_yaml(
         *(
@@ -1089,24 +1089,30 @@ def stac_search():
 
 
 @bp.route("/collections")
+@_model.conditional_on_summaries(product_arg=None)
 def collections():
     """
     This is like the root "/", but has full information for each collection in
      an array (instead of just a link to each collection).
     """
-    return _utils.as_json(
-        dict(
-            links=[
-                dict(rel="self", type="application/json", href=request.url),
-                dict(rel="root", type="application/json", href=url_for(".root")),
-                dict(rel="parent", type="application/json", href=url_for(".root")),
-            ],
-            collections=[
-                # TODO: This has a root link, right?
-                _stac_collection(product.name).to_dict()
-                for product, product_summary in _model.get_products_with_summaries()
-            ],
-        )
+    # Without the query string, so that arbitrary arguments can't fill the cache.
+    return _utils.as_encoded(_collections_body(request.base_url))
+
+
+@_model.versioned_body(per_product=False)
+def _collections_body(base_url: str) -> Dict:
+    # The url is an argument so that it's part of the cache key.
+    return dict(
+        links=[
+            dict(rel="self", type="application/json", href=base_url),
+            dict(rel="root", type="application/json", href=url_for(".root")),
+            dict(rel="parent", type="application/json", href=url_for(".root")),
+        ],
+        collections=[
+            # TODO: This has a root link, right?
+            _stac_collection(product.name).to_dict()
+            for product, product_summary in _model.get_products_with_summaries()
+        ],
     )
 
 
@@ -1195,11 +1201,20 @@ def collection_queryables(collection: str):
 
 
 @bp.route("/collections/<collection>")
+@_model.conditional_on_summaries(product_arg="collection")
 def collection(collection: str):
     """
     Overview of a WFS Collection (a datacube product)
     """
-    return _stac_response(_stac_collection(collection))
+    return _utils.as_encoded(_collection_body(collection, request.url_root))
+
+
+@_model.versioned_body()
+def _collection_body(collection: str, url_root: str) -> Dict:
+    # Links are absolute, so the url root is an argument to be part of the cache key.
+    doc = _stac_collection(collection)
+    doc.set_root(root_catalog())
+    return doc.to_dict()
 
 
 @bp.route("/collections/<collection>/items")
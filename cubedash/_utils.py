@@ -5,10 +5,13 @@ Common global filters and util methods.
 import csv
 import difflib
 import functools
+import gzip
 import io
 import itertools
+import math
 import re
 from collections import defaultdict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from io import StringIO
 from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
@@ -44,6 +47,12 @@ from sqlalchemy import func, select
 from sqlalchemy.engine import Engine
 from werkzeug.datastructures import MultiDict
 
+try:
+    # Optional: brotli is in the "deployment" extras.
+    import brotli
+except ImportError:
+    brotli = None
+
 _TARGET_CRS = "EPSG:4326"
 
 DEFAULT_PLATFORM_END_DATE = {
@@ -330,6 +339,18 @@ def _next_month(date: datetime):
     return datetime(date.year, date.month + 1, 1)
 
 
+def zoom_resolution(zoom: int) -> float:
+    """
+    The metres per pixel of a web map's zoom level (at the equator).
+
+    >>> zoom_resolution(0)
+    156543.03392804097
+    >>> round(zoom_resolution(10), 2)
+    152.87
+    """
+    return 2 * math.pi * 6_378_137 / 256 / 2**zoom
+
+
 def as_time_range(
     year: Optional[int] = None,
     month: Optional[int] = None,
@@ -469,15 +490,10 @@ def as_json(
     Optionally provide a filename, to tell web-browsers to download
     it on click with that filename.
     """
-    # Indent if they're loading directly in a browser.
-    #   (Flask's Accept parsing is too smart, and sees html-acceptance in
-    #    default ajax requests "accept: */*". So we do it raw.)
-    prefer_formatted = "text/html" in flask.request.headers.get("Accept", ())
-
     response = flask.Response(
         orjson.dumps(
             o,
-            option=orjson.OPT_INDENT_2 if prefer_formatted else 0,
+            option=orjson.OPT_INDENT_2 if _prefers_formatted_json() else 0,
             default=_json_fallback,
         ),
         content_type=content_type,
@@ -489,6 +505,77 @@ def as_json(
     return response
 
 
+def _prefers_formatted_json() -> bool:
+    # Indent if they're loading directly in a browser.
+    #   (Flask's Accept parsing is too smart, and sees html-acceptance in
+    #    default ajax requests "accept: */*". So we do it raw.)
+    return "text/html" in flask.request.headers.get("Accept", ())
+
+
+# Smaller bodies aren't worth compressing.
+_MIN_COMPRESSED_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class EncodedBody:
+    """
+    A json response body, with pre-compressed copies of it by content-encoding.
+
+    These can be cached, so that requests don't need to serialise or compress
+    anything. (see `as_encoded()`)
+    """
+
+    data: bytes
+    content_type: str = "application/json"
+    encodings: Dict[str, bytes] = field(default_factory=dict)
+
+    @classmethod
+    def of_json(
+        cls, o, content_type: str = "application/json", compress: bool = True
+    ) -> "EncodedBody":
+        data = orjson.dumps(o, default=_json_fallback)
+        encodings = {}
+        if compress and len(data) >= _MIN_COMPRESSED_SIZE:
+            # In order of preference.
+            if brotli is not None:
+                encodings["br"] = brotli.compress(
+                    data, mode=brotli.MODE_TEXT, quality=9
+                )
+            encodings["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+        return cls(data, content_type, encodings)
+
+
+def as_encoded(
+    body: EncodedBody,
+    downloadable_filename_prefix: str = None,
+    filename_suffix: str = ".json",
+) -> flask.Response:
+    """
+    Return a pre-serialised json body, in the best encoding the client accepts.
+
+    Optionally provide a filename, to tell web-browsers to download
+    it on click with that filename.
+    """
+    if _prefers_formatted_json():
+        # Rare (people reading it directly), so we don't keep a formatted copy.
+        response = as_json(orjson.loads(body.data), content_type=body.content_type)
+    else:
+        encoding = flask.request.accept_encodings.best_match(list(body.encodings))
+        response = flask.Response(
+            body.encodings[encoding] if encoding else body.data,
+            content_type=body.content_type,
+        )
+        if encoding:
+            response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+
+    if downloadable_filename_prefix:
+        suggest_download_filename(
+            response, downloadable_filename_prefix, filename_suffix
+        )
+    return response
+
+
 def _json_fallback(o, *args, **kwargs):
     if isinstance(o, (geometry.BoundingBox, Affine)):
         return tuple(o)
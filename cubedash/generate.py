@@ -45,6 +45,14 @@ Recreate all information for two products:
 
     cubedash-gen --force-refresh ls8_nbart_scene ls8_level1_scene
 
+Update all product summaries, then keep them updated as datasets are indexed:
+
+    cubedash-gen --all --watch
+
+See what an update of all products would do, without doing it:
+
+    cubedash-gen --all --plan
+
 
 Drop all of Explorer’s additions to the database:
 
@@ -54,14 +62,17 @@ Drop all of Explorer’s additions to the database:
 """
 
 import collections
+import json
 import multiprocessing
+import multiprocessing.util
+import os
 import re
 import sys
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import timedelta
 from functools import partial
 from textwrap import dedent
-from typing import List, Optional, Sequence, Tuple
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
 import click
 import structlog
@@ -74,13 +85,21 @@ from datacube.ui.click import config_option, environment_option, pass_config
 
 from cubedash.logs import init_logging
 from cubedash.summary import (
+    FootprintUnionSettings,
     GenerateResult,
+    RefreshPlan,
     SummaryStore,
     TimePeriodOverview,
     UnsupportedWKTProductCRSError,
 )
+from cubedash.summary._profile import (
+    PhaseMeasurement,
+    RefreshProfile,
+    summarise_phases,
+)
 from cubedash.summary._stores import DEFAULT_EPSG
 from cubedash.summary._summarise import DEFAULT_TIMEZONE
+from cubedash.summary._watch import DatasetChangeWatcher
 
 # Machine (json) logging.
 _LOG = structlog.get_logger()
@@ -96,31 +115,86 @@ class GenerateSettings:
     recreate_dataset_extents: bool
     reset_incremental_position: bool
     minimum_change_scan_window: timedelta = None
+    # Trace python memory use of each refresh phase, and summarise the phases at the end.
+    profile: bool = False
+    # How to union the footprints of each product. (see `Summariser`)
+    footprint_union: Dict[Optional[str], FootprintUnionSettings] = None
+
+
+# The store of a worker process, reused for every product that the worker refreshes.
+# (see _init_worker())
+_WORKER_STORE: Optional[SummaryStore] = None
+
+
+def _init_worker(
+    config: LocalConfig,
+    grouping_time_zone: str,
+    footprint_union: Dict[Optional[str], FootprintUnionSettings] = None,
+):
+    """
+    Connect a worker process to the index.
+
+    This is done once per worker rather than for each product, as the connection and
+    the loading of ODC's types and our caches would otherwise dominate small products.
+    """
+    global _WORKER_STORE
+    _WORKER_STORE = SummaryStore.create(
+        _get_index(config, f"worker{os.getpid()}"),
+        grouping_time_zone=grouping_time_zone,
+        footprint_union=footprint_union,
+    )
+    _WORKER_STORE.add_change_listener(_status_printer())
+    # Close it when the worker exits. (Pool workers don't run atexit handlers, but
+    # do run multiprocessing's finalizers when they exit normally)
+    multiprocessing.util.Finalize(None, _close_worker, exitpriority=10)
+
+
+def _close_worker():
+    global _WORKER_STORE
+    if _WORKER_STORE is not None:
+        _WORKER_STORE.index.close()
+        _WORKER_STORE = None
 
 
-# pylint: disable=broad-except
 def generate_report(
-    item: Tuple[str, GenerateSettings, str],
-) -> Tuple[str, GenerateResult, Optional[TimePeriodOverview]]:
-    product_name, settings, grouping_time_zone = item
-    log = _LOG.bind(product=product_name)
+    item: Tuple[str, GenerateSettings],
+) -> Tuple[str, GenerateResult, Optional[TimePeriodOverview], List[PhaseMeasurement]]:
+    """Refresh a product using the worker's store (see _init_worker())"""
+    product_name, settings = item
+    store = _WORKER_STORE
+    store.log = _LOG.bind(product=product_name)
+
+    # Other workers may have refreshed products since we cached them.
+    store.clear_product_caches()
+    profile = RefreshProfile(product_name, trace_memory=settings.profile)
+
+    product_name, result, summary = _refresh_product(
+        store, product_name, settings, profile
+    )
+    return product_name, result, summary, profile.phases
+
 
+def _status_printer():
+    """Make a store change-listener that prints status each time we start a year."""
     started_years = set()
 
     def print_status(product_name=None, year=None, month=None, day=None, summary=None):
-        """Print status each time we start a year."""
         if year:
             if (product_name, year) not in started_years:
                 user_message(f"\t  {product_name} {year}")
                 started_years.add((product_name, year))
 
-    store = SummaryStore.create(
-        _get_index(settings.config, product_name),
-        log=log,
-        grouping_time_zone=grouping_time_zone,
-    )
-    store.add_change_listener(print_status)
+    return print_status
 
+
+# pylint: disable=broad-except
+def _refresh_product(
+    store: SummaryStore,
+    product_name: str,
+    settings: GenerateSettings,
+    profile: RefreshProfile = None,
+) -> Tuple[str, GenerateResult, Optional[TimePeriodOverview]]:
+    log = _LOG.bind(product=product_name)
     try:
         product = store.index.products.get_by_name(product_name)
         if product is None:
@@ -132,6 +206,7 @@ def generate_report(
             recreate_dataset_extents=settings.recreate_dataset_extents,
             reset_incremental_position=settings.reset_incremental_position,
             minimum_change_scan_window=settings.minimum_change_scan_window,
+            profile=profile,
         )
         return product_name, result, updated_summary
     except UnsupportedWKTProductCRSError as e:
@@ -140,8 +215,6 @@ def generate_report(
     except Exception:
         log.exception("product.error")
         return product_name, GenerateResult.ERROR, None
-    finally:
-        store.index.close()
 
 
 def _get_index(config: LocalConfig, variant: str) -> Index:
@@ -158,7 +231,14 @@ def run_generation(
     products: Sequence[DatasetType],
     grouping_time_zone=DEFAULT_TIMEZONE,
     workers=3,
+    store: Optional[SummaryStore] = None,
 ) -> Tuple[int, int]:
+    """
+    Refresh the given products, with the given number of worker processes.
+
+    A single worker refreshes them in this process, using the given store if any.
+    """
+    global _WORKER_STORE
     user_message(
         f"Updating {len(products)} products for "
         f"{style(str(settings.config), bold=True)}",
@@ -168,41 +248,50 @@ def run_generation(
 
     user_message("Generating product summaries...")
 
-    def on_complete(
-        product_name: str, result: GenerateResult, summary: TimePeriodOverview
-    ):
-        counts[result] += 1
-        result_color = {
-            GenerateResult.ERROR: "red",
-            GenerateResult.UNSUPPORTED: "yellow",
-            GenerateResult.CREATED: "blue",
-            GenerateResult.UPDATED: "green",
-        }.get(result)
-        extra = ""
-        if summary is not None:
-            extra = f" (contains {summary.dataset_count} total datasets)"
+    phases: List[PhaseMeasurement] = []
 
-        user_message(
-            f"{style(product_name, fg=result_color)} {result.name.lower()}{extra}"
-        )
+    def on_complete(product_name, result, summary, product_phases):
+        _on_complete(counts, product_name, result, summary)
+        phases.extend(product_phases)
 
     # If one worker, avoid any subprocesses/forking.
     # This makes test tracing far easier.
     if workers == 1:
-        for p in products:
-            on_complete(*generate_report((p.name, settings, grouping_time_zone)))
+        if store is None:
+            _init_worker(settings.config, grouping_time_zone, settings.footprint_union)
+        else:
+            original_log = store.log
+            _WORKER_STORE = store
+        try:
+            for p in products:
+                on_complete(*generate_report((p.name, settings)))
+        finally:
+            if store is None:
+                _close_worker()
+            else:
+                # It's the caller's store, so leave it open.
+                _WORKER_STORE = None
+                store.log = original_log
     else:
-        with multiprocessing.Pool(workers) as pool:
-            summary: TimePeriodOverview
-            for product_name, result, summary in pool.imap_unordered(
+        with multiprocessing.Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(settings.config, grouping_time_zone, settings.footprint_union),
+        ) as pool:
+            for report in pool.imap_unordered(
                 generate_report,
-                ((p.name, settings, grouping_time_zone) for p in products),
+                ((p.name, settings) for p in products),
                 chunksize=1,
             ):
-                on_complete(product_name, result, summary)
+                on_complete(*report)
+
+            # Let the workers exit (and close their connections) before the pool is
+            # terminated.
+            pool.close()
+            pool.join()
 
-        pool.close()
-        pool.join()
+    if settings.profile:
+        _print_phase_summary(phases)
 
     status_messages = ", ".join(
         f"{count_} {status.name.lower()}" for status, count_ in counts.items()
@@ -222,6 +311,166 @@ def run_generation(
     return creation_count, failure_count
 
 
+def _on_complete(
+    counts: collections.Counter,
+    product_name: str,
+    result: GenerateResult,
+    summary: TimePeriodOverview,
+):
+    counts[result] += 1
+    result_color = {
+        GenerateResult.ERROR: "red",
+        GenerateResult.UNSUPPORTED: "yellow",
+        GenerateResult.CREATED: "blue",
+        GenerateResult.UPDATED: "green",
+    }.get(result)
+    extra = ""
+    if summary is not None:
+        extra = f" (contains {summary.dataset_count} total datasets)"
+
+    user_message(f"{style(product_name, fg=result_color)} {result.name.lower()}{extra}")
+
+
+def _print_phase_summary(phases: List[PhaseMeasurement], limit=30):
+    """Print a table of the slowest refresh phases"""
+    totals = summarise_phases(phases)
+    if not totals:
+        return
+
+    user_message(
+        f"Slowest refresh phases ({min(limit, len(totals))} of {len(totals)}):",
+        bold=True,
+    )
+    user_message(
+        f"\t{'product':<32} {'phase':<22} {'count':>5} "
+        f"{'seconds':>9} {'rows':>10} {'peak MiB':>9}"
+    )
+    for total, count in totals[:limit]:
+        rows = "" if total.rows is None else total.rows
+        peak_memory = (
+            ""
+            if total.peak_memory_bytes is None
+            else f"{total.peak_memory_bytes / 1024 / 1024:.1f}"
+        )
+        user_message(
+            f"\t{total.product_name:<32} {total.phase:<22} {count:>5} "
+            f"{total.seconds:>9.2f} {rows:>10} {peak_memory:>9}"
+        )
+
+
+def run_watch(
+    store: SummaryStore,
+    watcher: DatasetChangeWatcher,
+    settings: GenerateSettings,
+    only_products: Optional[Set[str]] = None,
+    refresh_stats: bool = True,
+    force_concurrently: bool = False,
+):
+    """
+    Refresh products as their datasets change, forever.
+
+    The same store (and its connections) is reused for every refresh.
+
+    :param only_products: Ignore changes to other products. (None for all products)
+    """
+    # Forcing options are for the initial run, not for every change.
+    settings = replace(
+        settings,
+        force_refresh=False,
+        recreate_dataset_extents=False,
+        reset_incremental_position=False,
+    )
+
+    user_message(
+        "Watching for dataset changes "
+        f"({'listening' if watcher.is_listening else 'polling'})..."
+    )
+    for product_refs in watcher.batches():
+        product_names = set()
+        for product_ref in product_refs:
+            product = store.index.products.get(product_ref)
+            if product is None:
+                _LOG.warning("watch.unknown_product", product_ref=product_ref)
+                continue
+            if only_products is None or product.name in only_products:
+                product_names.add(product.name)
+
+        counts = collections.Counter()
+        for product_name in sorted(product_names):
+            _on_complete(counts, *_refresh_product(store, product_name, settings))
+
+        updated = counts[GenerateResult.CREATED] + counts[GenerateResult.UPDATED]
+        _LOG.info(
+            "watch.refreshed",
+            count=len(product_names),
+            **{f"was_{k.name.lower()}": count for k, count in counts.items()},
+        )
+        if updated > 0 and refresh_stats:
+            store.refresh_stats(concurrently=force_concurrently)
+            _LOG.info("stats.refresh")
+
+
+def run_plan(
+    store: SummaryStore,
+    settings: GenerateSettings,
+    products: Sequence[DatasetType],
+    output_format: str = "text",
+) -> List[RefreshPlan]:
+    """
+    Report what a refresh of each product would do, without changing anything.
+
+    Json is printed to stdout (one product per line), text to stderr.
+    """
+    plans = []
+    total_estimate = timedelta()
+    unknown_estimates = 0
+    for product in products:
+        plan = store.plan_refresh(
+            product.name,
+            force=settings.force_refresh,
+            recreate_dataset_extents=settings.recreate_dataset_extents,
+            reset_incremental_position=settings.reset_incremental_position,
+            minimum_change_scan_window=settings.minimum_change_scan_window,
+        )
+        plans.append(plan)
+        if plan.estimated_duration is None:
+            unknown_estimates += 1
+        else:
+            total_estimate += plan.estimated_duration
+
+        if output_format == "json":
+            click.echo(json.dumps(plan.as_dict()))
+            continue
+
+        scan = (
+            "all datasets"
+            if plan.scan_changes_since is None
+            else f"changes since {plan.scan_changes_since.isoformat()}"
+        )
+        user_message(
+            f"{style(plan.product_name, bold=True)}{' (new)' if plan.is_new else ''}: "
+            f"{plan.changed_dataset_count} datasets ({scan}), "
+            f"{len(plan.months)} months, {len(plan.years)} years, "
+            f"estimated {_format_estimate(plan.estimated_duration)}"
+        )
+        for month, count in plan.months:
+            user_message(f"\t{month.strftime('%Y-%m')}\t{count} changed")
+
+    if output_format != "json":
+        user_message(
+            f"{len(plans)} products, "
+            f"estimated {_format_estimate(total_estimate)} in total"
+            + (f" (+{unknown_estimates} without history)" if unknown_estimates else "")
+        )
+    return plans
+
+
+def _format_estimate(duration: Optional[timedelta]) -> str:
+    if duration is None:
+        return "unknown"
+    return str(timedelta(seconds=round(duration.total_seconds())))
+
+
 def _load_products(index: Index, product_names) -> List[DatasetType]:
     for product_name in product_names:
         product = index.products.get_by_name(product_name)
@@ -257,6 +506,51 @@ class TimeDeltaParam(click.ParamType):
             self.fail(v.args[0])
 
 
+class GridSizeParam(click.ParamType):
+    """
+    A grid size in metres, optionally for a single product.
+
+    Eg. '30' or 'ga_ls8c_ard_3=30'
+    """
+
+    name = "[product=]metres"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, tuple):
+            return value
+
+        product_name, _, size = value.rpartition("=")
+        try:
+            grid_size = float(size)
+        except ValueError:
+            self.fail(f"Expected a number of metres, got {size!r}")
+        if grid_size <= 0:
+            self.fail("Grid size must be positive")
+        return product_name or None, grid_size
+
+
+def _footprint_union_settings(
+    grid_sizes: Sequence[Tuple[Optional[str], float]],
+    coverage_products: Sequence[str],
+) -> Dict[Optional[str], FootprintUnionSettings]:
+    """
+    Settings for each product from the cli options. (the None key is for all others)
+    """
+    grid_size_by_product = dict(grid_sizes)
+    default_grid_size = grid_size_by_product.get(None)
+
+    settings = {
+        product_name: FootprintUnionSettings(grid_size_metres=grid_size)
+        for product_name, grid_size in grid_size_by_product.items()
+    }
+    for product_name in coverage_products:
+        settings[product_name] = FootprintUnionSettings(
+            grid_size_metres=grid_size_by_product.get(product_name, default_grid_size),
+            is_coverage=True,
+        )
+    return settings
+
+
 @click.command(help=__doc__)
 @environment_option
 @config_option
@@ -431,6 +725,118 @@ class TimeDeltaParam(click.ParamType):
         """
     ),
 )
+@click.option(
+    "--watch",
+    is_flag=True,
+    default=False,
+    help=dedent(
+        """\
+        After generating, keep running and refresh products as their datasets change.
+
+        Changes are received from Postgres notifications if Explorer's trigger is
+        installed on the ODC dataset table (by `--init`), otherwise the dataset table
+        is polled.
+        """
+    ),
+)
+@click.option(
+    "--watch-debounce",
+    type=TimeDeltaParam(),
+    default="30s",
+    help=dedent(
+        """\
+        When watching, wait until changes have stopped for this long before refreshing,
+        so a burst of indexing leads to one refresh. (default: '30s')
+        """
+    ),
+)
+@click.option(
+    "--watch-poll-interval",
+    type=TimeDeltaParam(),
+    default="1m",
+    help=dedent(
+        """\
+        When watching without a notification trigger, check for changes this often.
+        (default: '1m')
+        """
+    ),
+)
+@click.option(
+    "--plan",
+    is_flag=True,
+    default=False,
+    help=dedent(
+        """\
+        Report what would be refreshed for each product, with an estimated duration
+        based on its previous refresh, then exit without changing anything.
+        """
+    ),
+)
+@click.option(
+    "--plan-format",
+    type=click.Choice(["text", "json"]),
+    default="text",
+    help="Output format of `--plan`: text (stderr) or json lines (stdout)",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help=dedent(
+        """\
+        Measure each phase of each product's refresh (wall time, changed rows and peak
+        python memory), and print a table of the slowest phases at the end.
+
+        Measurements are logged as `refresh.phase` events, so use `--event-log-file`
+        to keep them.
+
+        Memory tracing will slow down the refresh.
+        """
+    ),
+)
+@click.option(
+    "--footprint-grid-size",
+    "footprint_grid_sizes",
+    type=GridSizeParam(),
+    multiple=True,
+    help=dedent(
+        """\
+        Reduce dataset footprints to a grid of this many metres before combining
+        them into summaries, which is much faster for products with many datasets.
+
+        Applies to all products, or to one product if given as 'product=metres'.
+        Can be repeated. (default: combine footprints exactly)
+
+        Example values: '100' or 'ga_ls8c_ard_3=30'
+        """
+    ),
+)
+@click.option(
+    "--coverage-union",
+    "coverage_products",
+    multiple=True,
+    help=dedent(
+        """\
+        A product whose regions tile cleanly, without overlapping (such as the
+        tiles of a gridded product), so they can be combined with a faster
+        coverage union. Can be repeated.
+
+        Needs PostGIS 3.4 or newer.
+        """
+    ),
+)
+@click.option(
+    "--snapshot",
+    "snapshot_path",
+    type=click.Path(dir_okay=False, writable=True),
+    help=dedent(
+        """\
+        Afterwards, save every product's summary and overview to this file, for
+        web servers to warm their caches from at start-up.
+        (see CUBEDASH_CACHE_SNAPSHOT)
+        """
+    ),
+)
 @click.argument("product_names", nargs=-1)
 def cli(
     config: LocalConfig,
@@ -449,13 +855,28 @@ def cli(
     recreate_dataset_extents: bool,
     reset_incremental_position: bool,
     minimum_scan_window: Optional[timedelta],
+    watch: bool,
+    watch_debounce: timedelta,
+    watch_poll_interval: timedelta,
+    plan: bool,
+    plan_format: str,
+    profile: bool,
+    footprint_grid_sizes: Sequence[Tuple[Optional[str], float]],
+    coverage_products: Sequence[str],
+    snapshot_path: Optional[str],
 ):
     init_logging(
-        open(event_log_file, "ab") if event_log_file else None, verbosity=verbose
+        open(event_log_file, "ab") if event_log_file else None,
+        # Phase measurements are info events.
+        verbosity=max(verbose, 1) if profile else verbose,
     )
 
     index = _get_index(config, "setup")
-    store = SummaryStore.create(index, grouping_time_zone=timezone)
+    footprint_union = _footprint_union_settings(footprint_grid_sizes, coverage_products)
+    store = SummaryStore.create(
+        index, grouping_time_zone=timezone, footprint_union=footprint_union
+    )
+    store.add_change_listener(_status_printer())
 
     if drop_database:
         user_message("Dropping all Explorer additions to the database")
@@ -484,23 +905,75 @@ def cli(
     else:
         products = list(_load_products(store.index, product_names))
 
-    updated, failures = run_generation(
-        GenerateSettings(
-            config,
-            force_refresh,
-            recreate_dataset_extents,
-            reset_incremental_position,
+    settings = GenerateSettings(
+        config,
+        force_refresh,
+        recreate_dataset_extents,
+        reset_incremental_position,
+        minimum_change_scan_window=minimum_scan_window,
+        profile=profile,
+        footprint_union=footprint_union,
+    )
+
+    if plan:
+        run_plan(store, settings, products, output_format=plan_format)
+        sys.exit(0)
+
+    watcher = None
+    if watch:
+        # Start watching before the initial run, so we don't miss changes made during it.
+        watcher = DatasetChangeWatcher(
+            store, debounce=watch_debounce, poll_interval=watch_poll_interval
+        )
+        watcher.start()
+
+    products_to_refresh = products
+    # Don't bother dispatching products that have had no changes.
+    # (one query for all of them, rather than a refresh of each)
+    if generate_all_products and not (
+        force_refresh or recreate_dataset_extents or reset_incremental_position
+    ):
+        idle_products = store.mark_idle_products_refreshed(
+            (p.name for p in products),
             minimum_change_scan_window=minimum_scan_window,
-        ),
-        products,
+        )
+        if idle_products:
+            user_message(f"{len(idle_products)} products have no changes")
+            products_to_refresh = [p for p in products if p.name not in idle_products]
+
+    updated, failures = run_generation(
+        settings,
+        products_to_refresh,
         workers=jobs,
         grouping_time_zone=timezone,
+        store=store,
     )
     if updated > 0 and refresh_stats:
         user_message("Refreshing statistics...", nl=False)
         store.refresh_stats(concurrently=force_concurrently)
         user_message("done", color="green")
         _LOG.info("stats.refresh")
+
+    if snapshot_path:
+        store.write_snapshot(snapshot_path)
+        user_message(f"Wrote snapshot {snapshot_path}")
+
+    if watcher is not None:
+        try:
+            run_watch(
+                store,
+                watcher,
+                settings,
+                only_products=(
+                    None if generate_all_products else {p.name for p in products}
+                ),
+                refresh_stats=refresh_stats,
+                force_concurrently=force_concurrently,
+            )
+        except KeyboardInterrupt:
+            user_message("Stopped watching.")
+        finally:
+            watcher.close()
     sys.exit(failures)
 
 
@@ -1,4 +1,9 @@
-"""Gunicorn config for Prometheus internal metrics"""
+"""
+Gunicorn config for Prometheus internal metrics, and warming caches before forking.
+
+Caches are only warmed in the master when the app is preloaded (``--preload``)
+and ``CUBEDASH_WARMUP`` is set.
+"""
 
 import os
 
@@ -10,3 +15,20 @@ def child_exit(server, worker):
         )
 
         GunicornInternalPrometheusMetrics.mark_process_dead_on_child_exit(worker.pid)
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from cubedash import _model
+
+        app = server.app.wsgi()
+        if app.config.get("CUBEDASH_WARMUP", False):
+            _model.warm_up(app)
+
+
+def pre_fork(server, worker):
+    # Workers can't share the master's connections (such as from warming caches).
+    # Each will open its own when first needed.
+    from cubedash import _model
+
+    _model.close_connections()
@@ -6,15 +6,19 @@ from ._stores import (
     ItemSort,
     ProductLocationSample,
     ProductSummary,
+    RefreshPlan,
     SummaryStore,
 )
+from ._summarise import FootprintUnionSettings
 
 __all__ = (
     "DatasetItem",
+    "FootprintUnionSettings",
     "GenerateResult",
     "ItemSort",
     "ProductLocationSample",
     "ProductSummary",
+    "RefreshPlan",
     "RegionInfo",
     "SummaryStore",
     "TimePeriodOverview",
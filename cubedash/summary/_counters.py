@@ -0,0 +1,282 @@
+"""
+Compact dataset counts for summaries: per timeline period, and per region.
+
+Large summaries have thousands of entries, which as Counters cost a Python object
+(or several) each, and are slow to merge. These hold them in numpy arrays instead.
+
+Both are read-only mappings (with Counter-like behaviour for missing keys), so
+templates and api code can use them like the Counters they replace.
+"""
+
+import threading
+from collections.abc import Mapping
+from datetime import date, datetime, tzinfo
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+_DAY = "datetime64[D]"
+_COUNT = np.int32
+
+
+def _sum_duplicates(
+    keys: np.ndarray, counts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sort by key, summing the counts of any repeated keys."""
+    unique_keys, indexes = np.unique(keys, return_inverse=True)
+    summed = np.zeros(len(unique_keys), dtype=np.int64)
+    np.add.at(summed, indexes, counts)
+    return unique_keys, summed.astype(_COUNT)
+
+
+class TimelineCounts(Mapping):
+    """
+    Dataset counts for the start day of each period of a timeline, sorted by day.
+
+    Days given as datetimes are returned as midnight datetimes in the same timezone
+    (which is the grouping timezone, for loaded summaries), otherwise as dates.
+    """
+
+    __slots__ = ("days", "counts", "tzinfo")
+
+    def __init__(
+        self, days: np.ndarray, counts: np.ndarray, tzinfo: Optional[tzinfo] = None
+    ) -> None:
+        # Sorted, unique numpy days.
+        self.days = days
+        self.counts = counts
+        self.tzinfo = tzinfo
+
+    @classmethod
+    def from_pairs(
+        cls,
+        days: Iterable[Union[date, datetime]],
+        counts: Iterable[int],
+        tzinfo: Optional[tzinfo] = None,
+    ) -> "TimelineCounts":
+        """
+        Make from (unsorted, possibly repeated) days and their counts.
+
+        Datetimes are taken as the day they fall on in the given timezone, or in
+        their own timezone if none is given. (Loaded days have fixed offsets, which
+        differ either side of daylight saving changes.)
+
+        They're returned as midnights in the given timezone, or else the timezone of
+        the first datetime.
+        """
+        days = list(days)
+        key_tzinfo = tzinfo
+        if key_tzinfo is None:
+            key_tzinfo = next((d.tzinfo for d in days if isinstance(d, datetime)), None)
+        return cls(
+            *_sum_duplicates(
+                np.array([_as_day(d, tzinfo) for d in days], dtype=_DAY),
+                np.fromiter(counts, dtype=np.int64, count=len(days)),
+            ),
+            tzinfo=key_tzinfo,
+        )
+
+    @classmethod
+    def of(cls, counts: Mapping) -> "TimelineCounts":
+        """Convert any mapping of days to counts (eg. a Counter)"""
+        if isinstance(counts, TimelineCounts):
+            return counts
+        return cls.from_pairs(counts.keys(), counts.values())
+
+    @classmethod
+    def merge(cls, timelines: Iterable["TimelineCounts"]) -> "TimelineCounts":
+        """Add the counts of the given timelines together."""
+        timelines = list(timelines)
+        if not timelines:
+            return cls(np.array([], dtype=_DAY), np.array([], dtype=_COUNT))
+        return cls(
+            *_sum_duplicates(
+                np.concatenate([t.days for t in timelines]),
+                np.concatenate([t.counts for t in timelines]),
+            ),
+            tzinfo=next((t.tzinfo for t in timelines if t.tzinfo is not None), None),
+        )
+
+    def grouped(self, period: str) -> "TimelineCounts":
+        """
+        Group into coarser periods: "month" or "year".
+
+        (Periods without datasets are dropped)
+        """
+        days = self.days.astype(
+            {"month": "datetime64[M]", "year": "datetime64[Y]"}[period]
+        ).astype(_DAY)
+        has_data = self.counts > 0
+        return TimelineCounts(
+            *_sum_duplicates(days[has_data], self.counts[has_data]),
+            tzinfo=self.tzinfo,
+        )
+
+    def _key(self, day: date) -> Union[date, datetime]:
+        if self.tzinfo is None:
+            return day
+        return _midnight(day, self.tzinfo)
+
+    def _index(self, key) -> Optional[int]:
+        if not isinstance(key, date):
+            return None
+        day = np.datetime64(_as_day(key, self.tzinfo), "D")
+        i = int(np.searchsorted(self.days, day))
+        if i < len(self.days) and self.days[i] == day:
+            return i
+        return None
+
+    def __getitem__(self, key) -> int:
+        i = self._index(key)
+        # Like a Counter.
+        return 0 if i is None else int(self.counts[i])
+
+    def __contains__(self, key) -> bool:
+        return self._index(key) is not None
+
+    def get(self, key, default=None):
+        i = self._index(key)
+        return default if i is None else int(self.counts[i])
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __iter__(self):
+        return (self._key(day) for day in self.days.tolist())
+
+    def items(self) -> List[Tuple[Union[date, datetime], int]]:
+        return list(zip(self, self.counts.tolist()))
+
+    def values(self) -> List[int]:
+        return self.counts.tolist()
+
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({dict(self.items())!r})"
+
+
+def _as_day(d: Union[date, datetime], tz: Optional[tzinfo]) -> date:
+    if isinstance(d, datetime):
+        if tz is not None and d.tzinfo is not None:
+            d = d.astimezone(tz)
+        return d.date()
+    return d
+
+
+def _midnight(day: date, tz: tzinfo) -> datetime:
+    # pytz zones must localize, or they get their (historic) LMT offset.
+    if hasattr(tz, "localize"):
+        return tz.localize(datetime(day.year, day.month, day.day))
+    return datetime(day.year, day.month, day.day, tzinfo=tz)
+
+
+# Region codes are interned as small integers, shared by all summaries of the process.
+_REGION_CODES: List[Optional[str]] = []
+_REGION_CODE_IDS: Dict[Optional[str], int] = {}
+_REGION_CODE_LOCK = threading.Lock()
+
+
+def _region_code_ids(codes: Sequence[Optional[str]]) -> np.ndarray:
+    ids = np.empty(len(codes), dtype=np.int32)
+    for i, code in enumerate(codes):
+        code_id = _REGION_CODE_IDS.get(code)
+        if code_id is None:
+            with _REGION_CODE_LOCK:
+                code_id = _REGION_CODE_IDS.get(code)
+                if code_id is None:
+                    code_id = len(_REGION_CODES)
+                    _REGION_CODES.append(code)
+                    _REGION_CODE_IDS[code] = code_id
+        ids[i] = code_id
+    return ids
+
+
+class RegionCounts(Mapping):
+    """
+    Dataset counts for each region code. (a code may be None, for datasets without one)
+    """
+
+    __slots__ = ("code_ids", "counts")
+
+    def __init__(self, code_ids: np.ndarray, counts: np.ndarray) -> None:
+        # Sorted, unique ids of interned region codes.
+        self.code_ids = code_ids
+        self.counts = counts
+
+    @classmethod
+    def from_pairs(
+        cls, codes: Iterable[Optional[str]], counts: Iterable[int]
+    ) -> "RegionCounts":
+        """Make from (possibly repeated) region codes and their counts."""
+        codes = list(codes)
+        return cls(
+            *_sum_duplicates(
+                _region_code_ids(codes),
+                np.fromiter(counts, dtype=np.int64, count=len(codes)),
+            )
+        )
+
+    @classmethod
+    def of(cls, counts: Mapping) -> "RegionCounts":
+        """Convert any mapping of region codes to counts (eg. a Counter)"""
+        if isinstance(counts, RegionCounts):
+            return counts
+        return cls.from_pairs(counts.keys(), counts.values())
+
+    @classmethod
+    def merge(cls, regions: Iterable["RegionCounts"]) -> "RegionCounts":
+        """Add the counts of the given region counts together."""
+        regions = list(regions)
+        if not regions:
+            return cls(np.array([], dtype=np.int32), np.array([], dtype=_COUNT))
+        return cls(
+            *_sum_duplicates(
+                np.concatenate([r.code_ids for r in regions]),
+                np.concatenate([r.counts for r in regions]),
+            )
+        )
+
+    def _index(self, code) -> Optional[int]:
+        code_id = _REGION_CODE_IDS.get(code)
+        if code_id is None:
+            return None
+        i = int(np.searchsorted(self.code_ids, code_id))
+        if i < len(self.code_ids) and self.code_ids[i] == code_id:
+            return i
+        return None
+
+    def __getitem__(self, code) -> int:
+        i = self._index(code)
+        # Like a Counter.
+        return 0 if i is None else int(self.counts[i])
+
+    def __contains__(self, code) -> bool:
+        return self._index(code) is not None
+
+    def get(self, code, default=None):
+        i = self._index(code)
+        return default if i is None else int(self.counts[i])
+
+    def __len__(self) -> int:
+        return len(self.code_ids)
+
+    def __iter__(self):
+        return (_REGION_CODES[code_id] for code_id in self.code_ids.tolist())
+
+    def items(self) -> List[Tuple[Optional[str], int]]:
+        return list(zip(self, self.counts.tolist()))
+
+    def values(self) -> List[int]:
+        return self.counts.tolist()
+
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def __reduce__(self):
+        # Interned ids are only meaningful within this process.
+        return RegionCounts.from_pairs, (list(self), self.values())
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({dict(self.items())!r})"
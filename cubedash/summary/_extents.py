@@ -22,9 +22,12 @@ from shapely.geometry import shape
 from sqlalchemy import (
     TIMESTAMP,
     BigInteger,
+    Column,
     Integer,
+    MetaData,
     SmallInteger,
     String,
+    Table,
     and_,
     bindparam,
     case,
@@ -33,6 +36,7 @@ from sqlalchemy import (
     literal,
     null,
     select,
+    tuple_,
 )
 from sqlalchemy.dialects import postgresql as postgres
 from sqlalchemy.engine import Engine
@@ -46,10 +50,18 @@ from cubedash._utils import (
     expects_eo3_metadata_type,
     infer_crs,
 )
-from cubedash.summary._schema import DATASET_SPATIAL, SPATIAL_REF_SYS
+from cubedash.summary._profile import RefreshProfile
+from cubedash.summary._schema import (
+    DATASET_SPATIAL,
+    EXTENT_REFRESH_CHECKPOINT,
+    SPATIAL_REF_SYS,
+)
 
 _LOG = structlog.get_logger()
 
+# How many datasets to refresh in each transaction of an extent refresh.
+DEFAULT_EXTENT_BATCH_SIZE = 50_000
+
 _WRS_PATH_ROW = [
     Path(__file__).parent.parent / "data" / "WRS2_descending" / "WRS2_descending.shp",
     Path(__file__).parent.parent / "data" / "WRS2_ascending" / "WRS2_acsending.shp",
@@ -278,15 +290,26 @@ def refresh_spatial_extents(
     product: DatasetType,
     clean_up_deleted=False,
     assume_after_date: datetime = None,
+    profile: RefreshProfile = None,
+    batch_size: int = DEFAULT_EXTENT_BATCH_SIZE,
+    resume: bool = True,
 ):
     """
     Update the spatial extents to match any changes upstream in ODC.
 
+    Changed datasets are committed in batches, and an interrupted refresh will
+    resume from its last batch when next run.
+
     :param assume_after_date: Only scan datasets that have changed after the given (db server) time.
                               If None, all datasets will be regenerated.
     :param clean_up_deleted: Scan for any manually deleted rows too. Slow.
+    :param profile: Record the measurements of each phase here.
+    :param batch_size: How many datasets to refresh in each transaction.
+    :param resume: Continue an unfinished earlier refresh, if any. Otherwise its
+                   checkpoint is discarded.
     """
     engine: Engine = alchemy_engine(index)
+    profile = profile or RefreshProfile(product.name)
 
     log = _LOG.bind(product_name=product.name, after_date=assume_after_date)
 
@@ -307,9 +330,10 @@ def refresh_spatial_extents(
     log.info(
         "spatial_archival",
     )
-    changed = engine.execute(
-        DATASET_SPATIAL.delete().where(DATASET_SPATIAL.c.id.in_(datasets_to_delete))
-    ).rowcount
+    with profile.phase("spatial_archival") as phase:
+        changed = phase.rows = engine.execute(
+            DATASET_SPATIAL.delete().where(DATASET_SPATIAL.c.id.in_(datasets_to_delete))
+        ).rowcount
     log.info(
         "spatial_archival.end",
         change_count=changed,
@@ -320,20 +344,22 @@ def refresh_spatial_extents(
         log.warning(
             "spatial_deletion_full_scan",
         )
-        changed += engine.execute(
-            DATASET_SPATIAL.delete()
-            .where(
-                DATASET_SPATIAL.c.dataset_type_ref == product.id,
-            )
-            # Where it doesn't exist in the ODC dataset table.
-            .where(
-                ~DATASET_SPATIAL.c.id.in_(
-                    select([DATASET.c.id]).where(
-                        DATASET.c.dataset_type_ref == product.id,
+        with profile.phase("spatial_deletion_scan") as phase:
+            phase.rows = engine.execute(
+                DATASET_SPATIAL.delete()
+                .where(
+                    DATASET_SPATIAL.c.dataset_type_ref == product.id,
+                )
+                # Where it doesn't exist in the ODC dataset table.
+                .where(
+                    ~DATASET_SPATIAL.c.id.in_(
+                        select([DATASET.c.id]).where(
+                            DATASET.c.dataset_type_ref == product.id,
+                        )
                     )
                 )
-            )
-        ).rowcount
+            ).rowcount
+        changed += phase.rows
         log.info(
             "spatial_deletion_scan.end",
             change_count=changed,
@@ -345,6 +371,25 @@ def refresh_spatial_extents(
     #        through ODC's APIs and can't choose alternative table aliases to make sub-queries.
     #        Maybe you can figure out a workaround, though?)
 
+    # Continue an earlier, unfinished, refresh?
+    if resume:
+        checkpoint = _resumable_checkpoint(engine, product, assume_after_date)
+    else:
+        checkpoint = None
+        _clear_checkpoint(engine, product)
+    position = None
+    if checkpoint is not None:
+        log.warning(
+            "spatial_update.resuming",
+            checkpoint_time=checkpoint.checkpoint_time,
+            previous_dataset_count=checkpoint.dataset_count,
+        )
+        # Continue it as it was, in case it was scanning more than we are.
+        assume_after_date = checkpoint.scan_changes_since
+        position = (checkpoint.last_change_time, checkpoint.last_dataset_id)
+        # Its changes haven't been summarised yet, so they count as ours.
+        changed += checkpoint.dataset_count
+
     column_values = {c.name: c for c in _select_dataset_extent_columns(product)}
     only_where = [
         DATASET.c.dataset_type_ref
@@ -356,37 +401,77 @@ def refresh_spatial_extents(
     else:
         log.warning("spatial_update.recreating_everything")
 
-    # Update any changed datasets
-    log.info(
-        "spatial_update",
-        product_name=product.name,
-        after_date=assume_after_date,
-    )
-    changed += engine.execute(
-        DATASET_SPATIAL.update()
-        .values(**column_values)
-        .where(DATASET_SPATIAL.c.id == column_values["id"])
-        .where(and_(*only_where))
-    ).rowcount
-    log.info("spatial_update.end", product_name=product.name, change_count=changed)
-
-    # ... and insert new ones.
-    log.info(
-        "spatial_insert",
-        product_name=product.name,
-        after_date=assume_after_date,
-    )
-    changed += engine.execute(
-        postgres.insert(DATASET_SPATIAL)
-        .from_select(
-            column_values.keys(),
-            select(column_values.values())
-            .where(and_(*only_where))
-            .order_by(column_values["center_time"]),
-        )
-        .on_conflict_do_nothing(index_elements=["id"])
-    ).rowcount
-    log.info("spatial_insert.end", product_name=product.name, change_count=changed)
+    # Datasets are refreshed in batches ordered by (change time, id), each committed along
+    # with a checkpoint of its position. So a large refresh isn't one enormous transaction,
+    # and an interrupted one can resume. (Datasets changed after the interruption sort
+    # after the checkpoint, so they won't be missed.)
+    change_position = tuple_(dataset_changed_expression(), DATASET.c.id)
+    while True:
+        batch_where = list(only_where)
+        if position is not None:
+            batch_where.append(change_position > _change_position_literal(*position))
+
+        # Find the last position of this batch. (None if it's the final batch)
+        batch_end = engine.execute(
+            select([dataset_changed_expression(), DATASET.c.id])
+            .where(and_(*batch_where))
+            .order_by(dataset_changed_expression(), DATASET.c.id)
+            .offset(batch_size - 1)
+            .limit(1)
+        ).fetchone()
+        if batch_end is not None:
+            batch_where.append(change_position <= _change_position_literal(*batch_end))
+
+        with engine.begin() as conn:
+            # Update any changed datasets
+            log.info(
+                "spatial_update",
+                product_name=product.name,
+                after_date=assume_after_date,
+                after_position=position,
+            )
+            with profile.phase("spatial_update") as phase:
+                phase.rows = conn.execute(
+                    DATASET_SPATIAL.update()
+                    .values(**column_values)
+                    .where(DATASET_SPATIAL.c.id == column_values["id"])
+                    .where(and_(*batch_where))
+                ).rowcount
+            changed += phase.rows
+            log.info(
+                "spatial_update.end", product_name=product.name, change_count=changed
+            )
+
+            # ... and insert new ones.
+            log.info(
+                "spatial_insert",
+                product_name=product.name,
+                after_date=assume_after_date,
+                after_position=position,
+            )
+            with profile.phase("spatial_insert") as phase:
+                phase.rows = conn.execute(
+                    postgres.insert(DATASET_SPATIAL)
+                    .from_select(
+                        column_values.keys(),
+                        # (Rows are only clustered by time within each batch)
+                        select(column_values.values())
+                        .where(and_(*batch_where))
+                        .order_by(column_values["center_time"]),
+                    )
+                    .on_conflict_do_nothing(index_elements=["id"])
+                ).rowcount
+            changed += phase.rows
+            log.info(
+                "spatial_insert.end", product_name=product.name, change_count=changed
+            )
+
+            if batch_end is None:
+                _clear_checkpoint(conn, product)
+                break
+
+            _save_checkpoint(conn, product, assume_after_date, batch_end, changed)
+        position = tuple(batch_end)
 
     # If we changed data...
     if changed:
@@ -398,38 +483,9 @@ def refresh_spatial_extents(
                 log.info(
                     "spatial_synthesizing",
                 )
-                shapes = _get_path_row_shapes()
-                rows = [
-                    row
-                    for row in index.datasets.search_returning(
-                        ("id", "sat_path", "sat_row"), product=product.name
-                    )
-                    if row.sat_path.lower is not None
-                ]
-                if rows:
-                    engine.execute(
-                        DATASET_SPATIAL.update()
-                        .where(DATASET_SPATIAL.c.id == bindparam("dataset_id"))
-                        .values(footprint=bindparam("footprint")),
-                        [
-                            dict(
-                                dataset_id=id_,
-                                footprint=from_shape(
-                                    shapely.ops.unary_union(
-                                        [
-                                            shapes[(int(sat_path.lower), row)]
-                                            for row in range(
-                                                int(sat_row.lower),
-                                                int(sat_row.upper) + 1,
-                                            )
-                                        ]
-                                    ),
-                                    srid=4326,
-                                    extended=True,
-                                ),
-                            )
-                            for id_, sat_path, sat_row in rows
-                        ],
+                with profile.phase("spatial_synthesizing") as phase:
+                    phase.rows = _synthesize_path_row_footprints(
+                        engine, product, assume_after_date
                     )
             log.info(
                 "spatial_synthesizing.end",
@@ -438,6 +494,144 @@ def refresh_spatial_extents(
     return changed
 
 
+def _resumable_checkpoint(
+    engine: Engine, product: DatasetType, assume_after_date: Optional[datetime]
+):
+    """
+    Get the checkpoint of an unfinished extent refresh of the product, if it
+    covers at least the datasets we've been asked to refresh.
+    """
+    checkpoint = engine.execute(
+        select([EXTENT_REFRESH_CHECKPOINT]).where(
+            EXTENT_REFRESH_CHECKPOINT.c.dataset_type_ref == product.id
+        )
+    ).fetchone()
+    if checkpoint is None:
+        return None
+
+    # Was it scanning fewer datasets than we need to? Start again.
+    if checkpoint.scan_changes_since is not None and (
+        assume_after_date is None or checkpoint.scan_changes_since > assume_after_date
+    ):
+        return None
+    return checkpoint
+
+
+def _clear_checkpoint(conn, product: DatasetType):
+    conn.execute(
+        EXTENT_REFRESH_CHECKPOINT.delete().where(
+            EXTENT_REFRESH_CHECKPOINT.c.dataset_type_ref == product.id
+        )
+    )
+
+
+def _save_checkpoint(
+    conn,
+    product: DatasetType,
+    assume_after_date: Optional[datetime],
+    position,
+    dataset_count: int,
+):
+    last_change_time, last_dataset_id = position
+    values = dict(
+        scan_changes_since=assume_after_date,
+        last_change_time=last_change_time,
+        last_dataset_id=last_dataset_id,
+        dataset_count=dataset_count,
+        checkpoint_time=func.now(),
+    )
+    conn.execute(
+        postgres.insert(EXTENT_REFRESH_CHECKPOINT)
+        .values(dataset_type_ref=product.id, **values)
+        .on_conflict_do_update(index_elements=["dataset_type_ref"], set_=values)
+    )
+
+
+def _change_position_literal(change_time: datetime, dataset_id: uuid.UUID):
+    """A (change time, dataset id) position, for comparing with dataset rows"""
+    return tuple_(
+        literal(change_time, TIMESTAMP(timezone=True)),
+        literal(dataset_id, DATASET.c.id.type),
+    )
+
+
+# Synthesized footprints are bulk-loaded into this, then copied to the spatial table.
+_PATH_ROW_FOOTPRINT = Table(
+    "path_row_footprint",
+    MetaData(),
+    Column("id", postgres.UUID(as_uuid=True), primary_key=True),
+    Column("footprint", Geometry(srid=4326, spatial_index=False)),
+    prefixes=["temporary"],
+    postgresql_on_commit="drop",
+)
+
+
+def _synthesize_path_row_footprints(
+    engine: Engine, product: DatasetType, assume_after_date: Optional[datetime]
+) -> int:
+    """
+    Set the footprints of a non-spatial product's datasets from their WRS path/rows.
+
+    :param assume_after_date: Only those datasets changed after this (db server) time.
+                              If None, all datasets of the product.
+
+    Returns the count of datasets updated.
+    """
+    fields = product.metadata_type.dataset_fields
+    query = (
+        select(
+            [
+                DATASET.c.id,
+                fields["sat_path"].alchemy_expression.label("sat_path"),
+                fields["sat_row"].alchemy_expression.label("sat_row"),
+            ]
+        )
+        .where(DATASET.c.dataset_type_ref == product.id)
+        .where(DATASET.c.archived.is_(None))
+    )
+    if assume_after_date is not None:
+        query = query.where(dataset_changed_expression() > assume_after_date)
+
+    footprints = [
+        dict(
+            id=id_,
+            footprint=_path_row_footprint(
+                int(sat_path.lower), int(sat_row.lower), int(sat_row.upper)
+            ),
+        )
+        for id_, sat_path, sat_row in engine.execute(query)
+        if sat_path is not None and sat_path.lower is not None
+    ]
+    if not footprints:
+        return 0
+
+    with engine.begin() as conn:
+        _PATH_ROW_FOOTPRINT.create(conn)
+        conn.execute(_PATH_ROW_FOOTPRINT.insert(), footprints)
+        return conn.execute(
+            DATASET_SPATIAL.update()
+            .values(footprint=_PATH_ROW_FOOTPRINT.c.footprint)
+            .where(DATASET_SPATIAL.c.id == _PATH_ROW_FOOTPRINT.c.id)
+        ).rowcount
+
+
+@functools.lru_cache(maxsize=4096)
+def _path_row_footprint(path: int, row_start: int, row_end: int) -> WKBElement:
+    """
+    The combined shape of a range of WRS rows in a path.
+
+    (Most datasets share a handful of ranges, so these are cached)
+    """
+    shapes = _get_path_row_shapes()
+    return from_shape(
+        shapely.ops.unary_union(
+            [shapes[(path, row)] for row in range(row_start, row_end + 1)]
+        ),
+        srid=4326,
+        extended=True,
+    )
+
+
 def _select_dataset_extent_columns(dt: DatasetType) -> List[Label]:
     """
     Get columns for all fields which go into the spatial table
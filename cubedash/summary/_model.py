@@ -1,20 +1,54 @@
 import warnings
-from collections import Counter
 from dataclasses import dataclass
 from datetime import date, datetime
-from typing import Iterable, List, Optional, Set, Tuple, Union
+from typing import Iterable, List, Mapping, Optional, Set, Tuple, Union
 
+import numpy as np
 import shapely
-import shapely.ops
 import structlog
 from datacube.model import Dataset, Range
 from datacube.utils.geometry import Geometry
+from shapely.errors import GEOSException
 from shapely.geometry import MultiPolygon
 from shapely.geometry.base import BaseGeometry
 
+from cubedash.summary._counters import RegionCounts, TimelineCounts
+
 _LOG = structlog.get_logger()
 
 
+class EncodedGeometry(bytes):
+    """
+    The (E)WKB of a geometry that hasn't been decoded yet.
+    """
+
+
+class _LazyGeometry:
+    """
+    A geometry attribute that may be given as an `EncodedGeometry`, to be decoded
+    only when first used.
+
+    (Pages often load summaries only for their counts, and footprints can be
+    megabytes.)
+    """
+
+    def __set_name__(self, owner, name):
+        self._attribute = f"_{name}"
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            # Not a default value: dataclasses should treat the field as required.
+            raise AttributeError(self._attribute)
+        value = instance.__dict__[self._attribute]
+        if isinstance(value, EncodedGeometry):
+            value = shapely.from_wkb(bytes(value))
+            instance.__dict__[self._attribute] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self._attribute] = value
+
+
 @dataclass
 class TimePeriodOverview:
     # These four elements make up a pseudo-id of the time period we've summarised.
@@ -26,14 +60,18 @@ class TimePeriodOverview:
     day: Optional[int]
 
     dataset_count: int
-    timeline_dataset_counts: Counter
-    region_dataset_counts: Counter
+    # (A TimelineCounts/RegionCounts when loaded or combined. Any Counter-like
+    #  mapping is accepted.)
+    timeline_dataset_counts: Mapping[Union[date, datetime], int]
+    region_dataset_counts: Mapping[Optional[str], int]
 
     timeline_period: str
 
     time_range: Range
 
-    footprint_geometry: Union[shapely.geometry.MultiPolygon, shapely.geometry.Polygon]
+    footprint_geometry: Union[
+        shapely.geometry.MultiPolygon, shapely.geometry.Polygon
+    ] = _LazyGeometry()
     footprint_crs: str
 
     footprint_count: int
@@ -52,6 +90,13 @@ class TimePeriodOverview:
     # When this summary was generated. Set on the server.
     summary_gen_time: datetime = None
 
+    # The GeoJSON of footprint_wgs84, if it was stored with the summary.
+    footprint_wgs84_geojson: Optional[str] = None
+    # Coarser versions of it, and the resolution (in metres) of every version,
+    # coarsest first.
+    footprint_wgs84_coarse_geojson: Optional[List[str]] = None
+    footprint_wgs84_resolutions: Optional[List[float]] = None
+
     def __str__(self):
         return (
             f"{self.label} "
@@ -138,10 +183,13 @@ class TimePeriodOverview:
             # output crs setting on an existing cubedash instance.
             raise NotImplementedError("Time summaries use inconsistent CRSes.")
 
-        timeline_counter = Counter()
-        for p in periods:
-            timeline_counter.update(p.timeline_dataset_counts)
-            period = p.timeline_period
+        timeline_counter = TimelineCounts.merge(
+            TimelineCounts.of(p.timeline_dataset_counts)
+            for p in periods
+            if p.timeline_dataset_counts is not None
+        )
+        if periods:
+            period = periods[-1].timeline_period
         timeline_counter, period = cls._group_counter_if_needed(
             timeline_counter, period
         )
@@ -149,24 +197,13 @@ class TimePeriodOverview:
         # The period elements that are the same across all of them.
         # (it will be the period of the result)
         common_time_period = list(periods[0].period_tuple) if periods else ([None] * 4)
-        region_counter = Counter()
+        region_counter = RegionCounts.merge(
+            RegionCounts.of(p.region_dataset_counts)
+            for p in periods
+            if p.region_dataset_counts is not None
+        )
 
         for time_period in periods:
-            region_counter.update(time_period.region_dataset_counts)
-
-            # Attempt to fix broken geometries.
-            # -> The 'high_tide_comp_20p' tests give an example of this: geometry is valid when
-            #    created, but after serialisation+deserialisation become invalid due to float
-            #    rounding.
-            if (
-                time_period.footprint_geometry
-                and not time_period.footprint_geometry.is_valid
-            ):
-                _LOG.info("invalid_stored_geometry", summary=time_period.period_tuple)
-                time_period.footprint_geometry = time_period.footprint_geometry.buffer(
-                    0
-                )
-
             # We're looking for the time period common to them all.
             # Strike out any elements that differ between our periods.
             this_period = time_period.period_tuple
@@ -176,18 +213,24 @@ class TimePeriodOverview:
                     _erase_elements_from(common_time_period, i)
                     break
 
-        with_valid_geometries = [
-            p
-            for p in periods
-            if p.footprint_count
-            and p.footprint_geometry
-            and p.footprint_geometry.is_valid
-            and not p.footprint_geometry.is_empty
-        ]
-
-        geometry_union = _create_unified_footprint(
-            with_valid_geometries, footprint_tolerance
+        footprints = np.array(
+            [p.footprint_geometry if p.footprint_count else None for p in periods],
+            dtype=object,
         )
+        # Attempt to fix broken geometries.
+        # -> The 'high_tide_comp_20p' tests give an example of this: geometry is valid when
+        #    created, but after serialisation+deserialisation become invalid due to float
+        #    rounding.
+        invalid = ~shapely.is_valid(footprints) & ~shapely.is_missing(footprints)
+        if invalid.any():
+            for i in np.flatnonzero(invalid):
+                _LOG.info("invalid_stored_geometry", summary=periods[i].period_tuple)
+            footprints[invalid] = shapely.make_valid(footprints[invalid])
+
+        polygons, period_indexes = _polygonal_parts(footprints)
+        with_valid_geometries = [periods[i] for i in np.unique(period_indexes)]
+
+        geometry_union = _create_unified_footprint(polygons, footprint_tolerance)
         total_datasets = sum(p.dataset_count for p in periods)
 
         # Non-null properties here are the ones that are the same across all inputs.
@@ -237,6 +280,23 @@ class TimePeriodOverview:
 
     @property
     def footprint_wgs84(self) -> Optional[MultiPolygon]:
+        # It's parsed (or reprojected) only once per instance, as pages use it
+        # several times. Again only if the footprint it came from is replaced.
+        if self.footprint_wgs84_geojson:
+            source = (self.footprint_wgs84_geojson, None, None)
+        else:
+            source = (None, self.footprint_geometry, self.footprint_crs)
+        cached = self.__dict__.get("_footprint_wgs84")
+        if cached is not None and all(a is b for a, b in zip(cached[0], source)):
+            return cached[1]
+
+        footprint = self._calculate_footprint_wgs84()
+        self.__dict__["_footprint_wgs84"] = (source, footprint)
+        return footprint
+
+    def _calculate_footprint_wgs84(self) -> Optional[MultiPolygon]:
+        if self.footprint_wgs84_geojson:
+            return shapely.from_geojson(self.footprint_wgs84_geojson)
         if not self.footprint_geometry:
             return None
         if not self.footprint_crs:
@@ -249,19 +309,55 @@ class TimePeriodOverview:
             .geom
         )
 
+    def footprint_wgs84_geojson_at(self, resolution: Optional[float]) -> Optional[str]:
+        """
+        The least detailed stored GeoJSON footprint that's good enough for the given
+        resolution (in metres). The most detailed if None.
+        """
+        level = self._footprint_wgs84_coarse_level(resolution)
+        if level is None:
+            return self.footprint_wgs84_geojson
+        return self.footprint_wgs84_coarse_geojson[level]
+
+    def footprint_wgs84_resolution_at(
+        self, resolution: Optional[float]
+    ) -> Optional[float]:
+        """
+        The resolution of the footprint that `footprint_wgs84_geojson_at()` gives
+        for the given resolution. None if it's the most detailed.
+
+        (So any resolutions that give the same footprint can be treated alike.)
+        """
+        level = self._footprint_wgs84_coarse_level(resolution)
+        if level is None:
+            return None
+        return self.footprint_wgs84_resolutions[level]
+
+    def _footprint_wgs84_coarse_level(
+        self, resolution: Optional[float]
+    ) -> Optional[int]:
+        """
+        The index of the coarse footprint that's good enough for the resolution.
+        None for the most detailed one.
+        """
+        if resolution is None or not self.footprint_wgs84_resolutions:
+            return None
+        # Coarsest first, and the last is the most detailed.
+        for level, level_resolution in enumerate(self.footprint_wgs84_resolutions[:-1]):
+            if level_resolution <= resolution:
+                return level
+        return None
+
     @staticmethod
-    def _group_counter_if_needed(counter, period):
+    def _group_counter_if_needed(
+        counter: TimelineCounts, period: str
+    ) -> Tuple[TimelineCounts, str]:
         if len(counter) > 366:
             if period == "day":
-                counter = Counter(
-                    datetime(date.year, date.month, 1).date()
-                    for date in counter.elements()
-                )
+                counter = counter.grouped("month")
                 period = "month"
             elif period == "month":
-                counter = Counter(
-                    datetime(date.year, 1, 1).date() for date in counter.elements()
-                )
+                counter = counter.grouped("year")
                 period = "year"
 
         return counter, period
@@ -301,38 +397,50 @@ def _erase_elements_from(items: List, start_i: int):
     return items
 
 
+def _polygonal_parts(geometries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split the geometries into their non-empty polygons, dropping any other parts
+    (such as the lines and points that `make_valid()` leaves from collapsed areas).
+
+    Returns the polygons, and the index of the geometry that each came from.
+    """
+    parts, indexes = shapely.get_parts(geometries, return_index=True)
+    # Collections (from make_valid()) may contain multipolygons.
+    parts, part_indexes = shapely.get_parts(parts, return_index=True)
+    indexes = indexes[part_indexes]
+
+    is_polygon = shapely.get_type_id(parts) == shapely.GeometryType.POLYGON
+    keep = is_polygon & ~shapely.is_empty(parts)
+    return parts[keep], indexes[keep]
+
+
 def _create_unified_footprint(
-    with_valid_geometries: List["TimePeriodOverview"], footprint_tolerance: float
-):
+    polygons: np.ndarray, footprint_tolerance: Optional[float]
+) -> Optional[BaseGeometry]:
     """
-    Union the given time period's footprints, trying to fix any invalid geometries.
+    Union the given polygons into a (simplified) footprint.
     """
-    if not with_valid_geometries:
+    if len(polygons) == 0:
         return None
 
     try:
-        geometry_union = shapely.ops.unary_union(
-            [p.footprint_geometry for p in with_valid_geometries]
-        )
-    except ValueError:
-        # Attempt 2 at union: Exaggerate the overlap *slightly* to
-        # avoid non-noded intersection.
-        # TODO: does shapely have a snap-to-grid?
+        geometry_union = shapely.union_all(polygons)
+    except GEOSException:
+        # Attempt 2 at union: Snap to a grid far finer than our simplification,
+        # which avoids non-noded intersections.
+        _LOG.warning("summary.footprint.invalid_union", exc_info=True)
+        grid_size = (footprint_tolerance or 1.0) / 1000
         try:
-            _LOG.warning("summary.footprint.invalid_union", exc_info=True)
-            geometry_union = shapely.ops.unary_union(
-                [p.footprint_geometry.buffer(0.001) for p in with_valid_geometries]
-            )
-        except ValueError:
-            _LOG.warning("summary.footprint.invalid_buffered_union", exc_info=True)
+            geometry_union = shapely.union_all(polygons, grid_size=grid_size)
+        except GEOSException:
+            _LOG.warning("summary.footprint.invalid_gridded_union", exc_info=True)
 
             # Attempt 3 at union: Recursive filter bad polygons first
-            polygonlist = _polygon_chain(with_valid_geometries)
-            filtered_geom = _filter_geom(polygonlist)
-            geometry_union = shapely.ops.unary_union(filtered_geom)
+            filtered_geom = _filter_geom(list(polygons), grid_size=grid_size)
+            geometry_union = shapely.union_all(filtered_geom, grid_size=grid_size)
 
     if footprint_tolerance is not None:
-        geometry_union = geometry_union.simplify(footprint_tolerance)
+        geometry_union = shapely.simplify(geometry_union, footprint_tolerance)
 
     return geometry_union
 
@@ -342,35 +450,90 @@ def _polygon_chain(valid_geometries: Iterable[TimePeriodOverview]) -> list:
     polygonlist = []
     for poly in valid_geometries:
         if type(poly.footprint_geometry) is MultiPolygon:
-            for p in list(poly.footprint_geometry):
+            for p in poly.footprint_geometry.geoms:
                 polygonlist.append(p)
         else:
             polygonlist.append(poly.footprint_geometry)
     return polygonlist
 
 
-def _filter_geom(geomlist: List[BaseGeometry], start=0) -> List[BaseGeometry]:
+def _filter_geom(
+    geomlist: List[BaseGeometry], grid_size: float = None
+) -> List[BaseGeometry]:
+    """
+    Filter out polygons that can't be unioned with the others (eg. they cause a
+    "non-noded intersection" error).
+
+    The list is bisected: each half is filtered alone, then any polygons of the
+    second half that conflict with the union of the first are found by bisecting
+    it again. Only the halves with errors are searched further, so removing k bad
+    polygons takes O(k log n) unions.
+    """
+    kept, _ = _unionable(geomlist, list(range(len(geomlist))), grid_size)
+    if len(kept) < len(geomlist):
+        removed = sorted(set(range(len(geomlist))) - set(kept))
+        _LOG.warning(
+            "summary.footprint.removed_ununionable",
+            removed_count=len(removed),
+            removed_indexes=removed,
+        )
+    return [geomlist[i] for i in kept]
+
+
+def _unionable(
+    geomlist: List[BaseGeometry], indexes: List[int], grid_size: Optional[float]
+) -> Tuple[List[int], Optional[BaseGeometry]]:
+    """
+    Find which of the given geometries (by index) can be unioned together.
+
+    Returns their indexes, and their union (None if there are none).
+    """
+    try:
+        return indexes, shapely.union_all(
+            [geomlist[i] for i in indexes], grid_size=grid_size
+        )
+    except GEOSException:
+        if len(indexes) == 1:
+            return [], None
+
+    middle = len(indexes) // 2
+    first, first_union = _unionable(geomlist, indexes[:middle], grid_size)
+    second, second_union = _unionable(geomlist, indexes[middle:], grid_size)
+    if first_union is None:
+        return second, second_union
+    if second_union is None:
+        return first, first_union
+
+    try:
+        return first + second, shapely.union_all(
+            [first_union, second_union], grid_size=grid_size
+        )
+    except GEOSException:
+        # Each half is fine alone, so find which of the second conflict with the first.
+        compatible, union = _unionable_with(geomlist, second, first_union, grid_size)
+        return first + compatible, union
+
+
+def _unionable_with(
+    geomlist: List[BaseGeometry],
+    indexes: List[int],
+    base: BaseGeometry,
+    grid_size: Optional[float],
+) -> Tuple[List[int], BaseGeometry]:
     """
-    Recursive filtering of un-unionable polygons. Input list is modified in-place.
-    Exhaustively searches for a run of polygons that cause a union error
-    (eg. "non-noded intersection"), and cuts out the first one that it finds.
+    Find which of the given geometries (by index) can be unioned onto the base.
+
+    Returns their indexes, and the union of them with the base.
     """
-    # Pass through empty lists
-    if len(geomlist) == 0:
-        return geomlist
-    # Process non-empty lists
-    if start == len(geomlist):
-        geomlist.pop()
-        return geomlist
-    else:
-        for i in range(len(geomlist) - start):
-            try:
-                shapely.ops.unary_union(geomlist[0 : i + start])
-            except ValueError:
-                del geomlist[i + start]
-                start = start + i
-                break
-            if i == len(geomlist) - 1 - start:
-                return geomlist
-        _filter_geom(geomlist, start)
-    return geomlist
+    try:
+        return indexes, shapely.union_all(
+            [base, *(geomlist[i] for i in indexes)], grid_size=grid_size
+        )
+    except GEOSException:
+        if len(indexes) == 1:
+            return [], base
+
+    middle = len(indexes) // 2
+    first, union = _unionable_with(geomlist, indexes[:middle], base, grid_size)
+    second, union = _unionable_with(geomlist, indexes[middle:], union, grid_size)
+    return first + second, union
@@ -0,0 +1,121 @@
+"""
+Measure where the time (and memory) of a product refresh goes.
+"""
+
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import structlog
+
+_LOG = structlog.get_logger()
+
+
+@dataclass
+class PhaseMeasurement:
+    product_name: str
+    # eg. "spatial_insert", "month"
+    phase: str
+    # eg. "2017-04" for a month phase.
+    period: Optional[str] = None
+
+    seconds: float = 0.0
+    # Rows changed by the phase, where it's known.
+    rows: Optional[int] = None
+    # Peak python memory allocated during the phase (above that allocated at its start).
+    # Only measured when tracing memory.
+    peak_memory_bytes: Optional[int] = None
+
+
+class RefreshProfile:
+    """
+    Collect the wall time, changed row count and peak memory of each phase of a
+    product refresh.
+
+    Each finished phase is logged as a `refresh.phase` event.
+
+    Python memory is only measured if `trace_memory` is set, as tracemalloc
+    slows allocation-heavy code significantly.
+    """
+
+    def __init__(self, product_name: str, trace_memory: bool = False) -> None:
+        self.product_name = product_name
+        self.trace_memory = trace_memory
+        self.phases: List[PhaseMeasurement] = []
+
+    @contextmanager
+    def phase(self, name: str, period: str = None) -> Iterator[PhaseMeasurement]:
+        """
+        Measure a phase. Set `rows` on the yielded measurement if known.
+
+        (Phases shouldn't be nested, as their memory peaks would overlap.)
+        """
+        measurement = PhaseMeasurement(self.product_name, name, period=period)
+
+        start_memory = None
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            start_memory, _ = tracemalloc.get_traced_memory()
+
+        start_time = time.perf_counter()
+        try:
+            yield measurement
+        finally:
+            measurement.seconds = time.perf_counter() - start_time
+            if start_memory is not None:
+                _, peak_memory = tracemalloc.get_traced_memory()
+                measurement.peak_memory_bytes = max(peak_memory - start_memory, 0)
+            # Don't leave tracing (and its overhead) on for the rest of the process.
+            if started_tracing:
+                tracemalloc.stop()
+
+            self.phases.append(measurement)
+            _LOG.info("refresh.phase", **asdict(measurement))
+
+
+def summarise_phases(
+    phases: Iterable[PhaseMeasurement],
+) -> List[Tuple[PhaseMeasurement, int]]:
+    """
+    Total the measurements of each phase of each product (eg. all of its months),
+    slowest first.
+
+    Returns each total with the count of measurements it contains. The memory
+    peak of a total is the largest of its peaks.
+    """
+    totals: Dict[Tuple[str, str], PhaseMeasurement] = {}
+    counts = defaultdict(int)
+    for m in phases:
+        key = (m.product_name, m.phase)
+        counts[key] += 1
+        total = totals.get(key)
+        if total is None:
+            totals[key] = PhaseMeasurement(
+                m.product_name,
+                m.phase,
+                seconds=m.seconds,
+                rows=m.rows,
+                peak_memory_bytes=m.peak_memory_bytes,
+            )
+            continue
+
+        total.seconds += m.seconds
+        if m.rows is not None:
+            total.rows = (total.rows or 0) + m.rows
+        if m.peak_memory_bytes is not None:
+            total.peak_memory_bytes = max(
+                total.peak_memory_bytes or 0, m.peak_memory_bytes
+            )
+
+    return sorted(
+        ((total, counts[key]) for key, total in totals.items()),
+        key=lambda item: item[0].seconds,
+        reverse=True,
+    )
@@ -12,6 +12,7 @@ from sqlalchemy import (
     Column,
     Date,
     DateTime,
+    Float,
     ForeignKey,
     Index,
     Integer,
@@ -21,6 +22,7 @@ from sqlalchemy import (
     SmallInteger,
     String,
     Table,
+    Text,
     bindparam,
     func,
     select,
@@ -41,6 +43,10 @@ CUBEDASH_SCHEMA = "cubedash"
 METADATA = MetaData(schema=CUBEDASH_SCHEMA)
 GRIDCELL_COL_SPEC = f"{CUBEDASH_SCHEMA}.gridcell"
 
+# Postgres NOTIFY channel (and the trigger sending to it) for changes to ODC datasets.
+DATASET_CHANGE_CHANNEL = "cubedash_dataset_change"
+DATASET_CHANGE_TRIGGER_NAME = "cubedash_dataset_change_notify"
+
 DATASET_SPATIAL = Table(
     "dataset_spatial",
     METADATA,
@@ -183,6 +189,14 @@ TIME_OVERVIEW = Table(
     Column("footprint_count", Integer, nullable=False),
     # SRID is overridden via config.
     Column("footprint_geometry", Geometry(srid=-999, spatial_index=False)),
+    # The footprint in WGS84 (split at the antimeridian and simplified), and as
+    # GeoJSON, ready for the web. Null if written by an older version.
+    Column("footprint_wgs84", Geometry(srid=4326, spatial_index=False)),
+    Column("footprint_wgs84_geojson", Text),
+    # Coarser versions of the WGS84 GeoJSON for smaller maps, and the resolution
+    # (in metres) of every version, coarsest first.
+    Column("footprint_wgs84_coarse_geojson", postgres.ARRAY(Text)),
+    Column("footprint_wgs84_resolutions", postgres.ARRAY(Float)),
     Column("crses", postgres.ARRAY(String)),
     # Size of this dataset in bytes, if the product includes it.
     Column("size_bytes", BigInteger),
@@ -216,6 +230,32 @@ REGION = Table(
     PrimaryKeyConstraint("dataset_type_ref", "region_code"),
 )
 
+# How far an unfinished refresh of a product's dataset extents got, so that it can resume.
+#
+# Changed datasets are refreshed in batches, ordered by (change time, id),
+# and the position is recorded after each batch.
+EXTENT_REFRESH_CHECKPOINT = Table(
+    "extent_refresh_checkpoint",
+    METADATA,
+    Column("dataset_type_ref", SmallInteger, primary_key=True),
+    Column(
+        "scan_changes_since",
+        DateTime(timezone=True),
+        nullable=True,
+        comment="The refresh was scanning datasets changed after this time "
+        "(null for all datasets)",
+    ),
+    Column("last_change_time", DateTime(timezone=True), nullable=False),
+    Column("last_dataset_id", postgres.UUID(as_uuid=True), nullable=False),
+    Column("dataset_count", Integer, nullable=False),
+    Column(
+        "checkpoint_time",
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    ),
+)
+
 
 _REF_TABLE_METADATA = MetaData(schema=CUBEDASH_SCHEMA)
 # This is a materialised view of the postgis spatial_ref_sys for lookups.
@@ -259,6 +299,10 @@ def is_compatible_schema(engine: Engine) -> bool:
         engine, f"{CUBEDASH_SCHEMA}.product", "last_successful_summary"
     ):
         is_latest = False
+    if not pg_column_exists(
+        engine, f"{CUBEDASH_SCHEMA}.time_overview", "footprint_wgs84_resolutions"
+    ):
+        is_latest = False
 
     if pg_exists(engine, f"{CUBEDASH_SCHEMA}.mv_region"):
         warnings.warn(
@@ -277,7 +321,11 @@ def is_compatible_generate_schema(engine: Engine) -> bool:
     is_latest = is_compatible_schema(engine)
 
     # Incremental update scanning requires the optional `update` column on ODC.
-    return is_latest and pg_column_exists(engine, ODC_DATASET.fullname, "updated")
+    return (
+        is_latest
+        and pg_column_exists(engine, ODC_DATASET.fullname, "updated")
+        and pg_exists(engine, EXTENT_REFRESH_CHECKPOINT.fullname)
+    )
 
 
 class SchemaNotRefreshableError(Exception):
@@ -351,6 +399,35 @@ def update_schema(engine: Engine) -> Set[PleaseRefresh]:
         """
         )
 
+    if not pg_column_exists(
+        engine, f"{CUBEDASH_SCHEMA}.time_overview", "footprint_wgs84_geojson"
+    ):
+        _LOG.warning("schema.applying_update.add_footprint_wgs84")
+        # Existing summaries will have theirs projected on request, until refreshed.
+        engine.execute(
+            f"""
+            alter table {CUBEDASH_SCHEMA}.time_overview
+            add column footprint_wgs84 geometry(Geometry, 4326) null,
+            add column footprint_wgs84_geojson text null
+        """
+        )
+
+    if not pg_column_exists(
+        engine, f"{CUBEDASH_SCHEMA}.time_overview", "footprint_wgs84_resolutions"
+    ):
+        _LOG.warning("schema.applying_update.add_footprint_wgs84_levels")
+        engine.execute(
+            f"""
+            alter table {CUBEDASH_SCHEMA}.time_overview
+            add column footprint_wgs84_coarse_geojson text[] null,
+            add column footprint_wgs84_resolutions double precision[] null
+        """
+        )
+
+    if not pg_exists(engine, EXTENT_REFRESH_CHECKPOINT.fullname):
+        _LOG.warning("schema.applying_update.add_extent_refresh_checkpoint")
+        EXTENT_REFRESH_CHECKPOINT.create(engine)
+
     check_or_update_odc_schema(engine)
 
     return refresh
@@ -385,6 +462,29 @@ def check_or_update_odc_schema(engine: Engine):
             )
         ) from e
 
+    # A notification trigger lets `cubedash-gen --watch` hear about changes as they happen.
+    # It's optional: without it, watch mode will poll the dataset table instead.
+    try:
+        if not pg_trigger_exists(
+            engine, ODC_DATASET.fullname, DATASET_CHANGE_TRIGGER_NAME
+        ):
+            _LOG.warning("schema.applying_update.add_dataset_change_notify_trigger")
+            install_dataset_change_notify_trigger(engine)
+    except ProgrammingError:
+        warnings.warn(
+            dedent(
+                """
+            No dataset-change notification trigger.
+
+            Explorer does not have permission to add its notification trigger to the
+            ODC dataset table, so `cubedash-gen --watch` will poll for changes instead.
+
+            Rerun `cubedash-gen --init` as the owner of the ODC schema to install it.
+        """
+            ),
+            stacklevel=2,
+        )
+
     # Add optional indexes to AGDC if we have permission.
     # (otherwise we warn the user that it may be slow, and how to add it themselves)
     statements = []
@@ -459,6 +559,58 @@ def pg_index_exists(conn, schema_name: str, table_name: str, index_name: str) ->
     )
 
 
+def pg_trigger_exists(conn, table_name: str, trigger_name: str) -> bool:
+    """
+    Does a trigger of the given name exist on the table?
+    """
+    return (
+        conn.execute(
+            """
+        select 1
+        from pg_trigger
+        where tgrelid = to_regclass(%s)
+            and tgname = %s
+            """,
+            table_name,
+            trigger_name,
+        ).scalar()
+        is not None
+    )
+
+
+def install_dataset_change_notify_trigger(engine: Engine):
+    """
+    Add a trigger to ODC's dataset table that notifies listeners of changed products.
+
+    Each notification's payload is the changed dataset's product (dataset_type) id.
+
+    (Postgres merges identical notifications sent within one transaction, so bulk
+     indexing sends one notification per product, not one per dataset.)
+
+    The function lives in our own schema, so dropping Explorer's schema removes the
+    trigger too.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            f"""
+        create or replace function {CUBEDASH_SCHEMA}.notify_dataset_change()
+        returns trigger language plpgsql as $$
+        begin
+            perform pg_notify('{DATASET_CHANGE_CHANNEL}', new.dataset_type_ref::text);
+            return null;
+        end;
+        $$;
+        """
+        )
+        conn.execute(
+            f"""
+        create trigger {DATASET_CHANGE_TRIGGER_NAME}
+            after insert or update on {ODC_DATASET.fullname}
+            for each row execute procedure {CUBEDASH_SCHEMA}.notify_dataset_change();
+        """
+        )
+
+
 def get_postgis_versions(conn) -> str:
     """What versions of Postgis, Postgres and libs do we have?"""
     return conn.execute(select([func.postgis_full_version()])).scalar()
@@ -1,18 +1,22 @@
 import math
 import re
-from collections import Counter, defaultdict
+import threading
+from collections import defaultdict
 from copy import copy
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from enum import Enum, auto
 from itertools import groupby
+from pathlib import Path
 from typing import (
     Any,
+    Collection,
     Dict,
     Generator,
     Iterable,
     Iterator,
     List,
+    Mapping,
     Optional,
     Sequence,
     Set,
@@ -22,11 +26,15 @@ from typing import (
 from uuid import UUID
 
 import dateutil.parser
+import orjson
 import pytz
+import shapely
 import structlog
+from cachetools import TTLCache
 from cachetools.func import lru_cache, ttl_cache
 from dateutil import tz
 from eodatasets3.stac import MAPPING_EO3_TO_STAC
+from geoalchemy2 import Geometry as PostgisGeometry
 from geoalchemy2 import WKBElement
 from geoalchemy2 import shape as geo_shape
 from geoalchemy2.shape import from_shape, to_shape
@@ -38,19 +46,27 @@ from pygeofilter.parsers.cql2_text import parse as parse_cql2_text
 from shapely.geometry.base import BaseGeometry
 from sqlalchemy import (
     DDL,
+    Date,
+    DateTime,
+    Float,
     String,
     and_,
+    bindparam,
+    case,
     exists,
     func,
     literal,
+    null,
     or_,
     select,
+    text,
     union_all,
 )
 from sqlalchemy.dialects import postgresql as postgres
 from sqlalchemy.dialects.postgresql import TSTZRANGE
 from sqlalchemy.engine import Engine
-from sqlalchemy.sql import Select
+from sqlalchemy.exc import DataError, InternalError
+from sqlalchemy.sql import ColumnElement, Select, TextClause
 
 try:
     from cubedash._version import version as explorer_version
@@ -65,14 +81,19 @@ from datacube.utils.geometry import Geometry
 from cubedash import _utils
 from cubedash._utils import ODC_DATASET, ODC_DATASET_LOCATION, ODC_DATASET_TYPE
 from cubedash.summary import RegionInfo, TimePeriodOverview, _extents, _schema
+from cubedash.summary._counters import RegionCounts, TimelineCounts
 from cubedash.summary._extents import (
     ProductArrival,
     RegionSummary,
     dataset_changed_expression,
     datetime_expression,
 )
+from cubedash.summary._model import EncodedGeometry
+from cubedash.summary._profile import RefreshProfile
 from cubedash.summary._schema import (
+    CUBEDASH_SCHEMA,
     DATASET_SPATIAL,
+    EXTENT_REFRESH_CHECKPOINT,
     FOOTPRINT_SRID_EXPRESSION,
     PRODUCT,
     REGION,
@@ -82,7 +103,12 @@ from cubedash.summary._schema import (
     get_srid_name,
     refresh_supporting_views,
 )
-from cubedash.summary._summarise import DEFAULT_TIMEZONE, Summariser
+from cubedash.summary._summarise import (
+    _DEGREES_PER_METRE,
+    DEFAULT_TIMEZONE,
+    FootprintUnionSettings,
+    Summariser,
+)
 
 DEFAULT_TTL = 90
 
@@ -185,6 +211,47 @@ class ProductSummary:
                 return
 
 
+@dataclass
+class RefreshPlan:
+    """What would a product refresh do? (see `SummaryStore.plan_refresh()`)"""
+
+    product_name: str
+    # Has the product never been summarised before?
+    is_new: bool
+
+    # Datasets changed after this (db server) time will be scanned. None for all datasets.
+    scan_changes_since: Optional[datetime]
+    # How many datasets (including archived) will have their extents refreshed
+    changed_dataset_count: int
+
+    # Months to regenerate, with their count of changed datasets.
+    months: List[Tuple[date, int]]
+    # Years to regenerate.
+    years: List[int]
+
+    # Based on the product's previous refresh. None if it has no history.
+    estimated_duration: Optional[timedelta] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(
+            product_name=self.product_name,
+            is_new=self.is_new,
+            scan_changes_since=(
+                None
+                if self.scan_changes_since is None
+                else self.scan_changes_since.isoformat()
+            ),
+            changed_dataset_count=self.changed_dataset_count,
+            months={month.strftime("%Y-%m"): count for month, count in self.months},
+            years=self.years,
+            estimated_seconds=(
+                None
+                if self.estimated_duration is None
+                else round(self.estimated_duration.total_seconds(), 1)
+            ),
+        )
+
+
 @dataclass
 class DatasetItem:
     dataset_id: UUID
@@ -242,6 +309,10 @@ class SummaryStore:
         self._engine: Engine = _utils.alchemy_engine(index)
         self._summariser = summariser
 
+        # Product summaries by name. Loaded one at a time, or all at once.
+        self._product_summaries = TTLCache(maxsize=4096, ttl=DEFAULT_TTL)
+        self._product_summaries_lock = threading.Lock()
+
         # How much extra time to include in incremental update scans?
         #    The incremental-updater searches for any datasets with a newer change-timestamp than
         #    its last successul run. But some earlier-timestamped datasets may not have been
@@ -326,12 +397,18 @@ class SummaryStore:
 
     @classmethod
     def create(
-        cls, index: Index, log=_LOG, grouping_time_zone=DEFAULT_TIMEZONE
+        cls,
+        index: Index,
+        log=_LOG,
+        grouping_time_zone=DEFAULT_TIMEZONE,
+        footprint_union: Mapping[Optional[str], FootprintUnionSettings] = None,
     ) -> "SummaryStore":
         return cls(
             index,
             Summariser(
-                _utils.alchemy_engine(index), grouping_time_zone=grouping_time_zone
+                _utils.alchemy_engine(index),
+                grouping_time_zone=grouping_time_zone,
+                footprint_union=footprint_union,
             ),
             log=log,
         )
@@ -347,6 +424,17 @@ class SummaryStore:
             self._engine.execute(select([FOOTPRINT_SRID_EXPRESSION])).scalar()
         )
 
+    def clear_product_caches(self):
+        """
+        Forget any cached information about products.
+
+        Long-lived stores should call this before a task if other processes may have
+        refreshed products in the meantime.
+        """
+        self._clear_product_summaries()
+        self._region_summaries.cache_clear()
+        self.product_location_samples.cache_clear()
+
     def close(self):
         """Close any pooled/open connections. Necessary before forking."""
         self.index.close()
@@ -375,34 +463,77 @@ class SummaryStore:
             ).where(ODC_DATASET.c.dataset_type_ref == dataset_type.id)
         ).scalar()
 
+    def find_products_changed_since(self, since: datetime) -> Dict[int, datetime]:
+        """
+        Find products that have datasets changed after the given (db server) time.
+
+        Returns the most recent change time of each, keyed by ODC product id.
+        """
+        return {
+            product_ref: most_recent_change
+            for product_ref, most_recent_change in self._engine.execute(
+                select(
+                    [
+                        ODC_DATASET.c.dataset_type_ref,
+                        func.max(dataset_changed_expression()),
+                    ]
+                )
+                .where(dataset_changed_expression() > since)
+                .group_by(ODC_DATASET.c.dataset_type_ref)
+            )
+        }
+
     def find_months_needing_update(
         self,
         product_name: str,
-        only_those_newer_than: datetime,
+        only_those_newer_than: Optional[datetime],
     ) -> Iterable[Tuple[date, int]]:
         """
         What months have had dataset changes since they were last generated?
+
+        (A null date will give every month that has datasets.)
         """
         dataset_type = self.get_dataset_type(product_name)
 
         # Find the most-recently updated datasets and group them by month.
+        query = (
+            select(
+                [
+                    func.date_trunc(
+                        "month", datetime_expression(dataset_type.metadata_type)
+                    ).label("month"),
+                    func.count(),
+                ]
+            )
+            .where(ODC_DATASET.c.dataset_type_ref == dataset_type.id)
+            .group_by("month")
+            .order_by("month")
+        )
+        if only_those_newer_than is not None:
+            query = query.where(dataset_changed_expression() > only_those_newer_than)
+
         return sorted(
-            (month.date(), count)
-            for month, count in self._engine.execute(
-                select(
-                    [
-                        func.date_trunc(
-                            "month", datetime_expression(dataset_type.metadata_type)
-                        ).label("month"),
-                        func.count(),
-                    ]
-                )
-                .where(ODC_DATASET.c.dataset_type_ref == dataset_type.id)
-                .where(dataset_changed_expression() > only_those_newer_than)
-                .group_by("month")
-                .order_by("month")
+            (month.date(), count) for month, count in self._engine.execute(query)
+        )
+
+    def count_changed_datasets(
+        self, product_name: str, only_those_newer_than: Optional[datetime]
+    ) -> int:
+        """
+        How many of the product's datasets (including archived) have changed since the given time?
+
+        (A null date will count all of them.)
+        """
+        query = (
+            select([func.count()])
+            .select_from(ODC_DATASET)
+            .where(
+                ODC_DATASET.c.dataset_type_ref == self.get_dataset_type(product_name).id
             )
         )
+        if only_those_newer_than is not None:
+            query = query.where(dataset_changed_expression() > only_those_newer_than)
+        return self._engine.execute(query).scalar()
 
     def find_years_needing_update(self, product_name: str) -> List[int]:
         """
@@ -508,14 +639,20 @@ class SummaryStore:
         scan_for_deleted: bool = False,
         only_those_newer_than: datetime = None,
         force: bool = False,
+        profile: RefreshProfile = None,
+        resume_extents: bool = True,
     ) -> Tuple[int, ProductSummary]:
         """
         Update Explorer's computed extents for the given product, and record any new
         datasets into the spatial table.
 
+        An unfinished earlier extent refresh is continued, unless `resume_extents`
+        is False.
+
         Returns the count of changed dataset extents, and the
         updated product summary.
         """
+        profile = profile or RefreshProfile(product_name)
         # Server-side-timestamp of when we started scanning. We will
         # later know that any dataset newer than this timestamp may not
         # be in our summaries.
@@ -529,6 +666,8 @@ class SummaryStore:
             product,
             clean_up_deleted=scan_for_deleted,
             assume_after_date=only_those_newer_than,
+            profile=profile,
+            resume=resume_extents,
         )
 
         existing_summary = self.get_product_summary(product_name)
@@ -555,15 +694,19 @@ class SummaryStore:
         fixed_metadata = {}
         if total_count:
             sample_percentage = min(dataset_sample_size / total_count, 1) * 100.0
-            source_products = self._get_linked_products(
-                product, kind="source", sample_percentage=sample_percentage
-            )
-            derived_products = self._get_linked_products(
-                product, kind="derived", sample_percentage=sample_percentage
-            )
-            fixed_metadata = self._find_product_fixed_metadata(
-                product, sample_datasets_size=dataset_sample_size
-            )
+            with profile.phase("linked_products") as phase:
+                source_products = self._get_linked_products(
+                    product, kind="source", sample_percentage=sample_percentage
+                )
+                derived_products = self._get_linked_products(
+                    product, kind="derived", sample_percentage=sample_percentage
+                )
+                phase.rows = len(source_products) + len(derived_products)
+            with profile.phase("fixed_metadata") as phase:
+                fixed_metadata = self._find_product_fixed_metadata(
+                    product, sample_datasets_size=dataset_sample_size
+                )
+                phase.rows = len(fixed_metadata)
 
         new_summary = ProductSummary(
             product.name,
@@ -577,7 +720,8 @@ class SummaryStore:
         )
 
         # TODO: This is an expensive operation. We regenerate them all every time there are changes.
-        self._refresh_product_regions(product)
+        with profile.phase("regions") as phase:
+            phase.rows = self._refresh_product_regions(product)
 
         self._persist_product_extent(new_summary)
         return change_count, new_summary
@@ -823,38 +967,92 @@ class SummaryStore:
         year: Optional[int] = None,
         month: Optional[int] = None,
         day: Optional[int] = None,
+        fields: Collection[str] = None,
     ) -> Optional[TimePeriodOverview]:
-        period, start_day = TimePeriodOverview.flat_period_representation(
-            year, month, day
-        )
-        if year and month and day:
-            # We don't store days, they're quick.
-            return self._summariser.calculate_summary(
-                product_name,
-                year_month_day=(year, month, day),
-                product_refresh_time=datetime.now(),
+        """
+        Get the stored summary of a time period.
+
+        The timeline, regions and footprint can be large, so only the ones named
+        in `fields` will be loaded (all by default). The rest will be None.
+        """
+        [summary] = self.get_many(product_name, [(year, month, day)], fields=fields)
+        return summary
+
+    def get_many(
+        self,
+        product_name: str,
+        periods: Sequence[Tuple[Optional[int], Optional[int], Optional[int]]],
+        fields: Collection[str] = None,
+        period_fields: Sequence[Optional[Collection[str]]] = None,
+    ) -> List[Optional[TimePeriodOverview]]:
+        """
+        Get the summaries of several (year, month, day) time periods of a product,
+        with one query.
+
+        They're returned in the same order (None for any that don't exist). See
+        `get()` for `fields`, or give `period_fields` to load different fields
+        for each period (in the same order as `periods`).
+        """
+        if period_fields is None:
+            period_fields = [fields] * len(periods)
+        elif len(period_fields) != len(periods):
+            raise ValueError(
+                f"Expected fields for each of the {len(periods)} periods, "
+                f"got {len(period_fields)}"
             )
+        summaries: List[Optional[TimePeriodOverview]] = [None] * len(periods)
+
+        stored_periods = {}
+        stored_period_fields = {}
+        for i, (year, month, day) in enumerate(periods):
+            if year and month and day:
+                # We don't store days, they're quick.
+                summaries[i] = self._summariser.calculate_summary(
+                    product_name,
+                    year_month_day=(year, month, day),
+                    product_refresh_time=datetime.now(),
+                )
+            else:
+                key = TimePeriodOverview.flat_period_representation(year, month, day)
+                stored_periods.setdefault(key, []).append(i)
+                # The same period may be asked for more than once.
+                stored_period_fields[key] = (
+                    _union_fields(stored_period_fields[key], period_fields[i])
+                    if key in stored_period_fields
+                    else period_fields[i]
+                )
 
+        if not stored_periods:
+            return summaries
         product = self.get_product_summary(product_name)
         if not product:
-            return None
+            return summaries
 
-        res = self._engine.execute(
-            select([TIME_OVERVIEW]).where(
+        rows = self._engine.execute(
+            select(_period_summary_columns(stored_period_fields)).where(
                 and_(
                     TIME_OVERVIEW.c.product_ref == product.id_,
-                    TIME_OVERVIEW.c.start_day == start_day,
-                    TIME_OVERVIEW.c.period_type == period,
+                    or_(
+                        *(
+                            and_(
+                                TIME_OVERVIEW.c.start_day == start_day,
+                                TIME_OVERVIEW.c.period_type == period,
+                            )
+                            for period, start_day in stored_periods
+                        )
+                    ),
                 )
             )
-        ).fetchone()
-
-        if not res:
-            return None
-
-        return _summary_from_row(
-            res, product_name=product_name, grouping_timezone=self.grouping_timezone
         )
+        for row in rows:
+            summary = _summary_from_row(
+                row._mapping,
+                product_name=product_name,
+                grouping_timezone=self.grouping_timezone,
+            )
+            for i in stored_periods[(row.period_type, row.start_day)]:
+                summaries[i] = summary
+        return summaries
 
     def get_all_dataset_counts(
         self,
@@ -888,6 +1086,56 @@ class SummaryStore:
             for r in res
         }
 
+    def get_tile(
+        self,
+        product_name: str,
+        layer: str,
+        z: int,
+        x: int,
+        y: int,
+        year: Optional[int] = None,
+        month: Optional[int] = None,
+        day: Optional[int] = None,
+        limit: int = 4000,
+    ) -> Optional[bytes]:
+        """
+        Get a Mapbox Vector Tile of a product's "regions", "footprint" or "datasets"
+        in a time period.
+
+        Regions have their dataset count for the period, and at most `limit`
+        datasets are included. Returns None if the product hasn't been summarised.
+        """
+        if layer not in _TILE_QUERIES:
+            raise ValueError(
+                f"Unknown tile layer {layer!r}. Expected one of {sorted(_TILE_QUERIES)}"
+            )
+        product = self.get_product_summary(product_name)
+        if not product:
+            return None
+
+        period_type, start_day = TimePeriodOverview.flat_period_representation(
+            year, month, day
+        )
+        time_range = _utils.as_time_range(
+            year, month, day, tzinfo=self.grouping_timezone
+        )
+        stored_query, day_query = _TILE_QUERIES[layer]
+        tile = self._engine.execute(
+            day_query if day else stored_query,
+            layer=layer,
+            z=z,
+            x=x,
+            y=y,
+            product_ref=product.id_,
+            dataset_type_ref=self.get_dataset_type(product_name).id,
+            period_type=period_type,
+            start_day=start_day,
+            time_begin=time_range.begin if time_range else None,
+            time_end=time_range.end if time_range else None,
+            limit=limit,
+        ).scalar()
+        return bytes(tile) if tile is not None else b""
+
     # These are cached to avoid repeated unnecessary DB queries.
     @ttl_cache(ttl=DEFAULT_TTL)
     def all_dataset_types(self) -> Iterable[DatasetType]:
@@ -911,29 +1159,24 @@ class SummaryStore:
                 return d
         raise KeyError(f"Unknown dataset type id {id_!r}")
 
-    @ttl_cache(ttl=DEFAULT_TTL)
     def _product(self, name: str) -> ProductSummary:
+        with self._product_summaries_lock:
+            product = self._product_summaries.get(name)
+        if product is not None:
+            return product
+
         row = self._engine.execute(
-            select(
-                [
-                    PRODUCT.c.dataset_count,
-                    PRODUCT.c.time_earliest,
-                    PRODUCT.c.time_latest,
-                    PRODUCT.c.last_refresh.label("last_refresh_time"),
-                    PRODUCT.c.last_successful_summary.label(
-                        "last_successful_summary_time"
-                    ),
-                    PRODUCT.c.id.label("id_"),
-                    PRODUCT.c.source_product_refs,
-                    PRODUCT.c.derived_product_refs,
-                    PRODUCT.c.fixed_metadata,
-                ]
-            ).where(PRODUCT.c.name == name)
+            select(_PRODUCT_SUMMARY_COLUMNS).where(PRODUCT.c.name == name)
         ).fetchone()
         if not row:
             raise ValueError(f"Unknown product {name!r} (initialised?)")
 
-        row = dict(row)
+        product = self._product_from_row(name, dict(row))
+        with self._product_summaries_lock:
+            self._product_summaries[name] = product
+        return product
+
+    def _product_from_row(self, name: str, row: Dict[str, Any]) -> ProductSummary:
         source_products = [
             self._dataset_type_by_id(id_).name for id_ in row.pop("source_product_refs")
         ]
@@ -949,6 +1192,227 @@ class SummaryStore:
             **row,
         )
 
+    @ttl_cache(ttl=DEFAULT_TTL)
+    def _all_products(self) -> Tuple[Dict[str, ProductSummary], Tuple[str, ...]]:
+        """
+        Load every product summary in one query.
+
+        Returns them by name, and the names of products that have a stored overview.
+        """
+        rows = self._engine.execute(
+            select(
+                [
+                    PRODUCT.c.name,
+                    *_PRODUCT_SUMMARY_COLUMNS,
+                    exists()
+                    .where(TIME_OVERVIEW.c.product_ref == PRODUCT.c.id)
+                    .where(TIME_OVERVIEW.c.period_type == "all")
+                    .label("has_overview"),
+                ]
+            )
+        )
+        products = {}
+        with_overview = []
+        for row in rows:
+            row = dict(row)
+            name = row.pop("name")
+            if row.pop("has_overview"):
+                with_overview.append(name)
+            products[name] = self._product_from_row(name, row)
+
+        with self._product_summaries_lock:
+            self._product_summaries.update(products)
+        return products, tuple(with_overview)
+
+    def get_all_product_summaries(self) -> Dict[str, ProductSummary]:
+        """
+        Get the summaries of all products we know of, by product name.
+
+        This is one query, rather than one per product, and single
+        `get_product_summary()` calls will reuse its results.
+        """
+        products, _ = self._all_products()
+        return dict(products)
+
+    def get_product_versions(self) -> Dict[str, Optional[datetime]]:
+        """
+        A version of each product, which changes whenever its summaries do.
+
+        It's the time its all-time summary was last generated (which every refresh
+        that changes anything does), so this is one cheap query. Refreshes of idle
+        products don't change it. (see `mark_idle_products_refreshed()`)
+
+        Cached product summaries from older refreshes are forgotten.
+        """
+        versions = {}
+        outdated = False
+        with self._product_summaries_lock:
+            for (
+                name,
+                last_refresh,
+                last_successful_summary,
+                generation_time,
+            ) in self._engine.execute(
+                select(
+                    [
+                        PRODUCT.c.name,
+                        PRODUCT.c.last_refresh,
+                        PRODUCT.c.last_successful_summary,
+                        TIME_OVERVIEW.c.generation_time,
+                    ]
+                ).select_from(
+                    PRODUCT.outerjoin(
+                        TIME_OVERVIEW,
+                        and_(
+                            TIME_OVERVIEW.c.product_ref == PRODUCT.c.id,
+                            TIME_OVERVIEW.c.period_type == "all",
+                        ),
+                    )
+                )
+            ):
+                versions[name] = generation_time
+                cached = self._product_summaries.get(name)
+                if cached is not None and (
+                    cached.last_refresh_time != last_refresh
+                    or cached.last_successful_summary_time != last_successful_summary
+                ):
+                    del self._product_summaries[name]
+                    outdated = True
+        if outdated:
+            self._all_products.cache_clear()
+        return versions
+
+    def _product_refresh_times(
+        self,
+    ) -> Dict[str, Tuple[Optional[datetime], Optional[datetime]]]:
+        """The last refresh and last successful summary time of each product"""
+        return {
+            name: (last_refresh, last_successful_summary)
+            for name, last_refresh, last_successful_summary in self._engine.execute(
+                select(
+                    [
+                        PRODUCT.c.name,
+                        PRODUCT.c.last_refresh,
+                        PRODUCT.c.last_successful_summary,
+                    ]
+                )
+            )
+        }
+
+    def write_snapshot(self, path: Union[str, Path]):
+        """
+        Save each product's summary and all-time overview to a file, for web
+        servers to warm their caches from. (see `read_snapshot()`)
+
+        They're saved as their (json) table rows, rather than as objects.
+        """
+        products = {
+            row.pop("name"): _row_to_data(row)
+            for row in map(
+                dict,
+                self._engine.execute(
+                    select([PRODUCT.c.name, *_PRODUCT_SUMMARY_COLUMNS])
+                ),
+            )
+        }
+        overviews = {
+            row.pop("product_name"): _row_to_data(row)
+            for row in map(
+                dict,
+                self._engine.execute(
+                    select(
+                        [
+                            PRODUCT.c.name.label("product_name"),
+                            *_summary_columns(None),
+                        ]
+                    )
+                    .select_from(
+                        TIME_OVERVIEW.join(
+                            PRODUCT, TIME_OVERVIEW.c.product_ref == PRODUCT.c.id
+                        )
+                    )
+                    .where(TIME_OVERVIEW.c.period_type == "all")
+                ),
+            )
+        }
+        snapshot = dict(
+            # Other versions may have different columns, so can't read it.
+            explorer_version=explorer_version,
+            products=products,
+            overviews=overviews,
+        )
+
+        # Replace it whole, so that readers never see a partial file.
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_bytes(orjson.dumps(snapshot))
+        tmp_path.replace(path)
+        _LOG.info("snapshot.write", path=str(path), product_count=len(products))
+
+    def read_snapshot(self, path: Union[str, Path]) -> Dict[str, TimePeriodOverview]:
+        """
+        Load the products in a snapshot file that haven't been refreshed since it
+        was written, adding their summaries to this store's cache.
+
+        Returns their all-time overviews, by product name. Snapshots written by
+        other versions of Explorer are ignored.
+
+        Raises a ValueError if it isn't a readable snapshot.
+        """
+        snapshot = orjson.loads(Path(path).read_bytes())
+        if not isinstance(snapshot, dict):
+            raise ValueError(f"Not a snapshot: {path}")
+
+        snapshot_version = snapshot.get("explorer_version")
+        if snapshot_version != explorer_version:
+            _LOG.warning(
+                "snapshot.other_version",
+                path=str(path),
+                snapshot_version=snapshot_version,
+                explorer_version=explorer_version,
+            )
+            return {}
+
+        refresh_times = self._product_refresh_times()
+        try:
+            product_rows = {
+                name: _row_from_data(row, _PRODUCT_SUMMARY_COLUMNS)
+                for name, row in snapshot["products"].items()
+            }
+            current = {
+                name: self._product_from_row(name, row)
+                for name, row in product_rows.items()
+                if refresh_times.get(name)
+                == (row["last_refresh_time"], row["last_successful_summary_time"])
+            }
+            overviews = {
+                name: _summary_from_row(
+                    _row_from_data(row, _summary_columns(None)),
+                    product_name=name,
+                    grouping_timezone=self.grouping_timezone,
+                )
+                for name, row in snapshot["overviews"].items()
+                if name in current
+            }
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Malformed snapshot {path}: {e!r}") from e
+
+        with self._product_summaries_lock:
+            self._product_summaries.update(current)
+
+        _LOG.info(
+            "snapshot.read",
+            path=str(path),
+            product_count=len(current),
+            outdated_count=len(product_rows) - len(current),
+        )
+        return overviews
+
+    def _clear_product_summaries(self):
+        with self._product_summaries_lock:
+            self._product_summaries.clear()
+        self._all_products.cache_clear()
+
     @ttl_cache(ttl=DEFAULT_TTL)
     def products_location_samples_all(
         self, sample_size: int = 50
@@ -1089,7 +1553,7 @@ class SummaryStore:
                 .returning(PRODUCT.c.id, PRODUCT.c.last_refresh)
                 .values(**fields, name=product.name)
             ).fetchone()
-        self._product.cache_clear()
+        self._clear_product_summaries()
         product_id, last_refresh_time = row
 
         product.id_ = product_id
@@ -1503,7 +1967,110 @@ class SummaryStore:
                 year_month_day=(year, month, None),
                 product_refresh_time=product_refresh_time,
             )
-        elif year:
+            summary.product_refresh_time = product_refresh_time
+            summary.period_tuple = (product.name, year, month, None)
+            self._put(summary)
+        else:
+            # Years and the whole product are combined from their stored child periods.
+            summary = self._put_rollup(product, year, product_refresh_time)
+
+        for listener in self._update_listeners:
+            listener(
+                product_name=product.name,
+                year=year,
+                month=month,
+                day=None,
+                summary=summary,
+            )
+        return summary
+
+    def _put_rollup(
+        self,
+        product: ProductSummary,
+        year: Optional[int],
+        product_refresh_time: datetime,
+    ) -> TimePeriodOverview:
+        """
+        Combine the stored months of a year (or the years of the whole product) into
+        its summary record.
+
+        It's done within Postgres, so the child footprints and counts never need to
+        be loaded here. We only fall back to combining them in Python if Postgres
+        can't union their footprints.
+        """
+        if year:
+            child_period_type = "month"
+            child_start_days = (date(year, 1, 1), date(year + 1, 1, 1))
+        elif product.dataset_count > 0:
+            child_period_type = "year"
+            earliest_year = product.time_earliest.astimezone(
+                self.grouping_timezone
+            ).year
+            latest_year = product.time_latest.astimezone(self.grouping_timezone).year
+            child_start_days = (date(earliest_year, 1, 1), date(latest_year + 1, 1, 1))
+        else:
+            # No datasets: nothing to combine.
+            child_period_type = "year"
+            child_start_days = (date(1900, 1, 1), date(1900, 1, 1))
+
+        period_type, start_day = TimePeriodOverview.flat_period_representation(
+            year, None, None
+        )
+        product_ref = self._product(product.name).id_
+        try:
+            row = self._engine.execute(
+                _ROLLUP_QUERY,
+                product_ref=product_ref,
+                period_type=period_type,
+                start_day=start_day,
+                child_period_type=child_period_type,
+                child_start_day_from=child_start_days[0],
+                child_start_day_to=child_start_days[1],
+                product_refresh_time=product_refresh_time,
+                footprint_tolerance=_ROLLUP_FOOTPRINT_TOLERANCE,
+            ).fetchone()
+        except (InternalError, DataError):
+            # Usually a GEOS topology error from bad footprints.
+            _LOG.warning(
+                "summary.rollup.sql_failed",
+                product_name=product.name,
+                year=year,
+                exc_info=True,
+            )
+            return self._put_rollup_from_python(product, year, product_refresh_time)
+
+        summary = _summary_from_row(
+            row._mapping,
+            product_name=product.name,
+            grouping_timezone=self.grouping_timezone,
+        )
+        # Postgres can't split footprints at the antimeridian, so we project them.
+        footprint_wgs84 = _footprint_wgs84_columns(summary)
+        self._engine.execute(
+            TIME_OVERVIEW.update()
+            .where(TIME_OVERVIEW.c.product_ref == product_ref)
+            .where(TIME_OVERVIEW.c.start_day == start_day)
+            .where(TIME_OVERVIEW.c.period_type == period_type)
+            .values(**footprint_wgs84)
+        )
+        for name, value in footprint_wgs84.items():
+            if name != "footprint_wgs84":
+                setattr(summary, name, value)
+        return summary
+
+    def _put_rollup_from_python(
+        self,
+        product: ProductSummary,
+        year: Optional[int],
+        product_refresh_time: datetime,
+    ) -> TimePeriodOverview:
+        """
+        Combine the child periods of a year (or the whole product) within Python.
+
+        This is slower and loads every child into memory, but has more
+        ways to fix invalid geometry.
+        """
+        if year:
             summary = TimePeriodOverview.add_periods(
                 self.get(product.name, year, month_, None) for month_ in range(1, 13)
             )
@@ -1521,17 +2088,9 @@ class SummaryStore:
             summary = TimePeriodOverview.empty(product.name)
 
         summary.product_refresh_time = product_refresh_time
-        summary.period_tuple = (product.name, year, month, None)
+        summary.period_tuple = (product.name, year, None, None)
 
         self._put(summary)
-        for listener in self._update_listeners:
-            listener(
-                product_name=product.name,
-                year=year,
-                month=month,
-                day=None,
-                summary=summary,
-            )
         return summary
 
     def refresh(
@@ -1541,6 +2100,7 @@ class SummaryStore:
         recreate_dataset_extents: bool = False,
         reset_incremental_position: bool = False,
         minimum_change_scan_window: timedelta = None,
+        profile: RefreshProfile = None,
     ) -> Tuple[GenerateResult, TimePeriodOverview]:
         """
         Update Explorer's information and summaries for a product.
@@ -1564,45 +2124,19 @@ class SummaryStore:
 
                        This is primarily useful for developers who restore from backups, whose Explorer
                        tables will be out of sync with a restored, newer ODC database.
+        :param profile: Record the time taken by each phase of the refresh here.
         """
         log = _LOG.bind(product_name=product_name)
+        profile = profile or RefreshProfile(product_name)
 
         old_product: ProductSummary = self.get_product_summary(product_name)
 
-        # Which datasets to scan for updates?
-        if (
-            # If they've never summarised this product before
-            (old_product is None)
-            # ... Or it's an old Explorer from before incremental-updates were added.
-            or (old_product.last_successful_summary_time is None)
-            # Or we're using brute force
-            or force
-        ):
-            # "No limit". Recompute all.
-            only_datasets_newer_than = None
-
-        # Otherwise, do they want to reset the incremental position?
-        # -> Find the most recently indexed dataset that has touched our own spatial table,
-        #    and only scan changes from that time onward.
-        #    (this will be more expensive than normal incremental [below], as it may scan a
-        #     lot more datasets, not just the ones from the last generate run.)
-        elif reset_incremental_position:
-            only_datasets_newer_than = self._newest_known_dataset_addition_time(
-                product_name
-            )
-        else:
-            # Otherwise only refresh datasets newer than the last successful run.
-            only_datasets_newer_than = (
-                old_product.last_successful_summary_time
-                - self.dataset_overlap_carefulness
-            )
-
-        # If there's a minimum window to scan, make sure we fill it.
-        if minimum_change_scan_window and only_datasets_newer_than:
-            only_datasets_newer_than = min(
-                only_datasets_newer_than,
-                self._database_time_now() - minimum_change_scan_window,
-            )
+        only_datasets_newer_than = self._change_scan_start(
+            old_product,
+            force=force,
+            reset_incremental_position=reset_incremental_position,
+            minimum_change_scan_window=minimum_change_scan_window,
+        )
 
         extent_changes, new_product = self.refresh_product_extent(
             product_name,
@@ -1610,6 +2144,9 @@ class SummaryStore:
             only_those_newer_than=(
                 None if recreate_dataset_extents else only_datasets_newer_than
             ),
+            profile=profile,
+            # Forced refreshes start again from the beginning.
+            resume_extents=not (force or recreate_dataset_extents),
         )
         log.info("extent.refresh.done", changed=extent_changes)
 
@@ -1652,29 +2189,33 @@ class SummaryStore:
                 month=change_month,
                 change_count=new_count,
             )
-            self._recalculate_period(
-                new_product,
-                change_month.year,
-                change_month.month,
-                product_refresh_time=refresh_timestamp,
-            )
+            with profile.phase("month", period=change_month.strftime("%Y-%m")) as phase:
+                phase.rows = self._recalculate_period(
+                    new_product,
+                    change_month.year,
+                    change_month.month,
+                    product_refresh_time=refresh_timestamp,
+                ).dataset_count
 
         # Find year records who are older than their month records
         #   (This will find any months calculated above, as well
         #    as from previous interrupted runs.)
         years_to_update = self.find_years_needing_update(product_name)
         for year in years_to_update:
-            self._recalculate_period(
+            with profile.phase("year", period=str(year)) as phase:
+                phase.rows = self._recalculate_period(
+                    new_product,
+                    year,
+                    product_refresh_time=refresh_timestamp,
+                ).dataset_count
+
+        # Now update the whole-product record
+        with profile.phase("product") as phase:
+            updated_summary = self._recalculate_period(
                 new_product,
-                year,
                 product_refresh_time=refresh_timestamp,
             )
-
-        # Now update the whole-product record
-        updated_summary = self._recalculate_period(
-            new_product,
-            product_refresh_time=refresh_timestamp,
-        )
+            phase.rows = updated_summary.dataset_count
         _LOG.info(
             "product.complete!",
             product_name=new_product.name,
@@ -1695,6 +2236,167 @@ class SummaryStore:
 
         return refresh_type, updated_summary
 
+    def _change_scan_start(
+        self,
+        old_product: Optional[ProductSummary],
+        force: bool = False,
+        reset_incremental_position: bool = False,
+        minimum_change_scan_window: timedelta = None,
+    ) -> Optional[datetime]:
+        """
+        Datasets changed after what (db server) time should a refresh scan?
+
+        Returns None if all datasets should be scanned.
+        """
+        # Which datasets to scan for updates?
+        if (
+            # If they've never summarised this product before
+            (old_product is None)
+            # ... Or it's an old Explorer from before incremental-updates were added.
+            or (old_product.last_successful_summary_time is None)
+            # Or we're using brute force
+            or force
+        ):
+            # "No limit". Recompute all.
+            only_datasets_newer_than = None
+
+        # Otherwise, do they want to reset the incremental position?
+        # -> Find the most recently indexed dataset that has touched our own spatial table,
+        #    and only scan changes from that time onward.
+        #    (this will be more expensive than normal incremental [below], as it may scan a
+        #     lot more datasets, not just the ones from the last generate run.)
+        elif reset_incremental_position:
+            only_datasets_newer_than = self._newest_known_dataset_addition_time(
+                old_product.name
+            )
+        else:
+            # Otherwise only refresh datasets newer than the last successful run.
+            only_datasets_newer_than = (
+                old_product.last_successful_summary_time
+                - self.dataset_overlap_carefulness
+            )
+
+        # If there's a minimum window to scan, make sure we fill it.
+        if minimum_change_scan_window and only_datasets_newer_than:
+            only_datasets_newer_than = min(
+                only_datasets_newer_than,
+                self._database_time_now() - minimum_change_scan_window,
+            )
+        return only_datasets_newer_than
+
+    def plan_refresh(
+        self,
+        product_name: str,
+        force: bool = False,
+        recreate_dataset_extents: bool = False,
+        reset_incremental_position: bool = False,
+        minimum_change_scan_window: timedelta = None,
+    ) -> "RefreshPlan":
+        """
+        Estimate the work that `refresh()` would do for a product, without doing it.
+
+        Only the cheap change-scanning queries are run, and nothing is written.
+
+        (The arguments match `refresh()`)
+        """
+        old_product = self.get_product_summary(product_name)
+        only_datasets_newer_than = self._change_scan_start(
+            old_product,
+            force=force,
+            reset_incremental_position=reset_incremental_position,
+            minimum_change_scan_window=minimum_change_scan_window,
+        )
+
+        months = dict(
+            self.find_months_needing_update(product_name, only_datasets_newer_than)
+        )
+        years = {month.year for month in months}
+        if old_product is not None:
+            if only_datasets_newer_than is None:
+                # Existing months are regenerated too, in case they've been emptied.
+                for month in self._already_summarised_months(product_name):
+                    months.setdefault(month, 0)
+            years.update(self.find_years_needing_update(product_name))
+
+        changed_dataset_count = self.count_changed_datasets(
+            product_name,
+            None if recreate_dataset_extents else only_datasets_newer_than,
+        )
+
+        estimated_duration = None
+        rates = self._recorded_refresh_rates(old_product)
+        if rates is not None:
+            seconds_per_dataset, seconds_per_period = rates
+            estimated_duration = timedelta(
+                seconds=(
+                    seconds_per_dataset * changed_dataset_count
+                    # All months, years, and the whole-product summary.
+                    + seconds_per_period * (len(months) + len(years) + 1)
+                )
+            )
+
+        return RefreshPlan(
+            product_name=product_name,
+            is_new=old_product is None,
+            scan_changes_since=only_datasets_newer_than,
+            changed_dataset_count=changed_dataset_count,
+            months=sorted(months.items()),
+            years=sorted(years),
+            estimated_duration=estimated_duration,
+        )
+
+    def _recorded_refresh_rates(
+        self, product: Optional[ProductSummary]
+    ) -> Optional[Tuple[float, float]]:
+        """
+        How fast was the product's most recent (non-trivial) refresh?
+
+        Judged by the generation times of the summaries it wrote: the time from the
+        start of the refresh to the first summary is spent scanning datasets, and the
+        rest is spent generating summaries.
+
+        Returns (seconds per changed dataset, seconds per summarised period), or None
+        if there's no useful history.
+        """
+        if product is None:
+            return None
+
+        row = self._engine.execute(
+            select(
+                [
+                    func.extract(
+                        "epoch",
+                        func.min(TIME_OVERVIEW.c.generation_time)
+                        - TIME_OVERVIEW.c.product_refresh_time,
+                    ).label("scan_seconds"),
+                    func.extract(
+                        "epoch",
+                        func.max(TIME_OVERVIEW.c.generation_time)
+                        - func.min(TIME_OVERVIEW.c.generation_time),
+                    ).label("summary_seconds"),
+                    func.count().label("period_count"),
+                    func.sum(TIME_OVERVIEW.c.dataset_count)
+                    .filter(TIME_OVERVIEW.c.period_type == "month")
+                    .label("dataset_count"),
+                ]
+            )
+            .where(TIME_OVERVIEW.c.product_ref == product.id_)
+            .group_by(TIME_OVERVIEW.c.product_refresh_time)
+            # The most recent refresh that summarised more than the whole-product record.
+            .having(func.count() > 1)
+            .order_by(TIME_OVERVIEW.c.product_refresh_time.desc())
+            .limit(1)
+        ).fetchone()
+        if row is None:
+            return None
+
+        scan_seconds = max(float(row.scan_seconds or 0), 0.0)
+        summary_seconds = max(float(row.summary_seconds or 0), 0.0)
+        return (
+            scan_seconds / row.dataset_count if row.dataset_count else 0.0,
+            summary_seconds / (row.period_count - 1),
+        )
+
     def _already_summarised_months(self, product_name: str) -> Set[date]:
         """Get all months that have a recorded summary already for this product"""
 
@@ -1738,6 +2440,85 @@ class SummaryStore:
             )
         ).scalar()
 
+    def mark_idle_products_refreshed(
+        self,
+        product_names: Iterable[str],
+        minimum_change_scan_window: timedelta = None,
+    ) -> Set[str]:
+        """
+        Find which of the given products have had no dataset changes since their last
+        successful refresh, and mark them as refreshed now.
+
+        This is what an incremental refresh of them would do, but it's one query
+        for all products (using the change-time index on ODC's dataset table), rather
+        than a full refresh of each.
+
+        Returns the names of those idle products. (Others still need refreshing!)
+        """
+        product_names = list(product_names)
+        if not product_names:
+            return set()
+
+        # As in refresh_product_extent(), take the time before we scan, so that datasets
+        # changed during the scan will be seen next time.
+        covers_up_to = self._database_time_now()
+
+        changes_since = (
+            PRODUCT.c.last_successful_summary - self.dataset_overlap_carefulness
+        )
+        if minimum_change_scan_window:
+            changes_since = func.least(
+                changes_since, covers_up_to - minimum_change_scan_window
+            )
+
+        idle_products = {
+            name
+            for (name,) in self._engine.execute(
+                select([PRODUCT.c.name])
+                .select_from(
+                    PRODUCT.join(
+                        ODC_DATASET_TYPE, ODC_DATASET_TYPE.c.name == PRODUCT.c.name
+                    )
+                )
+                .where(PRODUCT.c.name.in_(product_names))
+                # Its last refresh completed successfully.
+                .where(PRODUCT.c.last_successful_summary >= PRODUCT.c.last_refresh)
+                # No datasets have changed since.
+                .where(
+                    ~exists(
+                        select([ODC_DATASET.c.id])
+                        .where(ODC_DATASET.c.dataset_type_ref == ODC_DATASET_TYPE.c.id)
+                        .where(dataset_changed_expression() > changes_since)
+                    )
+                )
+                # No unfinished extent refresh.
+                .where(
+                    ~exists(
+                        select([EXTENT_REFRESH_CHECKPOINT.c.dataset_type_ref]).where(
+                            EXTENT_REFRESH_CHECKPOINT.c.dataset_type_ref
+                            == ODC_DATASET_TYPE.c.id
+                        )
+                    )
+                )
+            )
+        }
+        if idle_products:
+            self._engine.execute(
+                PRODUCT.update()
+                .where(PRODUCT.c.name.in_(idle_products))
+                .where(PRODUCT.c.last_successful_summary < covers_up_to)
+                .values(last_refresh=covers_up_to, last_successful_summary=covers_up_to)
+            )
+            self._clear_product_summaries()
+
+        _LOG.info(
+            "products.idle",
+            idle_count=len(idle_products),
+            checked_count=len(product_names),
+            new_refresh_time=covers_up_to,
+        )
+        return idle_products
+
     def _mark_product_refresh_completed(
         self, product: ProductSummary, refresh_timestamp: datetime
     ):
@@ -1758,7 +2539,7 @@ class SummaryStore:
             )
             .values(last_successful_summary=refresh_timestamp)
         )
-        self._product.cache_clear()
+        self._clear_product_summaries()
 
     @lru_cache()
     def _get_srid_name(self, srid: int):
@@ -1771,10 +2552,10 @@ class SummaryStore:
         """
         List all names of products that have summaries available.
         """
+        _, with_overview = self._all_products()
+        # Products removed from ODC can linger in our own table.
         return sorted(
-            product.name
-            for product in self.all_dataset_types()
-            if self.has(product.name, None, None, None)
+            set(with_overview) & {product.name for product in self.all_dataset_types()}
         )
 
     def find_datasets_for_region(
@@ -1912,21 +2693,419 @@ def _safe_read_date(d):
     return None
 
 
-def _summary_from_row(res, product_name, grouping_timezone=default_timezone):
-    timeline_dataset_counts = (
-        Counter(
-            dict(
-                zip(res["timeline_dataset_start_days"], res["timeline_dataset_counts"])
+# In CRS units, like TimePeriodOverview.add_periods(). Albers, so 1KM.
+_ROLLUP_FOOTPRINT_TOLERANCE = 1000.0
+
+# The versions of displayed footprints to store: their simplification tolerance in
+# metres, and the most vertices they may have (more will be simplified further).
+_WGS84_FOOTPRINT_LEVELS = (
+    (10_000.0, 1_000),
+    (1_000.0, 10_000),
+    (100.0, 100_000),
+)
+
+# How many times to double a footprint's tolerance looking for few enough vertices.
+_MAX_SIMPLIFY_DOUBLINGS = 16
+# The fewest coordinates of a (closed) polygon ring.
+_MIN_RING_VERTICES = 4
+
+_TIME_OVERVIEW_COLUMN_NAMES = ", ".join(c.name for c in TIME_OVERVIEW.columns)
+_ROLLUP_UPDATE_SET = ", ".join(
+    f"{c.name} = excluded.{c.name}"
+    for c in TIME_OVERVIEW.columns
+    if c.name not in ("product_ref", "start_day", "period_type")
+)
+
+# Combine the stored child periods (months of a year, or years of a product) into
+# their parent record. This mirrors TimePeriodOverview.add_periods().
+_ROLLUP_QUERY = (
+    text(
+        f"""
+with children as (
+    select *
+    from {CUBEDASH_SCHEMA}.time_overview
+    where product_ref = :product_ref
+      and period_type = :child_period_type
+      and start_day >= :child_start_day_from
+      and start_day < :child_start_day_to
+      and dataset_count > 0
+),
+timeline as (
+    select t.start_day, sum(t.count) as count
+    from children,
+         unnest(children.timeline_dataset_start_days, children.timeline_dataset_counts)
+            as t(start_day, count)
+    group by t.start_day
+),
+timeline_grouping as (
+    -- Group to a coarser timeline if there are too many entries.
+    select child_period,
+           case
+               when (select count(*) from timeline) <= 366 then child_period
+               when child_period = 'day' then 'month'
+               when child_period = 'month' then 'year'
+               else child_period
+           end as period
+    from (
+        select coalesce(
+            (select timeline_period from children order by start_day desc limit 1),
+            'day'
+        ) as child_period
+    ) as p
+),
+grouped_timeline as (
+    select case
+               when g.period = g.child_period then t.start_day
+               else date_trunc(g.period::text, t.start_day)
+           end as start_day,
+           sum(t.count)::integer as count
+    from timeline t, timeline_grouping g
+    group by 1
+),
+regions as (
+    select r.region, sum(r.count)::integer as count
+    from children,
+         unnest(children.regions, children.region_dataset_counts) as r(region, count)
+    group by r.region
+),
+footprints as (
+    select footprint_count,
+           case
+               when ST_IsValid(footprint_geometry) then footprint_geometry
+               -- Attempt to fix broken geometries (eg. from float rounding).
+               else ST_Buffer(footprint_geometry, 0)
+           end as footprint
+    from children
+    where footprint_count > 0 and footprint_geometry is not null
+),
+valid_footprints as (
+    select * from footprints where ST_IsValid(footprint) and not ST_IsEmpty(footprint)
+)
+insert into {CUBEDASH_SCHEMA}.time_overview (
+    product_ref, period_type, start_day,
+    dataset_count, time_earliest, time_latest,
+    timeline_period, timeline_dataset_start_days, timeline_dataset_counts,
+    regions, region_dataset_counts,
+    newest_dataset_creation_time, generation_time, product_refresh_time,
+    footprint_count, footprint_geometry, crses, size_bytes
+)
+select
+    :product_ref, :period_type, :start_day,
+    coalesce((select sum(dataset_count) from children), 0),
+    (select min(time_earliest) from children),
+    (select max(time_latest) from children),
+    (select period from timeline_grouping),
+    coalesce(
+        (select array_agg(start_day order by start_day) from grouped_timeline), '{{}}'
+    ),
+    coalesce(
+        (select array_agg(count order by start_day) from grouped_timeline), '{{}}'
+    ),
+    coalesce(
+        (select array_agg(region order by region collate "C") from regions), '{{}}'
+    ),
+    coalesce(
+        (select array_agg(count order by region collate "C") from regions), '{{}}'
+    ),
+    (select max(newest_dataset_creation_time) from children),
+    now(),
+    :product_refresh_time,
+    coalesce((select sum(footprint_count) from valid_footprints), 0),
+    (
+        select ST_SimplifyPreserveTopology(ST_Union(footprint), :footprint_tolerance)
+        from valid_footprints
+    ),
+    coalesce(
+        (
+            select array_agg(distinct crs order by crs)
+            from children, unnest(children.crses) as crs
+        ),
+        '{{}}'
+    ),
+    coalesce((select sum(size_bytes) from children), 0)
+on conflict (product_ref, start_day, period_type) do update set
+    {_ROLLUP_UPDATE_SET}
+returning {_TIME_OVERVIEW_COLUMN_NAMES}
+"""
+    )
+    .bindparams(
+        bindparam("product_refresh_time", type_=DateTime(timezone=True)),
+        bindparam("footprint_tolerance", type_=Float),
+    )
+    .columns(*TIME_OVERVIEW.columns)
+)
+
+
+# Mapbox Vector Tiles of each layer, in Web Mercator. (see `SummaryStore.get_tile()`)
+_TILE_ENVELOPE = "ST_TileEnvelope(:z, :x, :y)"
+# The tile's layer is made from its rows with a geometry in the tile.
+_TILE_AS_MVT = "select ST_AsMVT(tile, :layer) from tile where geom is not null"
+
+# The stored summary of the period.
+_TILE_PERIOD_SUMMARY = f"""
+    select *
+    from {CUBEDASH_SCHEMA}.time_overview
+    where product_ref = :product_ref
+      and period_type = :period_type
+      and start_day = :start_day
+"""
+# The datasets of the period (within the tile).
+_TILE_PERIOD_DATASETS = f"""
+    select *
+    from {CUBEDASH_SCHEMA}.dataset_spatial
+    where dataset_type_ref = :dataset_type_ref
+      and tstzrange(:time_begin, :time_end, '[)') @> center_time
+      and ST_Transform(footprint, 4326) && ST_Transform({_TILE_ENVELOPE}, 4326)
+"""
+
+_TILE_REGIONS_QUERY = f"""
+with tile as (
+    select region.region_code,
+           counts.count,
+           ST_AsMVTGeom(ST_Transform(region.footprint, 3857), {_TILE_ENVELOPE}) as geom
+    from {CUBEDASH_SCHEMA}.region
+    join (
+        select r.region_code, r.count
+        from ({_TILE_PERIOD_SUMMARY}) as summary,
+             unnest(summary.regions, summary.region_dataset_counts)
+                as r(region_code, count)
+    ) as counts using (region_code)
+    where region.dataset_type_ref = :dataset_type_ref
+      and region.footprint && ST_Transform({_TILE_ENVELOPE}, 4326)
+)
+{_TILE_AS_MVT}
+"""
+_TILE_DAY_REGIONS_QUERY = f"""
+with tile as (
+    select region.region_code,
+           counts.count,
+           ST_AsMVTGeom(ST_Transform(region.footprint, 3857), {_TILE_ENVELOPE}) as geom
+    from {CUBEDASH_SCHEMA}.region
+    join (
+        select region_code, count(*)::integer as count
+        from ({_TILE_PERIOD_DATASETS}) as datasets
+        group by region_code
+    ) as counts using (region_code)
+    where region.dataset_type_ref = :dataset_type_ref
+)
+{_TILE_AS_MVT}
+"""
+_TILE_FOOTPRINT_QUERY = f"""
+with tile as (
+    select dataset_count,
+           footprint_count,
+           ST_AsMVTGeom(
+               ST_Transform(
+                   -- Summaries written by older versions have no WGS84 footprint.
+                   coalesce(footprint_wgs84, footprint_geometry), 3857
+               ),
+               {_TILE_ENVELOPE}
+           ) as geom
+    from ({_TILE_PERIOD_SUMMARY}) as summary
+    where footprint_count > 0
+)
+{_TILE_AS_MVT}
+"""
+_TILE_DAY_FOOTPRINT_QUERY = f"""
+with tile as (
+    select count(*)::integer as dataset_count,
+           count(footprint)::integer as footprint_count,
+           ST_AsMVTGeom(
+               ST_Transform(ST_Union(ST_Transform(footprint, 4326)), 3857),
+               {_TILE_ENVELOPE}
+           ) as geom
+    from ({_TILE_PERIOD_DATASETS}) as datasets
+)
+{_TILE_AS_MVT}
+"""
+_TILE_DATASETS_QUERY = f"""
+with tile as (
+    select id::text as id,
+           region_code,
+           to_json(center_time) #>> '{{}}' as center_time,
+           ST_AsMVTGeom(ST_Transform(footprint, 3857), {_TILE_ENVELOPE}) as geom
+    from ({_TILE_PERIOD_DATASETS}) as datasets
+    order by datasets.center_time, datasets.id
+    limit :limit
+)
+{_TILE_AS_MVT}
+"""
+
+
+def _tile_query(sql: str) -> TextClause:
+    query = text(sql)
+    if ":time_begin" in sql:
+        # Postgres can't otherwise tell the type of null (unbounded) times.
+        query = query.bindparams(
+            bindparam("time_begin", type_=DateTime(timezone=True)),
+            bindparam("time_end", type_=DateTime(timezone=True)),
+        )
+    return query
+
+
+# For each layer: the query for stored periods, and for days (which aren't stored).
+_TILE_QUERIES: Dict[str, Tuple[TextClause, TextClause]] = {
+    "regions": (
+        _tile_query(_TILE_REGIONS_QUERY),
+        _tile_query(_TILE_DAY_REGIONS_QUERY),
+    ),
+    "footprint": (
+        _tile_query(_TILE_FOOTPRINT_QUERY),
+        _tile_query(_TILE_DAY_FOOTPRINT_QUERY),
+    ),
+    "datasets": (
+        _tile_query(_TILE_DATASETS_QUERY),
+        _tile_query(_TILE_DATASETS_QUERY),
+    ),
+}
+
+# The product table columns of a ProductSummary. (named as its fields)
+_PRODUCT_SUMMARY_COLUMNS = [
+    PRODUCT.c.dataset_count,
+    PRODUCT.c.time_earliest,
+    PRODUCT.c.time_latest,
+    PRODUCT.c.last_refresh.label("last_refresh_time"),
+    PRODUCT.c.last_successful_summary.label("last_successful_summary_time"),
+    PRODUCT.c.id.label("id_"),
+    PRODUCT.c.source_product_refs,
+    PRODUCT.c.derived_product_refs,
+    PRODUCT.c.fixed_metadata,
+]
+
+# The columns of the larger summary fields. (see `_summary_columns()`)
+_OPTIONAL_SUMMARY_COLUMNS = {
+    "timeline_dataset_counts": (
+        TIME_OVERVIEW.c.timeline_dataset_start_days,
+        TIME_OVERVIEW.c.timeline_dataset_counts,
+    ),
+    "region_dataset_counts": (
+        TIME_OVERVIEW.c.regions,
+        TIME_OVERVIEW.c.region_dataset_counts,
+    ),
+    "footprint_geometry": (TIME_OVERVIEW.c.footprint_geometry,),
+    "footprint_wgs84_geojson": (
+        TIME_OVERVIEW.c.footprint_wgs84_geojson,
+        TIME_OVERVIEW.c.footprint_wgs84_coarse_geojson,
+    ),
+}
+# (The footprint_wgs84_resolutions are always loaded: they're small, and tell which
+#  of the footprint's levels a request needs before loading it.)
+# Stored for use within Postgres, but not loaded. (see footprint_wgs84_geojson)
+_UNLOADED_SUMMARY_COLUMNS = {TIME_OVERVIEW.c.footprint_wgs84.name}
+
+
+def _summary_columns(fields: Optional[Collection[str]]) -> List[ColumnElement]:
+    """
+    The time_overview columns needed to load the given (optional) summary fields.
+
+    (None for all of them)
+    """
+    if fields is None:
+        return [
+            c for c in TIME_OVERVIEW.columns if c.name not in _UNLOADED_SUMMARY_COLUMNS
+        ]
+
+    unknown_fields = set(fields) - set(_OPTIONAL_SUMMARY_COLUMNS)
+    if unknown_fields:
+        raise ValueError(
+            f"Unknown optional summary fields: {sorted(unknown_fields)!r}. "
+            f"Expected some of {sorted(_OPTIONAL_SUMMARY_COLUMNS)!r}"
+        )
+    skipped_columns = _UNLOADED_SUMMARY_COLUMNS | {
+        column.name
+        for field, columns in _OPTIONAL_SUMMARY_COLUMNS.items()
+        if field not in fields
+        for column in columns
+    }
+    columns = [c for c in TIME_OVERVIEW.columns if c.name not in skipped_columns]
+    if "footprint_geometry" not in fields:
+        # For the footprint's crs.
+        columns.append(
+            func.ST_SRID(TIME_OVERVIEW.c.footprint_geometry).label("footprint_srid")
+        )
+    return columns
+
+
+def _union_fields(
+    a: Optional[Collection[str]], b: Optional[Collection[str]]
+) -> Optional[Collection[str]]:
+    """The optional summary fields in either (None for all of them)"""
+    if a is None or b is None:
+        return None
+    return {*a, *b}
+
+
+def _period_summary_columns(
+    period_fields: Dict[Tuple[str, date], Optional[Collection[str]]],
+) -> List[ColumnElement]:
+    """
+    The time_overview columns needed to load the given optional summary fields of
+    each (period type, start day).
+
+    Fields that only some of the periods need are null for the others, so that
+    their (large) values aren't sent needlessly.
+    """
+    all_fields = None
+    for i, fields in enumerate(period_fields.values()):
+        all_fields = fields if i == 0 else _union_fields(all_fields, fields)
+    columns = _summary_columns(all_fields)
+
+    partial_columns = {}
+    for field in _OPTIONAL_SUMMARY_COLUMNS if all_fields is None else all_fields:
+        needed_by = [
+            period_start
+            for period_start, fields in period_fields.items()
+            if fields is None or field in fields
+        ]
+        if len(needed_by) == len(period_fields):
+            continue
+        is_needed = or_(
+            *(
+                and_(
+                    TIME_OVERVIEW.c.period_type == period,
+                    TIME_OVERVIEW.c.start_day == start_day,
+                )
+                for period, start_day in needed_by
             )
         )
-        if res["timeline_dataset_start_days"]
+        for column in _OPTIONAL_SUMMARY_COLUMNS[field]:
+            partial_columns[column.name] = case(
+                [(is_needed, column)], else_=null()
+            ).label(column.name)
+
+    columns = [partial_columns.get(c.name, c) for c in columns]
+    if TIME_OVERVIEW.c.footprint_geometry.name in partial_columns:
+        # For the footprint's crs, when it isn't loaded.
+        columns.append(
+            func.ST_SRID(TIME_OVERVIEW.c.footprint_geometry).label("footprint_srid")
+        )
+    return columns
+
+
+def _summary_from_row(
+    res: Mapping[str, Any], product_name, grouping_timezone=default_timezone
+):
+    # Any optional columns that weren't selected will be None.
+    res = dict(res)
+
+    timeline_dataset_counts = (
+        TimelineCounts.from_pairs(
+            res["timeline_dataset_start_days"],
+            res["timeline_dataset_counts"],
+            tzinfo=grouping_timezone,
+        )
+        if res.get("timeline_dataset_start_days")
         else None
     )
     region_dataset_counts = (
-        Counter(dict(zip(res["regions"], res["region_dataset_counts"])))
-        if res["regions"]
+        RegionCounts.from_pairs(res["regions"], res["region_dataset_counts"])
+        if res.get("regions")
         else None
     )
+    footprint = res.get("footprint_geometry")
+    footprint_srid = (
+        footprint.srid if footprint is not None else res.get("footprint_srid")
+    )
     period_type = res["period_type"]
     year, month, day = TimePeriodOverview.from_flat_period_representation(
         period_type, res["start_day"]
@@ -1938,7 +3117,7 @@ def _summary_from_row(res, product_name, grouping_timezone=default_timezone):
         month=month,
         day=day,
         dataset_count=res["dataset_count"],
-        # : Counter
+        # : TimelineCounts
         timeline_dataset_counts=timeline_dataset_counts,
         region_dataset_counts=region_dataset_counts,
         timeline_period=res["timeline_period"],
@@ -1959,16 +3138,14 @@ def _summary_from_row(res, product_name, grouping_timezone=default_timezone):
             if res["time_earliest"]
             else None
         ),
-        # shapely.geometry.base.BaseGeometry
+        # shapely.geometry.base.BaseGeometry (decoded on first use)
         footprint_geometry=(
-            None
-            if res["footprint_geometry"] is None
-            else geo_shape.to_shape(res["footprint_geometry"])
+            None if footprint is None else _encoded_geometry(footprint)
         ),
         footprint_crs=(
             None
-            if res["footprint_geometry"] is None or res["footprint_geometry"].srid == -1
-            else "EPSG:{}".format(res["footprint_geometry"].srid)
+            if footprint_srid is None or footprint_srid == -1
+            else "EPSG:{}".format(footprint_srid)
         ),
         size_bytes=res["size_bytes"],
         footprint_count=res["footprint_count"],
@@ -1978,9 +3155,65 @@ def _summary_from_row(res, product_name, grouping_timezone=default_timezone):
         # When this summary was last generated
         summary_gen_time=res["generation_time"],
         crses=set(res["crses"]) if res["crses"] is not None else None,
+        footprint_wgs84_geojson=res.get("footprint_wgs84_geojson"),
+        footprint_wgs84_coarse_geojson=res.get("footprint_wgs84_coarse_geojson"),
+        footprint_wgs84_resolutions=res.get("footprint_wgs84_resolutions"),
     )
 
 
+def _row_to_data(row: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    A row of table values as json-able data. (see `_row_from_data()`)
+    """
+    return {name: _value_to_data(value) for name, value in row.items()}
+
+
+def _value_to_data(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, WKBElement):
+        return dict(srid=value.srid, ewkb=bytes(_encoded_geometry(value)).hex())
+    if isinstance(value, (list, tuple)):
+        return [_value_to_data(v) for v in value]
+    return value
+
+
+def _row_from_data(
+    data: Mapping[str, Any], columns: Iterable[ColumnElement]
+) -> Dict[str, Any]:
+    """
+    Read the values of the given columns from `_row_to_data()` output.
+    """
+    return {
+        column.name: _value_from_data(data[column.name], column.type)
+        for column in columns
+    }
+
+
+def _value_from_data(value: Any, type_) -> Any:
+    if value is None:
+        return None
+    if isinstance(type_, postgres.ARRAY):
+        return [_value_from_data(v, type_.item_type) for v in value]
+    if isinstance(type_, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(type_, Date):
+        return date.fromisoformat(value)
+    if isinstance(type_, PostgisGeometry):
+        return WKBElement(
+            bytes.fromhex(value["ewkb"]), srid=value["srid"], extended=True
+        )
+    return value
+
+
+def _encoded_geometry(element: WKBElement) -> EncodedGeometry:
+    data = element.data
+    # Raw (text) queries give hex.
+    if isinstance(data, str):
+        data = bytes.fromhex(data)
+    return EncodedGeometry(bytes(data))
+
+
 def _summary_to_row(
     summary: TimePeriodOverview, grouping_timezone=default_timezone
 ) -> dict:
@@ -2012,6 +3245,7 @@ def _summary_to_row(
                 summary.footprint_geometry, summary.footprint_srid
             )
         ),
+        **_footprint_wgs84_columns(summary),
         footprint_count=summary.footprint_count,
         generation_time=func.now(),
         newest_dataset_creation_time=summary.newest_dataset_creation_time,
@@ -2019,6 +3253,102 @@ def _summary_to_row(
     )
 
 
+def _footprint_wgs84_columns(summary: TimePeriodOverview) -> dict:
+    """
+    The summary's footprint projected for display, so that requests needn't do it.
+
+    At each of our levels of detail (see `_footprint_wgs84_levels()`).
+    """
+    footprint = summary.footprint_wgs84
+    if footprint is None or footprint.is_empty:
+        return dict(
+            footprint_wgs84=None,
+            footprint_wgs84_geojson=None,
+            footprint_wgs84_coarse_geojson=None,
+            footprint_wgs84_resolutions=None,
+        )
+
+    levels = _footprint_wgs84_levels(footprint)
+    *coarse_levels, (_, finest) = levels
+    return dict(
+        footprint_wgs84=geo_shape.from_shape(finest, 4326),
+        footprint_wgs84_geojson=shapely.to_geojson(finest),
+        footprint_wgs84_coarse_geojson=[
+            shapely.to_geojson(geometry) for _, geometry in coarse_levels
+        ],
+        footprint_wgs84_resolutions=[resolution for resolution, _ in levels],
+    )
+
+
+def _footprint_wgs84_levels(
+    footprint: BaseGeometry,
+) -> List[Tuple[float, BaseGeometry]]:
+    """
+    Simplify a WGS84 footprint to each of our levels, coarsest first.
+
+    Returned with the resolution of each, in metres.
+    """
+    levels = []
+    previous_vertex_count = None
+    for tolerance, max_vertices in _WGS84_FOOTPRINT_LEVELS:
+        tolerance, simplified = _simplify_wgs84(footprint, tolerance, max_vertices)
+
+        vertex_count = shapely.get_num_coordinates(simplified)
+        if vertex_count == previous_vertex_count:
+            # No more detailed than the coarser version, so that's good enough at
+            # this resolution too.
+            levels[-1] = (tolerance, levels[-1][1])
+        else:
+            levels.append((tolerance, simplified))
+        previous_vertex_count = vertex_count
+    return levels
+
+
+def _simplify_wgs84(
+    footprint: BaseGeometry, tolerance: float, max_vertices: int
+) -> Tuple[float, BaseGeometry]:
+    """
+    Simplify a WGS84 footprint to at most `max_vertices`, starting at the given
+    tolerance (in metres) and doubling it as needed.
+
+    Returned with the tolerance used.
+    """
+
+    def simplify(preserve_topology=True) -> BaseGeometry:
+        return shapely.simplify(
+            footprint,
+            tolerance * _DEGREES_PER_METRE,
+            preserve_topology=preserve_topology,
+        )
+
+    # Preserving topology keeps at least four coordinates per ring, so the count of
+    # a footprint with many small parts can't fall below that.
+    ring_count = len(shapely.get_rings(shapely.get_parts(footprint)))
+    if _MIN_RING_VERTICES * ring_count <= max_vertices:
+        simplified = simplify()
+        vertex_count = shapely.get_num_coordinates(simplified)
+        for _ in range(_MAX_SIMPLIFY_DOUBLINGS):
+            if vertex_count <= max_vertices:
+                break
+            tolerance *= 2
+            coarser = simplify()
+            coarser_vertex_count = shapely.get_num_coordinates(coarser)
+            if coarser_vertex_count >= vertex_count:
+                # It's stopped getting simpler.
+                break
+            simplified, vertex_count = coarser, coarser_vertex_count
+        if vertex_count <= max_vertices:
+            return tolerance, simplified
+
+    # Drop or collapse the smallest parts instead, or failing that, use the outline.
+    simplified = simplify(preserve_topology=False)
+    if simplified.is_empty or shapely.get_num_coordinates(simplified) > max_vertices:
+        simplified = shapely.simplify(
+            shapely.convex_hull(footprint), tolerance * _DEGREES_PER_METRE
+        )
+    return tolerance, simplified
+
+
 def _common_paths_for_uris(
     uri_samples: Iterator[str],
 ) -> Generator[ProductLocationSample, None, None]:
@@ -2044,12 +3374,13 @@ def _common_paths_for_uris(
         )
 
 
-def _counter_key_vals(counts: Counter, null_sort_key="ø") -> Tuple[Tuple, Tuple]:
+def _counter_key_vals(counts: Mapping, null_sort_key="ø") -> Tuple[Tuple, Tuple]:
     """
     Split counter into a keys sequence and a values sequence.
 
     (Both sorted by key)
 
+    >>> from collections import Counter
     >>> tuple(_counter_key_vals(Counter(['a', 'a', 'b'])))
     (('a', 'b'), (2, 1))
     >>> tuple(_counter_key_vals(Counter(['a'])))
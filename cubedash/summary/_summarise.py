@@ -1,9 +1,9 @@
 import os
-from collections import Counter
+from dataclasses import dataclass, replace
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Mapping, Optional, Tuple
 
-import pandas as pd
+import numpy as np
 import sqlalchemy
 import structlog
 from cachetools.func import lru_cache
@@ -11,16 +11,19 @@ from datacube.model import Range
 from dateutil import tz
 from geoalchemy2 import Geometry
 from geoalchemy2 import shape as geo_shape
-from sqlalchemy import and_, func, or_, select
+from sqlalchemy import and_, case, func, literal, or_, select
 from sqlalchemy.dialects.postgresql import TSTZRANGE
+from sqlalchemy.exc import DataError, InternalError, ProgrammingError
 from sqlalchemy.sql import ColumnElement
 
 from cubedash import _utils
 from cubedash._utils import ODC_DATASET_TYPE
 from cubedash.summary import TimePeriodOverview
+from cubedash.summary._counters import RegionCounts, TimelineCounts
 from cubedash.summary._schema import (
     DATASET_SPATIAL,
     FOOTPRINT_SRID_EXPRESSION,
+    SPATIAL_REF_SYS,
     get_srid_name,
 )
 
@@ -57,8 +60,43 @@ def _scalar_subquery(selectable):
         return selectable.as_scalar()
 
 
+# Roughly how many degrees is a metre at the equator?
+# (to apply a grid size to footprints in geographic CRSes)
+_DEGREES_PER_METRE = 1 / 111_320
+
+
+@dataclass(frozen=True)
+class FootprintUnionSettings:
+    """
+    How to combine dataset footprints into a summary footprint.
+
+    The default is an exact union, which is slow for products with many
+    thousands of datasets per month.
+    """
+
+    # Reduce footprints to a grid of this many metres before unioning them.
+    # Vertices closer than this are merged, so adjacent tiles share edges exactly.
+    # (None: union the footprints exactly as they are)
+    grid_size_metres: Optional[float] = None
+
+    # Do the footprints of different regions tile cleanly (edge-to-edge, without
+    # overlaps), such as in gridded products? Each region is then unioned alone, and
+    # the regions combined with a (far cheaper) coverage union.
+    is_coverage: bool = False
+
+    @property
+    def is_exact(self):
+        return self.grid_size_metres is None and not self.is_coverage
+
+
 class Summariser:
-    def __init__(self, engine, log=_LOG, grouping_time_zone=DEFAULT_TIMEZONE) -> None:
+    def __init__(
+        self,
+        engine,
+        log=_LOG,
+        grouping_time_zone=DEFAULT_TIMEZONE,
+        footprint_union: Mapping[Optional[str], FootprintUnionSettings] = None,
+    ) -> None:
         self._engine = engine
         self.log = log
         # Group datasets using this timezone when counting them.
@@ -67,6 +105,16 @@ class Summariser:
         # cache
         self._grouping_time_zone_tz = tz.gettz(self.grouping_time_zone)
 
+        # Footprint union settings for each product name.
+        # (a None key applies to any product not listed)
+        self.footprint_union = dict(footprint_union or {})
+
+    def footprint_union_settings(self, product_name: str) -> FootprintUnionSettings:
+        settings = self.footprint_union.get(product_name)
+        if settings is None:
+            settings = self.footprint_union.get(None, FootprintUnionSettings())
+        return settings
+
     def calculate_summary(
         self,
         product_name: str,
@@ -82,51 +130,17 @@ class Summariser:
 
         begin_time, end_time, where_clause = self._where(product_name, time)
 
-        select_by_srid = (
-            select(
-                (
-                    func.ST_SRID(DATASET_SPATIAL.c.footprint).label("srid"),
-                    func.count().label("dataset_count"),
-                    func.ST_Transform(
-                        func.ST_Union(DATASET_SPATIAL.c.footprint),
-                        FOOTPRINT_SRID_EXPRESSION,
-                        type_=Geometry(),
-                    ).label("footprint_geometry"),
-                    func.sum(DATASET_SPATIAL.c.size_bytes).label("size_bytes"),
-                    func.max(DATASET_SPATIAL.c.creation_time).label(
-                        "newest_dataset_creation_time"
-                    ),
-                )
+        union_settings = self.footprint_union_settings(product_name)
+        row = self._query_summary(where_clause, union_settings, log)
+        if row.pop("is_valid_coverage", None) is False:
+            # Its regions overlap or have gaps, so the coverage union may be wrong.
+            log.warning(
+                "summary.footprint_union.invalid_coverage",
+                union_settings=union_settings,
             )
-            .where(where_clause)
-            .group_by("srid")
-            .alias("srid_summaries")
-        )
-
-        # Union all srid groups into one summary.
-        result = self._engine.execute(
-            select(
-                (
-                    func.sum(select_by_srid.c.dataset_count).label("dataset_count"),
-                    func.array_agg(select_by_srid.c.srid).label("srids"),
-                    func.sum(select_by_srid.c.size_bytes).label("size_bytes"),
-                    func.ST_Union(
-                        func.ST_Buffer(select_by_srid.c.footprint_geometry, 0),
-                        type_=Geometry(),
-                    ).label("footprint_geometry"),
-                    func.max(select_by_srid.c.newest_dataset_creation_time).label(
-                        "newest_dataset_creation_time"
-                    ),
-                    func.now().label("summary_gen_time"),
-                )
+            row = self._query_summary(
+                where_clause, replace(union_settings, is_coverage=False), log
             )
-        )
-
-        rows = result.fetchall()
-        log.debug("summary.query.done", srid_rows=len(rows))
-
-        assert len(rows) == 1
-        row = dict(rows[0])
         row["dataset_count"] = int(row["dataset_count"]) if row["dataset_count"] else 0
         if row["footprint_geometry"] is not None:
             row["footprint_crs"] = self._get_srid_name(row["footprint_geometry"].srid)
@@ -147,52 +161,49 @@ class Summariser:
         log.debug("counter.calc")
 
         # Initialise all requested days as zero
-        day_counts = Counter(
-            {
-                d.date(): 0
-                for d in pd.date_range(
-                    begin_time, end_time, inclusive="left", nonexistent="shift_forward"
-                )
-            }
+        days = np.arange(
+            np.datetime64(begin_time.date()), np.datetime64(end_time.date())
         )
-        region_counts = Counter()
+        day_counts = TimelineCounts(days, np.zeros(len(days), dtype=np.int32))
+        region_counts = RegionCounts.merge([])
         if has_data:
-            day_counts.update(
-                Counter(
-                    {
-                        day.date(): count
-                        for day, count in self._engine.execute(
-                            select(
-                                [
-                                    func.date_trunc(
-                                        "day",
-                                        DATASET_SPATIAL.c.center_time.op(
-                                            "AT TIME ZONE"
-                                        )(self.grouping_time_zone),
-                                    ).label("day"),
-                                    func.count(),
-                                ]
-                            )
-                            .where(where_clause)
-                            .group_by("day")
-                        )
-                    }
+            day_rows = self._engine.execute(
+                select(
+                    [
+                        func.date_trunc(
+                            "day",
+                            DATASET_SPATIAL.c.center_time.op("AT TIME ZONE")(
+                                self.grouping_time_zone
+                            ),
+                        ).label("day"),
+                        func.count(),
+                    ]
                 )
+                .where(where_clause)
+                .group_by("day")
+            ).fetchall()
+            day_counts = TimelineCounts.merge(
+                [
+                    day_counts,
+                    TimelineCounts.from_pairs(
+                        (day.date() for day, _ in day_rows),
+                        (count for _, count in day_rows),
+                    ),
+                ]
             )
-            region_counts = Counter(
-                {
-                    item: count
-                    for item, count in self._engine.execute(
-                        select(
-                            [
-                                DATASET_SPATIAL.c.region_code.label("region_code"),
-                                func.count(),
-                            ]
-                        )
-                        .where(where_clause)
-                        .group_by("region_code")
-                    )
-                }
+            region_rows = self._engine.execute(
+                select(
+                    [
+                        DATASET_SPATIAL.c.region_code.label("region_code"),
+                        func.count(),
+                    ]
+                )
+                .where(where_clause)
+                .group_by("region_code")
+            ).fetchall()
+            region_counts = RegionCounts.from_pairs(
+                (item for item, _ in region_rows),
+                (count for _, count in region_rows),
             )
 
         if product_refresh_time is None:
@@ -224,6 +235,175 @@ class Summariser:
         )
         return summary
 
+    def _query_summary(
+        self,
+        where_clause: ColumnElement,
+        union_settings: FootprintUnionSettings,
+        log,
+    ) -> dict:
+        try:
+            result = self._engine.execute(
+                self._select_summary(where_clause, union_settings)
+            )
+        except (ProgrammingError, InternalError, DataError) as e:
+            if union_settings.is_exact:
+                raise
+            # An older PostGIS without the functions, or footprints that
+            # didn't reduce cleanly.
+            log.warning(
+                "summary.footprint_union.fallback",
+                union_settings=union_settings,
+                error=str(e.orig),
+            )
+            result = self._engine.execute(
+                self._select_summary(where_clause, FootprintUnionSettings())
+            )
+
+        rows = result.fetchall()
+        log.debug("summary.query.done", srid_rows=len(rows))
+
+        assert len(rows) == 1
+        return dict(rows[0])
+
+    def _select_summary(
+        self, where_clause: ColumnElement, union_settings: FootprintUnionSettings
+    ):
+        footprint = DATASET_SPATIAL.c.footprint
+        from_table = DATASET_SPATIAL
+        if union_settings.grid_size_metres:
+            # The grid is in the units of each footprint's own CRS.
+            srid_units = select(
+                [
+                    SPATIAL_REF_SYS.c.srid,
+                    case(
+                        [
+                            (
+                                SPATIAL_REF_SYS.c.proj4text.like("%+proj=longlat%"),
+                                literal(_DEGREES_PER_METRE),
+                            )
+                        ],
+                        else_=literal(1.0),
+                    ).label("units_per_metre"),
+                ]
+            ).alias("srid_units")
+            from_table = DATASET_SPATIAL.join(
+                srid_units, srid_units.c.srid == func.ST_SRID(footprint)
+            )
+            footprint = func.ST_ReducePrecision(
+                footprint,
+                srid_units.c.units_per_metre * union_settings.grid_size_metres,
+                type_=Geometry(),
+            )
+
+        if union_settings.is_coverage:
+            # Datasets of a region (eg. a grid tile) overlap each other over time,
+            # but the regions themselves shouldn't: so union each region, then
+            # combine the regions as a coverage.
+            by_region = (
+                select(
+                    (
+                        func.ST_SRID(DATASET_SPATIAL.c.footprint).label("srid"),
+                        DATASET_SPATIAL.c.region_code,
+                        func.count().label("dataset_count"),
+                        func.ST_Union(footprint, type_=Geometry()).label("footprint"),
+                        func.sum(DATASET_SPATIAL.c.size_bytes).label("size_bytes"),
+                        func.max(DATASET_SPATIAL.c.creation_time).label(
+                            "newest_dataset_creation_time"
+                        ),
+                    )
+                )
+                .select_from(from_table)
+                .where(where_clause)
+                .group_by("srid", DATASET_SPATIAL.c.region_code)
+                .alias("region_summaries")
+            )
+            # Edges of each region that don't match its neighbours' (overlaps or
+            # gaps), which would make the coverage union wrong. (null if none)
+            by_region = select(
+                (
+                    by_region,
+                    func.ST_CoverageInvalidEdges(
+                        by_region.c.footprint, type_=Geometry()
+                    )
+                    .over(partition_by=by_region.c.srid)
+                    .label("invalid_edges"),
+                )
+            ).alias("checked_region_summaries")
+            coverage_union = func.ST_CoverageUnion(
+                by_region.c.footprint, type_=Geometry()
+            )
+            select_by_srid = (
+                select(
+                    (
+                        by_region.c.srid,
+                        func.sum(by_region.c.dataset_count).label("dataset_count"),
+                        func.ST_Transform(
+                            coverage_union,
+                            FOOTPRINT_SRID_EXPRESSION,
+                            type_=Geometry(),
+                        ).label("footprint_geometry"),
+                        func.sum(by_region.c.size_bytes).label("size_bytes"),
+                        func.max(by_region.c.newest_dataset_creation_time).label(
+                            "newest_dataset_creation_time"
+                        ),
+                        and_(
+                            func.bool_and(by_region.c.invalid_edges.is_(None)),
+                            func.ST_IsValid(coverage_union),
+                        ).label("is_valid_coverage"),
+                    )
+                )
+                .group_by(by_region.c.srid)
+                .alias("srid_summaries")
+            )
+        else:
+            select_by_srid = (
+                select(
+                    (
+                        func.ST_SRID(DATASET_SPATIAL.c.footprint).label("srid"),
+                        func.count().label("dataset_count"),
+                        func.ST_Transform(
+                            func.ST_Union(footprint),
+                            FOOTPRINT_SRID_EXPRESSION,
+                            type_=Geometry(),
+                        ).label("footprint_geometry"),
+                        func.sum(DATASET_SPATIAL.c.size_bytes).label("size_bytes"),
+                        func.max(DATASET_SPATIAL.c.creation_time).label(
+                            "newest_dataset_creation_time"
+                        ),
+                    )
+                )
+                .select_from(from_table)
+                .where(where_clause)
+                .group_by("srid")
+                .alias("srid_summaries")
+            )
+
+        coverage_columns = []
+        if union_settings.is_coverage:
+            coverage_columns.append(
+                func.bool_and(select_by_srid.c.is_valid_coverage).label(
+                    "is_valid_coverage"
+                )
+            )
+
+        # Union all srid groups into one summary.
+        return select(
+            (
+                *coverage_columns,
+                func.sum(select_by_srid.c.dataset_count).label("dataset_count"),
+                func.array_agg(select_by_srid.c.srid).label("srids"),
+                func.sum(select_by_srid.c.size_bytes).label("size_bytes"),
+                func.ST_Union(
+                    func.ST_Buffer(select_by_srid.c.footprint_geometry, 0),
+                    type_=Geometry(),
+                ).label("footprint_geometry"),
+                func.max(select_by_srid.c.newest_dataset_creation_time).label(
+                    "newest_dataset_creation_time"
+                ),
+                func.now().label("summary_gen_time"),
+            )
+        )
+
     def _with_default_tz(self, d: datetime) -> datetime:
         if d.tzinfo is None:
             return d.replace(tzinfo=self._grouping_time_zone_tz)
@@ -0,0 +1,162 @@
+"""
+Wait for dataset changes in ODC, so that summaries can be refreshed as they happen.
+"""
+
+import select as select_io
+import time
+from datetime import datetime, timedelta
+from typing import Generator, Optional, Set
+
+import psycopg2.extensions
+import structlog
+
+from cubedash._utils import ODC_DATASET
+from cubedash.summary._schema import (
+    DATASET_CHANGE_CHANNEL,
+    DATASET_CHANGE_TRIGGER_NAME,
+    pg_trigger_exists,
+)
+from cubedash.summary._stores import SummaryStore
+
+_LOG = structlog.get_logger()
+
+
+class DatasetChangeWatcher:
+    """
+    Report which ODC products have changed datasets, in debounced batches.
+
+    Listens for notifications from our trigger on ODC's dataset table if it's
+    installed (see `install_dataset_change_notify_trigger()`), otherwise falls
+    back to polling the dataset table for recent changes.
+
+    A batch is released once no new changes have arrived for the `debounce` period,
+    so a burst of indexing leads to one refresh. A batch is never held for longer
+    than `max_delay`, so constant indexing still gets refreshed.
+    """
+
+    def __init__(
+        self,
+        store: SummaryStore,
+        debounce: timedelta = timedelta(seconds=30),
+        poll_interval: timedelta = timedelta(minutes=1),
+        max_delay: timedelta = None,
+    ) -> None:
+        self.store = store
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.max_delay = max_delay or (debounce * 10)
+
+        self._listen_connection = None
+        # The latest change time we've seen, when polling.
+        self._polled_up_to: Optional[datetime] = None
+
+    @property
+    def is_listening(self) -> bool:
+        """Are we receiving notifications (rather than polling)?"""
+        return self._listen_connection is not None
+
+    def start(self):
+        """
+        Start watching for changes.
+
+        Call this *before* any initial refresh, so that no changes are missed in between.
+        """
+        engine = self.store._engine
+        if pg_trigger_exists(engine, ODC_DATASET.fullname, DATASET_CHANGE_TRIGGER_NAME):
+            connection = engine.raw_connection()
+            # It's dedicated to listening from now on, so take it out of the pool.
+            connection.detach()
+            connection.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"listen {DATASET_CHANGE_CHANNEL};")
+            self._listen_connection = connection
+            _LOG.info("watch.listening", channel=DATASET_CHANGE_CHANNEL)
+        else:
+            self._polled_up_to = self.store._database_time_now()
+            _LOG.warning(
+                "watch.polling",
+                reason="No dataset-change trigger installed. (see `cubedash-gen --init`)",
+                poll_interval=self.poll_interval,
+            )
+
+    def close(self):
+        if self._listen_connection is not None:
+            self._listen_connection.close()
+            self._listen_connection = None
+
+    def batches(self) -> Generator[Set[int], None, None]:
+        """
+        Yield sets of changed ODC product ids, forever.
+        """
+        if self._listen_connection is None and self._polled_up_to is None:
+            self.start()
+
+        while True:
+            # Wait as long as needed for the first change...
+            pending = self._wait_for_changes(timeout=None)
+            first_change_at = time.monotonic()
+
+            # ... then keep collecting until things go quiet.
+            while True:
+                remaining = self.max_delay.total_seconds() - (
+                    time.monotonic() - first_change_at
+                )
+                if remaining <= 0:
+                    break
+                more = self._wait_for_changes(
+                    timeout=min(self.debounce.total_seconds(), remaining)
+                )
+                if not more:
+                    break
+                pending.update(more)
+
+            _LOG.info("watch.changes", product_refs=sorted(pending))
+            yield pending
+
+    def _wait_for_changes(self, timeout: Optional[float]) -> Set[int]:
+        """
+        Block until at least one product has changed, or the timeout (seconds) passes.
+
+        Returns the changed product ids (empty if timed out).
+        """
+        if self.is_listening:
+            return self._wait_for_notifications(timeout)
+        return self._wait_for_poll(timeout)
+
+    def _wait_for_notifications(self, timeout: Optional[float]) -> Set[int]:
+        connection = self._listen_connection
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            connection.poll()
+            if connection.notifies:
+                product_refs = {int(n.payload) for n in connection.notifies}
+                connection.notifies.clear()
+                return product_refs
+
+            wait_secs = None
+            if deadline is not None:
+                wait_secs = deadline - time.monotonic()
+                if wait_secs <= 0:
+                    return set()
+            select_io.select([connection], [], [], wait_secs)
+
+    def _wait_for_poll(self, timeout: Optional[float]) -> Set[int]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait_secs = self.poll_interval.total_seconds()
+            if deadline is not None:
+                wait_secs = min(wait_secs, deadline - time.monotonic())
+            if wait_secs > 0:
+                time.sleep(wait_secs)
+
+            changes = self.store.find_products_changed_since(self._polled_up_to)
+            if changes:
+                # (Any late-committed datasets with earlier timestamps are still caught by
+                #  the refresh itself, which rescans with its own safety overlap.)
+                self._polled_up_to = max(changes.values())
+                return set(changes.keys())
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
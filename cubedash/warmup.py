@@ -1,17 +1,27 @@
+import json
+import math
+import re
 import socket
 import sys
+import threading
 import time
 import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
 from textwrap import indent
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 from urllib.error import HTTPError, URLError
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
 import click
-from click import echo, secho, style
+from click import secho, style
 from datacube.index import Index
+from datacube.model import Dataset
 from datacube.ui.click import config_option, environment_option, pass_index
+from sqlalchemy import select, true
 
+from cubedash._utils import ODC_DATASET, ODC_DATASET_TYPE, alchemy_engine
 from cubedash.summary import RegionInfo
 
 
@@ -43,6 +53,7 @@ def find_examples_of_all_public_urls(index: Index):
         yield f"/metadata-types/{name}"
         yield f"/metadata-types/{name}.odc-type.yaml"
 
+    example_datasets = _example_datasets(index)
     for dt in index.products.get_all():
         name = dt.name
         yield f"/{name}"
@@ -55,9 +66,8 @@ def find_examples_of_all_public_urls(index: Index):
         yield f"/stac/search?collection={name}&limit=1"
         yield f"/stac/search?collection={name}&limit=1&_full=true"
 
-        has_datasets = index.datasets.search_eager(product=name, limit=1)
-        if has_datasets:
-            dataset = has_datasets[0]
+        dataset = example_datasets.get(name)
+        if dataset is not None:
             time = dataset.center_time
 
             yield f"/products/{name}/extents/{time:%Y}"
@@ -86,6 +96,178 @@ def find_examples_of_all_public_urls(index: Index):
             yield f"/stac/collections/{name}/items/{dataset.id}"
 
 
+def _example_datasets(index: Index) -> Dict[str, Dataset]:
+    """
+    An active dataset of each product that has any, by product name.
+
+    (One query, rather than a search for each product)
+    """
+    example = (
+        select([ODC_DATASET.c.id])
+        .where(ODC_DATASET.c.dataset_type_ref == ODC_DATASET_TYPE.c.id)
+        .where(ODC_DATASET.c.archived.is_(None))
+        .limit(1)
+        .lateral("example")
+    )
+    dataset_ids = [
+        dataset_id
+        for (dataset_id,) in alchemy_engine(index).execute(
+            select([example.c.id]).select_from(ODC_DATASET_TYPE.join(example, true()))
+        )
+    ]
+    return {
+        dataset.type.name: dataset for dataset in index.datasets.bulk_get(dataset_ids)
+    }
+
+
+# The request and response status of a common (or combined) format access log line.
+# Only paths on this server: not other hosts' urls, or network-path ("//host/...")
+# references that urljoin() would take to another host.
+_ACCESS_LOG_REQUEST = re.compile(
+    r'"(?:GET|HEAD) (?P<path>/(?!/)\S*) HTTP/[\d.]+" (?P<status>\d{3}) '
+)
+
+
+def read_popular_paths(lines: Iterable[str]) -> Counter:
+    """
+    Count the successful GET requests of each path in an access log.
+
+    >>> read_popular_paths([
+    ...     '10.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET /products HTTP/1.1" 200 51',
+    ...     '10.0.0.1 - - [18/Oct/2026:10:00:01 +0000] "GET /products HTTP/1.1" 304 0',
+    ...     '10.0.0.1 - - [18/Oct/2026:10:00:02 +0000] "GET /nothing HTTP/1.1" 404 12',
+    ...     '10.0.0.1 - - [18/Oct/2026:10:00:03 +0000] "POST /stac/search HTTP/1.1" 200 9',
+    ...     '10.0.0.1 - - [18/Oct/2026:10:00:04 +0000] "GET //example.com/ HTTP/1.1" 200 9',
+    ... ])
+    Counter({'/products': 2})
+    """
+    counts = Counter()
+    for line in lines:
+        match = _ACCESS_LOG_REQUEST.search(line)
+        if match and match.group("status")[0] in "23":
+            counts[match.group("path")] += 1
+    return counts
+
+
+def order_by_popularity(
+    url_offsets: Iterable[str], popularity: Counter, top: Optional[int] = None
+) -> List[str]:
+    """
+    The most popular paths first (up to `top` of them), then the other urls.
+
+    >>> order_by_popularity(['/', '/products', '/about'], Counter({'/about': 3, '/stac': 1}))
+    ['/about', '/stac', '/', '/products']
+    >>> order_by_popularity(['/', '/products'], Counter({'/about': 3, '/stac': 1}), top=1)
+    ['/about', '/', '/products']
+    """
+    popular = [path for path, _ in popularity.most_common(top)]
+    seen = set(popular)
+    return popular + [url for url in url_offsets if url not in seen]
+
+
+_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+def route_template(url_offset: str, names: Set[str]) -> str:
+    """
+    Group urls by replacing their product/type names, ids, numbers and region codes.
+
+    >>> route_template('/products/ls8_nbar/extents/2017/04?x=1', {'ls8_nbar'})
+    '/products/<name>/extents/<int>/<int>'
+    >>> route_template('/dataset/0c7a0d47-4e0c-4c5f-8f4f-7d0c8f8b4c2e.odc-metadata.yaml', set())
+    '/dataset/<id>.odc-metadata.yaml'
+    >>> route_template('/product/ls8_nbar/regions/090084.geojson', {'ls8_nbar'})
+    '/product/<name>/regions/<region>.geojson'
+    >>> route_template('/api/regions/ls8_nbar', {'ls8_nbar'})
+    '/api/regions/<name>'
+    """
+    parts = []
+    previous = None
+    for part in urlparse(url_offset).path.split("/"):
+        stem, dot, suffix = part.partition(".")
+        if stem in names:
+            stem = "<name>"
+        elif _UUID.match(stem):
+            stem = "<id>"
+        elif previous == "regions" and stem:
+            stem = "<region>"
+        elif stem.isdigit():
+            stem = "<int>"
+        parts.append(f"{stem}{dot}{suffix}")
+        previous = part
+    return "/".join(parts)
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    >>> _percentile([1, 2, 3, 4], 50)
+    2
+    >>> _percentile([1, 2, 3, 4], 99)
+    4
+    """
+    return sorted_values[max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)]
+
+
+def latency_report(
+    results: Iterable[Tuple[str, Optional[float]]], names: Set[str]
+) -> Dict[str, Dict]:
+    """
+    Response time percentiles (in seconds) of each route template.
+
+    Results are (url, seconds) pairs, with None seconds for failures.
+
+    >>> latency_report([('/p/a', 0.5), ('/p/b', 1.5), ('/p/c', None), ('/', 0.1)], {'a', 'b', 'c'})
+    {'/': {'count': 1, 'failures': 0, 'p50': 0.1, 'p95': 0.1, 'p99': 0.1, 'max': 0.1}, \
+'/p/<name>': {'count': 3, 'failures': 1, 'p50': 0.5, 'p95': 1.5, 'p99': 1.5, 'max': 1.5}}
+    """
+    times = defaultdict(list)
+    failures = Counter()
+    for url_offset, seconds in results:
+        template = route_template(url_offset, names)
+        if seconds is None:
+            failures[template] += 1
+        else:
+            times[template].append(seconds)
+
+    report = {}
+    for template in sorted(set(times) | set(failures)):
+        template_times = sorted(times[template])
+        report[template] = dict(
+            count=len(template_times) + failures[template],
+            failures=failures[template],
+            **{
+                f"p{percent}": (
+                    _percentile(template_times, percent) if template_times else None
+                )
+                for percent in (50, 95, 99)
+            },
+            max=template_times[-1] if template_times else None,
+        )
+    return report
+
+
+class _RateLimit:
+    """
+    Space out the requests of all threads to at most `per_second` (0 for no limit).
+    """
+
+    def __init__(self, per_second: float):
+        self._interval = 1 / per_second if per_second else 0
+        self._next_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start_time = max(self._next_time, now)
+            self._next_time = start_time + self._interval
+        time.sleep(start_time - now)
+
+
 @click.command()
 @environment_option
 @config_option
@@ -114,7 +296,41 @@ def find_examples_of_all_public_urls(index: Index):
     "--throttle-seconds",
     default=0,
     type=float,
-    help="Sleep for this long between requests (seconds)",
+    help="Sleep for this long between each worker's requests (seconds)",
+)
+@click.option(
+    "-j",
+    "--concurrency",
+    default=4,
+    type=click.IntRange(min=1),
+    help="Number of requests to make at once (default: 4)",
+)
+@click.option(
+    "--max-rate",
+    default=0,
+    type=click.FloatRange(min=0),
+    help="At most this many requests per second, in total (default: 0, no limit)",
+)
+@click.option(
+    "--access-log",
+    "access_log",
+    type=click.File("r", errors="replace"),
+    help="A common or combined format access log: its most requested paths are "
+    "loaded first, in order of popularity.",
+)
+@click.option(
+    "--top",
+    "top_popular",
+    type=int,
+    default=None,
+    help="Only load this many of the access log's most requested paths.",
+)
+@click.option(
+    "--report",
+    "report_file",
+    type=click.File("w"),
+    help="Write the response time percentiles of each route (in seconds) "
+    "to this json file ('-' for stdout)",
 )
 @click.option(
     "-x",
@@ -130,6 +346,11 @@ def cli(
     max_failures: int,
     timeout_seconds: int,
     throttle_seconds: float,
+    concurrency: int,
+    max_rate: float,
+    access_log,
+    top_popular: Optional[int],
+    report_file,
     explorer_url: str,
     show_timings: int = 5,
 ):
@@ -142,60 +363,97 @@ def cli(
     Returns error count.
     """
     max_failure_line_count = sys.maxsize if verbose else 5
-    response_times: List[Tuple[float, str]] = []
-    failures = []
-    consecutive_failures = 0
 
-    for url_offset in find_examples_of_all_public_urls(index):
-        url = urljoin(explorer_url, url_offset)
-        secho(f"get {url_offset} ", bold=True, nl=False, err=True)
+    url_offsets = list(find_examples_of_all_public_urls(index))
+    if access_log:
+        url_offsets = order_by_popularity(
+            url_offsets, read_popular_paths(access_log), top=top_popular
+        )
 
-        def handle_failure():
-            nonlocal consecutive_failures
-            consecutive_failures += 1
-            failures.append(url)
-            # Back off slightly for network hiccups.
-            time.sleep(max(throttle_seconds, 1) * (consecutive_failures + 1))
+    rate_limit = _RateLimit(max_rate)
+    stop = threading.Event()
+    lock = threading.Lock()
+    consecutive_failures = 0
 
+    def fetch(url_offset: str) -> Optional[Tuple[str, Optional[float]]]:
+        nonlocal consecutive_failures
+        if stop.is_set():
+            return None
+        rate_limit.wait()
+
+        url = urljoin(explorer_url, url_offset)
+        page_sample = None
         try:
             start_time = time.time()
-            with urllib.request.urlopen(url, timeout=timeout_seconds) as _:
-                finished_in = time.time() - start_time
-                echo(
-                    f"{style('ok', fg='green')} ({_format_time(finished_in)})", err=True
-                )
-            consecutive_failures = 0
-            response_times.append((finished_in, url))
+            with urllib.request.urlopen(url, timeout=timeout_seconds) as response:
+                response.read()
+            finished_in = time.time() - start_time
+            secho(
+                f"get {url_offset} "
+                f"{style('ok', fg='green')} ({_format_time(finished_in)})",
+                err=True,
+            )
+            with lock:
+                consecutive_failures = 0
             time.sleep(throttle_seconds)
+            return url_offset, finished_in
         except socket.timeout:
-            secho(f"timeout (> {timeout_seconds}s)", fg="magenta", err=True)
-            handle_failure()
+            message = style(f"timeout (> {timeout_seconds}s)", fg="magenta")
         except HTTPError as e:
-            secho(f"fail {e.code}", fg="red", err=True)
-            page_sample = "\n".join(
-                s.decode("utf-8") for s in e.readlines()[:max_failure_line_count]
-            )
-            secho(indent(page_sample, " " * 4))
-            handle_failure()
+            message = style(f"fail {e.code}", fg="red")
+            try:
+                page_sample = "\n".join(
+                    s.decode("utf-8") for s in e.readlines()[:max_failure_line_count]
+                )
+            except (OSError, HTTPException):
+                pass
         except URLError as e:
-            secho(f"connection error {e.reason}", fg="magenta", err=True)
-            handle_failure()
+            message = style(f"connection error {e.reason}", fg="magenta")
+        except (OSError, HTTPException) as e:
+            # Such as the connection being reset, or the response being cut
+            # short, while it's read.
+            message = style(f"connection error {e!r}", fg="magenta")
+
+        secho(f"get {url_offset} {message}", err=True)
+        if page_sample:
+            secho(indent(page_sample, " " * 4), err=True)
+        with lock:
+            consecutive_failures += 1
+            failure_count = consecutive_failures
+        if failure_count == max_failures:
+            secho(
+                f"(hit max consecutive failures {max_failures})", fg="yellow", err=True
+            )
+            stop.set()
+        # Back off slightly for network hiccups.
+        time.sleep(max(throttle_seconds, 1) * (failure_count + 1))
+        return url_offset, None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = [r for r in executor.map(fetch, url_offsets) if r is not None]
 
-        if consecutive_failures == max_failures:
-            secho(f"(hit max consecutive failures {max_failures})", fg="yellow")
-            break
+    response_times = sorted(
+        ((seconds, url) for url, seconds in results if seconds is not None),
+        reverse=True,
+    )
+    failures = [url for url, seconds in results if seconds is None]
 
     if response_times:
-        secho()
-        secho("Slowest responses:")
-        for i, (response_secs, url) in enumerate(sorted(response_times, reverse=True)):
-            if i > show_timings:
-                break
-            secho(f"\t{_format_time(response_secs)}\t{url}")
+        secho(err=True)
+        secho("Slowest responses:", err=True)
+        for response_secs, url in response_times[:show_timings]:
+            secho(f"\t{_format_time(response_secs)}\t{url}", err=True)
+
+    if report_file:
+        names = {p.name for p in index.products.get_all()} | {
+            t.name for t in index.metadata_types.get_all()
+        }
+        json.dump(latency_report(results, names), report_file, indent=2)
+        report_file.write("\n")
 
     if len(failures):
-        secho()
-        secho(f"{len(failures)} failures", fg="red")
+        secho(err=True)
+        secho(f"{len(failures)} failures", fg="red", err=True)
 
     sys.exit(len(failures))
 
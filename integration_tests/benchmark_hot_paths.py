@@ -0,0 +1,150 @@
+"""
+Benchmarks of the store, summariser and page rendering hot paths.
+
+These aren't collected with the normal tests. Run them with `make benchmark`,
+which saves the timings as json under `.benchmarks/`, so that a later run can be
+compared against them (`pytest-benchmark compare`, or `--benchmark-compare`).
+
+Each is run at a few data sizes: the sample products range from a handful of
+datasets (wofs_albers) to several hundred (high_tide_comp_20p).
+"""
+
+from datetime import datetime
+
+import pytest
+from flask.testing import FlaskClient
+
+from cubedash._stac import _handle_fields_extension, as_stac_item
+from cubedash.summary import ItemSort, SummaryStore, TimePeriodOverview
+
+METADATA_TYPES = [
+    "metadata/eo_metadata.yaml",
+]
+PRODUCTS = [
+    "products/hltc.odc-product.yaml",
+    "products/pq_count_summary.odc-product.yaml",
+    "products/wofs_albers.yaml",
+]
+DATASETS = [
+    "datasets/high_tide_comp_20p.yaml.gz",
+    # Very large (unsimplified) footprints, the worst case for the summariser.
+    "datasets/pq_count_summary.yaml.gz",
+    "datasets/wofs-albers-sample.yaml.gz",
+]
+
+# Use the 'auto_odc_db' fixture to populate the database with sample data.
+pytestmark = pytest.mark.usefixtures("auto_odc_db")
+
+# Small to large.
+SAMPLE_PRODUCTS = ["wofs_albers", "pq_count_summary", "high_tide_comp_20p"]
+
+STAC_FIELDS = {
+    "include": ["properties.eo:cloud_cover", "properties.odc:product"],
+    "exclude": ["assets", "links"],
+}
+
+
+@pytest.fixture()
+def store(client: FlaskClient, summary_store: SummaryStore) -> SummaryStore:
+    """A summary store with all sample products summarised."""
+    return summary_store
+
+
+@pytest.mark.benchmark(group="search_items")
+@pytest.mark.parametrize("limit", [10, 100, 300])
+@pytest.mark.parametrize("full_dataset", [False, True])
+def test_search_items(benchmark, store: SummaryStore, limit: int, full_dataset: bool):
+    items = benchmark(
+        lambda: list(
+            store.search_items(
+                product_names=["high_tide_comp_20p"],
+                limit=limit,
+                full_dataset=full_dataset,
+                order=ItemSort.DEFAULT_SORT,
+            )
+        )
+    )
+    assert len(items) == limit
+
+
+@pytest.mark.benchmark(group="get_count")
+@pytest.mark.parametrize("product_name", [*SAMPLE_PRODUCTS, None])
+def test_get_count(benchmark, store: SummaryStore, product_name: str):
+    product_names = [product_name] if product_name else None
+    count = benchmark(lambda: store.get_count(product_names=product_names))
+    assert count > 0
+
+
+@pytest.mark.benchmark(group="get_count")
+def test_get_count_in_bbox(benchmark, store: SummaryStore):
+    count = benchmark(
+        lambda: store.get_count(
+            product_names=["high_tide_comp_20p"], bbox=(110, -45, 155, -10)
+        )
+    )
+    assert count > 0
+
+
+@pytest.mark.benchmark(group="calculate_summary")
+@pytest.mark.parametrize("product_name", SAMPLE_PRODUCTS)
+def test_calculate_summary(benchmark, store: SummaryStore, product_name: str):
+    summary: TimePeriodOverview = benchmark(
+        lambda: store._summariser.calculate_summary(
+            product_name, (None, None, None), product_refresh_time=datetime.now()
+        )
+    )
+    assert summary.dataset_count > 0
+
+
+@pytest.mark.benchmark(group="add_periods")
+@pytest.mark.parametrize("period_count", [10, 100, 1000])
+def test_add_periods(benchmark, store: SummaryStore, period_count: int):
+    # Repeat the real product summaries, with their differing footprints, timelines
+    # and regions, to get a large but realistic set of periods to combine.
+    summaries = [store.get(product_name) for product_name in SAMPLE_PRODUCTS]
+    periods = (summaries * period_count)[:period_count]
+
+    summary = benchmark(lambda: TimePeriodOverview.add_periods(periods))
+    assert summary.dataset_count == sum(p.dataset_count for p in periods)
+
+
+@pytest.mark.benchmark(group="as_stac_item")
+@pytest.mark.parametrize("item_count", [10, 100, 300])
+def test_as_stac_item(benchmark, store: SummaryStore, item_count: int):
+    items = list(
+        store.search_items(
+            product_names=["high_tide_comp_20p"], limit=item_count, full_dataset=True
+        )
+    )
+    stac_items = benchmark(lambda: [as_stac_item(item) for item in items])
+    assert len(stac_items) == item_count
+
+
+@pytest.mark.benchmark(group="fields_extension")
+@pytest.mark.parametrize("item_count", [10, 100, 300])
+def test_fields_extension(benchmark, store: SummaryStore, item_count: int):
+    stac_items = [
+        as_stac_item(item)
+        for item in store.search_items(
+            product_names=["high_tide_comp_20p"], limit=item_count, full_dataset=True
+        )
+    ]
+    filtered = benchmark(lambda: _handle_fields_extension(stac_items, STAC_FIELDS))
+    assert len(filtered) == item_count
+
+
+@pytest.mark.benchmark(group="page_render")
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/products",
+        "/products/wofs_albers",
+        "/products/high_tide_comp_20p",
+        "/products/high_tide_comp_20p/datasets",
+        "/api/footprint/high_tide_comp_20p",
+        "/stac/search?collections=high_tide_comp_20p&limit=100",
+    ],
+)
+def test_page_render(benchmark, client: FlaskClient, url: str):
+    response = benchmark(lambda: client.get(url, follow_redirects=True))
+    assert response.status_code == 200, response.data
@@ -0,0 +1,100 @@
+"""
+Unit tests for the compact timeline and region counts of summaries
+"""
+
+import pickle
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from dateutil import tz
+
+from cubedash.summary._counters import RegionCounts, TimelineCounts
+from cubedash.summary._model import TimePeriodOverview
+
+
+def test_timeline_merge_matches_counter():
+    a = Counter({date(2017, 1, 2): 3, date(2017, 1, 1): 0})
+    b = Counter({date(2017, 1, 2): 1, date(2017, 3, 4): 2})
+
+    merged = TimelineCounts.merge([TimelineCounts.of(a), TimelineCounts.of(b)])
+    expected = a.copy()
+    expected.update(b)
+
+    assert merged == expected
+    # Sorted by day, and zero counts are kept.
+    assert list(merged.keys()) == [date(2017, 1, 1), date(2017, 1, 2), date(2017, 3, 4)]
+    assert merged[date(2017, 1, 2)] == 4
+    # Missing keys act like a Counter
+    assert merged[date(2019, 1, 1)] == 0
+    assert date(2019, 1, 1) not in merged
+    assert merged.total() == 6
+
+
+def test_timeline_keeps_timezone_of_keys():
+    darwin = tz.gettz("Australia/Darwin")
+    days = [datetime(2017, 1, 1, tzinfo=darwin), datetime(2017, 1, 2, tzinfo=darwin)]
+    timeline = TimelineCounts.from_pairs(days, [1, 2])
+
+    assert list(timeline.keys()) == days
+    assert timeline[days[1]] == 2
+
+
+def test_timeline_days_either_side_of_daylight_saving():
+    # Sydney's daylight saving ended on 2nd April 2017. Days are loaded from the
+    # database with fixed offsets, so differ either side of it.
+    sydney = tz.gettz("Australia/Sydney")
+    days = [
+        datetime(2017, 4, 1, tzinfo=timezone(timedelta(hours=11))),
+        datetime(2017, 4, 3, tzinfo=timezone(timedelta(hours=10))),
+    ]
+    expected_days = [date(2017, 4, 1), date(2017, 4, 3)]
+
+    # Each is taken as the day in its own offset...
+    timeline = TimelineCounts.from_pairs(days, [1, 2])
+    assert [d.date() for d in timeline.keys()] == expected_days
+    assert list(timeline.values()) == [1, 2]
+
+    # ... or in the grouping timezone, which gives each day its own offset again.
+    timeline = TimelineCounts.from_pairs(days, [1, 2], tzinfo=sydney)
+    assert list(timeline.keys()) == days
+    assert [d.date() for d in timeline.keys()] == expected_days
+    assert [d.utcoffset() for d in timeline.keys()] == [
+        timedelta(hours=11),
+        timedelta(hours=10),
+    ]
+    assert timeline[days[1]] == 2
+
+
+def test_timeline_grouping():
+    timeline = TimelineCounts.of(
+        Counter({date(2017, 1, 2): 3, date(2017, 1, 9): 1, date(2017, 2, 1): 0})
+    )
+    by_month = timeline.grouped("month")
+    # Empty periods are dropped, as when grouping Counter elements.
+    assert by_month == {date(2017, 1, 1): 4}
+    assert timeline.grouped("year") == {date(2017, 1, 1): 4}
+
+
+def test_large_timeline_is_grouped_by_month():
+    start = date(2016, 1, 1)
+    days = TimelineCounts.of(
+        Counter({start + timedelta(days=i): 1 for i in range(400)})
+    )
+    grouped, period = TimePeriodOverview._group_counter_if_needed(days, "day")
+    assert period == "month"
+    assert len(grouped) == 14
+    assert grouped.total() == 400
+
+
+def test_region_counts():
+    a = RegionCounts.of(Counter(["1_2", "1_2", "3_4", None]))
+    b = RegionCounts.from_pairs(["3_4", "4_5"], [1, 5])
+
+    merged = RegionCounts.merge([a, b])
+    assert merged == Counter({"1_2": 2, "3_4": 2, "4_5": 5, None: 1})
+    assert merged["unknown"] == 0
+    assert merged.get("unknown") is None
+    assert len(merged) == 4
+
+    # Interned ids are per-process, so pickles must hold the codes themselves.
+    assert pickle.loads(pickle.dumps(merged)) == merged
@@ -7,7 +7,8 @@ from pathlib import Path
 
 import pytest
 import shapely.wkt
-from shapely.geometry import shape
+from shapely.errors import GEOSException
+from shapely.geometry import Point, box, shape
 
 from cubedash.summary._model import _filter_geom, _polygon_chain
 
@@ -40,6 +41,37 @@ def test_filter_geom():
     assert _filter_geom([geom])
 
 
+def test_filter_geom_keeps_unionable_polygons():
+    overlapping = [box(i, 0, i + 1.5, 1) for i in range(11)]
+    assert _filter_geom(overlapping) == overlapping
+
+
+def test_filter_geom_removes_ununionable_polygons(monkeypatch):
+    polygons = [box(i, 0, i + 0.9, 1) for i in range(11)]
+
+    def centre(i: int) -> Point:
+        return Point(i + 0.45, 0.5)
+
+    real_union_all = shapely.union_all
+
+    def failing_union_all(geometries, **kwargs):
+        geometries = list(geometries)
+
+        def covers(i: int) -> bool:
+            return any(g.contains(centre(i)) for g in geometries)
+
+        # Polygon 4 can't be unioned at all, and 2 and 8 can't be unioned together.
+        if covers(4) or (covers(2) and covers(8)):
+            raise GEOSException("TopologyException: found non-noded intersection")
+        return real_union_all(geometries, **kwargs)
+
+    monkeypatch.setattr(shapely, "union_all", failing_union_all)
+
+    filtered = _filter_geom(polygons)
+    # The later of the conflicting pair is dropped, and the rest keep their order.
+    assert filtered == [p for i, p in enumerate(polygons) if i not in (4, 8)]
+
+
 @pytest.mark.skip("Skipping because the newer Shapely is handling geometry better.")
 def test_nested_exception(testing_polygon):
     """
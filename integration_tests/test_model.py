@@ -5,11 +5,13 @@ Tests related to the store
 from collections import Counter
 from datetime import date, datetime
 
+import shapely
 from datacube.model import Range
-from shapely.geometry import shape
+from shapely.geometry import MultiPolygon, box, shape
 from shapely.geometry.base import BaseGeometry
 
 from cubedash._model import TimePeriodOverview
+from cubedash.summary._stores import _footprint_wgs84_columns, _footprint_wgs84_levels
 from integration_tests.asserts import assert_shapes_mostly_equal
 
 ANTIMERIDIAN_POLY = shape(
@@ -173,7 +175,7 @@ def test_footprint_antimeridian(benchmark):
     """
     overview = _create_overview()
 
-    footprint_latlon = benchmark(lambda: overview.footprint_wgs84)
+    footprint_latlon = benchmark(overview._calculate_footprint_wgs84)
     assert_shapes_mostly_equal(footprint_latlon, EXPECTED_CLEAN_POLY, 0.1)
 
 
@@ -216,10 +218,69 @@ def test_footprint_normal(benchmark):
 
     o = _create_overview()
     o.footprint_geometry = normal_poly
-    res: BaseGeometry = benchmark(lambda: o.footprint_wgs84)
+    res: BaseGeometry = benchmark(o._calculate_footprint_wgs84)
     assert_shapes_mostly_equal(res, expected_poly, 0.001)
 
 
+def test_footprint_wgs84_is_cached():
+    o = _create_overview()
+    footprint = o.footprint_wgs84
+    assert o.footprint_wgs84 is footprint
+
+    # Recalculated from a replaced footprint, and from stored GeoJSON.
+    o.footprint_geometry = ANTIMERIDIAN_POLY.buffer(1000)
+    assert o.footprint_wgs84 is not footprint
+    o.footprint_wgs84_geojson = shapely.to_geojson(footprint)
+    from_geojson = o.footprint_wgs84
+    assert from_geojson is o.footprint_wgs84
+    assert_shapes_mostly_equal(from_geojson, footprint, 0.001)
+
+
+def test_footprint_levels():
+    o = _create_overview()
+    o.footprint_geometry = ANTIMERIDIAN_POLY.buffer(20_000, quad_segs=64)
+
+    columns = _footprint_wgs84_columns(o)
+    resolutions = columns["footprint_wgs84_resolutions"]
+    assert resolutions == sorted(resolutions, reverse=True), "Coarsest first"
+    assert len(columns["footprint_wgs84_coarse_geojson"]) == len(resolutions) - 1
+
+    o.footprint_wgs84_geojson = columns["footprint_wgs84_geojson"]
+    o.footprint_wgs84_coarse_geojson = columns["footprint_wgs84_coarse_geojson"]
+    o.footprint_wgs84_resolutions = resolutions
+    finest = o.footprint_wgs84_geojson
+    coarsest = o.footprint_wgs84_geojson_at(1_000_000)
+    assert len(coarsest) < len(finest)
+    assert o.footprint_wgs84_geojson_at(None) == finest
+    # Finer than anything stored: use the best we have.
+    assert o.footprint_wgs84_geojson_at(1) == finest
+
+    # Requests are snapped to the resolution of the level they'd get.
+    assert o.footprint_wgs84_resolution_at(1_000_000) == resolutions[0]
+    assert o.footprint_wgs84_resolution_at(resolutions[0] * 1.5) == resolutions[0]
+    assert o.footprint_wgs84_resolution_at(1) is None
+    assert o.footprint_wgs84_resolution_at(None) is None
+    assert_shapes_mostly_equal(
+        shapely.from_geojson(coarsest), shapely.from_geojson(finest), 0.1
+    )
+
+
+def test_footprint_levels_of_many_parts():
+    # Too many parts for the coarsest level, even at four vertices each.
+    parts = [box(i * 0.01, 0, i * 0.01 + 0.005, 0.005) for i in range(3000)]
+    footprint = MultiPolygon(parts)
+
+    levels = _footprint_wgs84_levels(footprint)
+    resolutions = [resolution for resolution, _ in levels]
+    assert resolutions == sorted(resolutions, reverse=True), "Coarsest first"
+
+    (_, coarsest), *_, (_, finest) = levels
+    assert shapely.get_num_coordinates(coarsest) <= 1_000
+    assert coarsest.covers(footprint)
+    # The finest level has room for them all.
+    assert shapely.get_num_coordinates(finest) == shapely.get_num_coordinates(footprint)
+
+
 def test_computed_properties():
     o = _create_overview()
     o.product_name = "test_product"
@@ -2,11 +2,13 @@
 Tests that load pages and check the contained text.
 """
 
+import gzip
 import json
 from datetime import datetime
 from io import StringIO
 from textwrap import indent
 
+import flask
 import pytest
 from click.testing import Result
 from dateutil import tz
@@ -16,7 +18,7 @@ from requests_html import HTML, Element
 from ruamel.yaml import YAML, YAMLError
 
 import cubedash
-from cubedash import _model, _monitoring
+from cubedash import _model, _monitoring, _pages
 from cubedash.summary import SummaryStore, _extents, show
 from integration_tests.asserts import (
     check_area,
@@ -150,6 +152,46 @@ def test_all_products_are_shown(client: FlaskClient):
     ), "Product shown in menu don't match the indexed products"
 
 
+def test_navigation_is_kept_until_products_change(client: FlaskClient):
+    with client.application.test_request_context("/ls7_nbar_scene"):
+        navigation = _pages._get_navigation()
+        assert _pages._get_navigation() is navigation
+
+    with client.application.test_request_context("/ls7_nbar_scene"):
+        assert _pages._get_navigation() is navigation
+
+        _model.STORE.refresh("ls7_nbar_scene", force=True)
+        flask.g.pop("product_versions")
+        assert _pages._get_navigation() is not navigation
+
+
+def test_product_page_loads_only_selector_fields_of_other_periods(
+    client: FlaskClient, monkeypatch
+):
+    store = _model.STORE
+    get_many = store.get_many
+    calls = []
+
+    def recording_get_many(product_name, periods, fields=None, period_fields=None):
+        if period_fields is None:
+            period_fields = [fields] * len(periods)
+        calls.append(dict(zip(map(tuple, periods), period_fields)))
+        return get_many(product_name, periods, period_fields=period_fields)
+
+    monkeypatch.setattr(store, "get_many", recording_get_many)
+    get_html(client, "/products/ls7_nbar_scene/2017")
+
+    # The periods are loaded in one query: the page's own period fully, and the
+    # all-time selector with only its own fields.
+    loaded_fields = calls[0]
+    assert loaded_fields[(2017, None, None)] is None
+    assert loaded_fields[(None, None, None)] == _pages._SELECTOR_SUMMARY_FIELDS
+    # Nothing else needed to query them again.
+    assert not any(
+        (2017, None, None) in c or (None, None, None) in c for c in calls[1:]
+    )
+
+
 def test_get_overview_product_links(client: FlaskClient):
     """
     Are the source and derived product lists being displayed?
@@ -553,6 +595,96 @@ def test_api_returns_limited_tile_regions(client: FlaskClient):
     assert len(geojson["features"]) == 0, "Unexpected wofs albers region count"
 
 
+def test_api_returns_vector_tiles(client: FlaskClient):
+    for layer in ("regions", "footprint", "datasets"):
+        url = f"/api/tiles/wofs_albers/{layer}/0/0/0.mvt"
+        rv: Response = client.get(url)
+        assert rv.status_code == 200
+        assert rv.content_type == "application/vnd.mapbox-vector-tile"
+        assert rv.data, f"Empty {layer} tile"
+
+        # A day with datasets, and one without.
+        rv = client.get(url, query_string=dict(year=2017, month=4, day=20))
+        assert rv.data, f"Empty {layer} tile for a day"
+        rv = client.get(url, query_string=dict(year=2017, month=4, day=6))
+        assert rv.data == b""
+
+    assert client.get("/api/tiles/wofs_albers/rivers/0/0/0.mvt").status_code == 404
+    assert client.get("/api/tiles/wofs_albers/regions/1/2/0.mvt").status_code == 404
+    assert client.get("/api/tiles/no_such_product/regions/0/0/0.mvt").status_code == 404
+
+
+def test_summary_responses_are_conditional(client: FlaskClient):
+    for url in (
+        "/products/wofs_albers/2017",
+        "/api/footprint/wofs_albers",
+        "/api/dataset-timeline/wofs_albers",
+        "/stac/collections",
+        "/products/wofs_albers.odc-product.yaml",
+    ):
+        rv: Response = client.get(url)
+        assert rv.status_code == 200, url
+        etag = rv.headers["ETag"]
+        assert rv.last_modified is not None, url
+
+        # Unchanged summaries aren't sent again.
+        rv = client.get(url, headers={"If-None-Match": etag})
+        assert rv.status_code == 304, url
+        assert rv.data == b""
+        assert rv.headers["ETag"] == etag
+        rv = client.get(url, headers={"If-Modified-Since": rv.headers["Last-Modified"]})
+        assert rv.status_code == 304, url
+
+        # Other versions are.
+        rv = client.get(url, headers={"If-None-Match": 'W/"some-other-version"'})
+        assert rv.status_code == 200, url
+
+    # Unknown products are left to the view.
+    rv = client.get("/api/dataset-timeline/no_such_product")
+    assert rv.status_code == 404
+    assert "ETag" not in rv.headers
+
+
+def test_api_serves_precompressed_bodies(client: FlaskClient):
+    # Bodies are only compressed when they're cached.
+    caching_client = cubedash.create_app(
+        {
+            "TESTING": True,
+            "CACHE_TYPE": "SimpleCache",
+            "CUBEDASH_DEFAULT_TIMEZONE": "Australia/Darwin",
+        }
+    ).test_client()
+
+    for url in (
+        "/api/footprint/ls8_level1_scene",
+        "/api/regions/ls8_level1_scene",
+        "/stac/collections",
+    ):
+        plain: Response = caching_client.get(url)
+        assert plain.status_code == 200, url
+        assert "Content-Encoding" not in plain.headers
+        assert "Accept-Encoding" in plain.vary
+
+        rv: Response = caching_client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert rv.headers["Content-Encoding"] == "gzip", url
+        assert gzip.decompress(rv.data) == plain.data
+        assert len(rv.data) < len(plain.data)
+
+    # Query arguments aren't part of the cached body, so can't fill the cache.
+    rv: Response = caching_client.get("/stac/collections?x=1")
+    assert rv.data == caching_client.get("/stac/collections").data
+
+
+def test_warm_up_ignores_unreadable_snapshot(client: FlaskClient, tmp_path):
+    snapshot_path = tmp_path / "explorer.snapshot"
+    snapshot_path.write_bytes(b"\x80\x05\x95truncated")
+    client.application.config["CUBEDASH_CACHE_SNAPSHOT"] = str(snapshot_path)
+
+    # Warms from the database instead.
+    _model.warm_up(client.application)
+    check_dataset_count(get_html(client, "/wofs_albers"), 11)
+
+
 def test_api_returns_timelines(client: FlaskClient):
     """
     Covers most of the 'normal' products: they have a footprint, bounds and a simple crs epsg code.
@@ -87,6 +87,20 @@ def test_add_period_list():
     assert sorted(joined.region_dataset_counts.keys()) == ["1_2", "3_4", "4_5"]
 
 
+def test_add_periods_repairs_invalid_footprints():
+    # A self-intersecting "bowtie": two triangles of 25 units each.
+    bowtie = _overview()
+    bowtie.footprint_geometry = geo.Polygon([(0, 0), (10, 10), (10, 0), (0, 10)])
+    assert not bowtie.footprint_geometry.is_valid
+    square = _overview()
+    square.footprint_geometry = geo.box(20, 0, 30, 10)
+
+    joined = TimePeriodOverview.add_periods([bowtie, square], footprint_tolerance=None)
+    assert joined.footprint_geometry.is_valid
+    assert joined.footprint_geometry.area == pytest.approx(150)
+    assert joined.footprint_count == bowtie.footprint_count + square.footprint_count
+
+
 def test_srid_calcs():
     o = _overview()
     assert o.footprint_crs == "EPSG:3577"
@@ -4,22 +4,33 @@ Load a lot of real-world DEA datasets (very slow)
 And then check their statistics match expected.
 """
 
+import tracemalloc
 from datetime import datetime, timedelta
 from uuid import UUID
 
+import orjson
 import pytest
 from datacube import Datacube
 from datacube.index import Index
 from datacube.model import DatasetType, Range
 from dateutil import tz
 from dateutil.tz import tzutc
+from sqlalchemy import func, select
 
 from cubedash import _utils
-from cubedash._utils import alchemy_engine
-from cubedash.summary import SummaryStore
+from cubedash._utils import ODC_DATASET, alchemy_engine
+from cubedash.summary import FootprintUnionSettings, SummaryStore, _extents, _stores
 from cubedash.summary._extents import GridRegionInfo
-from cubedash.summary._schema import CUBEDASH_SCHEMA
-
+from cubedash.summary._model import EncodedGeometry
+from cubedash.summary._profile import RefreshProfile, summarise_phases
+from cubedash.summary._schema import (
+    CUBEDASH_SCHEMA,
+    DATASET_SPATIAL,
+    EXTENT_REFRESH_CHECKPOINT,
+)
+from cubedash.summary._watch import DatasetChangeWatcher
+
+from .asserts import assert_shapes_mostly_equal
 from .asserts import expect_values as _expect_values
 
 DEFAULT_TZ = tz.gettz("Australia/Darwin")
@@ -132,6 +143,188 @@ def test_generate_scene_all_time(run_generate, summary_store: SummaryStore):
     )
 
 
+@pytest.mark.parametrize("year", [2017, None])
+def test_sql_rollup_matches_python(
+    run_generate, summary_store: SummaryStore, year: int
+):
+    """
+    Year and whole-product summaries are combined within Postgres. They should
+    match the (original) Python implementation.
+    """
+    run_generate("ls8_nbar_scene")
+    product = summary_store.get_product_summary("ls8_nbar_scene")
+    refresh_time = product.last_refresh_time
+
+    from_python = summary_store._put_rollup_from_python(product, year, refresh_time)
+    from_sql = summary_store._put_rollup(product, year, refresh_time)
+
+    assert from_sql.period_tuple == from_python.period_tuple
+    for field in (
+        "dataset_count",
+        "timeline_period",
+        "timeline_dataset_counts",
+        "region_dataset_counts",
+        "time_range",
+        "footprint_count",
+        "newest_dataset_creation_time",
+        "crses",
+        "size_bytes",
+        "footprint_crs",
+    ):
+        assert getattr(from_sql, field) == getattr(from_python, field), field
+
+    # Unions of the same shapes, within float differences.
+    assert from_sql.footprint_geometry.symmetric_difference(
+        from_python.footprint_geometry
+    ).area < (from_python.footprint_geometry.area * 0.001)
+
+
+def test_get_summary_fields(run_generate, summary_store: SummaryStore):
+    """
+    Summaries can be loaded without their larger fields, and footprints are only
+    decoded when used.
+    """
+    run_generate("ls8_nbar_scene")
+    full = summary_store.get("ls8_nbar_scene", 2017)
+    assert isinstance(full.__dict__["_footprint_geometry"], EncodedGeometry)
+    assert full.footprint_geometry.is_valid
+    assert not isinstance(full.__dict__["_footprint_geometry"], EncodedGeometry)
+
+    light = summary_store.get(
+        "ls8_nbar_scene", 2017, fields=("timeline_dataset_counts",)
+    )
+    assert light.dataset_count == full.dataset_count
+    assert light.timeline_dataset_counts == full.timeline_dataset_counts
+    assert light.region_dataset_counts is None
+    assert light.footprint_geometry is None
+    assert light.footprint_crs == full.footprint_crs
+
+    with pytest.raises(ValueError):
+        summary_store.get("ls8_nbar_scene", 2017, fields=("crses",))
+
+
+def test_stored_wgs84_footprints(run_generate, summary_store: SummaryStore):
+    run_generate("ls8_nbar_scene")
+    # Months are written from Python, years and the whole product from Postgres.
+    for period in [(2017, 4, None), (2017, None, None), (None, None, None)]:
+        summary = summary_store.get(
+            "ls8_nbar_scene", *period, fields=("footprint_wgs84_geojson",)
+        )
+        assert summary.footprint_wgs84_geojson, f"No stored footprint for {period}"
+        assert summary.footprint_geometry is None
+
+        stored = summary.footprint_wgs84
+        summary.footprint_wgs84_geojson = None
+        summary.footprint_geometry = summary_store.get(
+            "ls8_nbar_scene", *period
+        ).footprint_geometry
+        assert_shapes_mostly_equal(stored, summary.footprint_wgs84, 0.01)
+
+
+def test_get_many_summaries(run_generate, summary_store: SummaryStore):
+    run_generate("ls8_nbar_scene")
+    periods = [
+        (2017, 4, None),
+        (None, None, None),
+        (2017, None, None),
+        (2009, None, None),
+    ]
+    summaries = summary_store.get_many("ls8_nbar_scene", periods)
+
+    # Same order, with None for periods that have no summary.
+    assert summaries[-1] is None
+    for period, summary in zip(periods[:-1], summaries):
+        single = summary_store.get("ls8_nbar_scene", *period)
+        assert summary.period_tuple == single.period_tuple
+        assert summary.dataset_count == single.dataset_count
+        assert summary.timeline_dataset_counts == single.timeline_dataset_counts
+
+    assert summary_store.get_many("no_such_product", periods) == [None] * 4
+
+
+def test_get_all_product_summaries(run_generate, summary_store: SummaryStore):
+    run_generate("ls8_nbar_scene")
+    summary_store.clear_product_caches()
+
+    summaries = summary_store.get_all_product_summaries()
+    scene = summaries["ls8_nbar_scene"]
+    assert scene.dataset_count == summary_store.get("ls8_nbar_scene").dataset_count
+    # The single lookups match, and use the same cached results.
+    assert summary_store.get_product_summary("ls8_nbar_scene") is scene
+
+    assert summary_store.list_complete_products() == sorted(
+        name for name in summaries if summary_store.has(name, None, None, None)
+    )
+    assert "ls8_nbar_scene" in summary_store.list_complete_products()
+
+
+def test_product_versions_change_on_refresh(run_generate, summary_store: SummaryStore):
+    run_generate("ls8_nbar_scene")
+    summary_store.clear_product_caches()
+    original_versions = summary_store.get_product_versions()
+    original = summary_store.get_product_summary("ls8_nbar_scene")
+    # Unchanged, so the cached summary is still used.
+    assert summary_store.get_product_versions() == original_versions
+    assert summary_store.get_product_summary("ls8_nbar_scene") is original
+
+    run_generate("ls8_nbar_scene", "--force-refresh")
+    versions = summary_store.get_product_versions()
+    assert versions["ls8_nbar_scene"] != original_versions["ls8_nbar_scene"]
+    # ... and the outdated cached summary is forgotten.
+    refreshed = summary_store.get_product_summary("ls8_nbar_scene")
+    assert refreshed.last_refresh_time > original.last_refresh_time
+
+
+def test_snapshot_has_current_products(
+    run_generate, summary_store: SummaryStore, tmp_path
+):
+    run_generate("ls8_nbar_scene")
+    snapshot_path = tmp_path / "explorer.snapshot"
+    summary_store.write_snapshot(snapshot_path)
+
+    overviews = summary_store.read_snapshot(snapshot_path)
+    assert "ls8_nbar_scene" in overviews
+    # They're read back as they were stored.
+    from_snapshot, stored = (
+        overviews["ls8_nbar_scene"],
+        summary_store.get("ls8_nbar_scene"),
+    )
+    assert from_snapshot.dataset_count == stored.dataset_count
+    assert from_snapshot.time_range == stored.time_range
+    assert from_snapshot.timeline_dataset_counts == stored.timeline_dataset_counts
+    assert from_snapshot.footprint_crs == stored.footprint_crs
+    assert from_snapshot.footprint_geometry.equals(stored.footprint_geometry)
+
+    # Refreshed products are no longer current.
+    run_generate("ls8_nbar_scene", "--force-refresh")
+    assert "ls8_nbar_scene" not in summary_store.read_snapshot(snapshot_path)
+
+
+def test_snapshot_of_other_version_is_ignored(
+    run_generate, summary_store: SummaryStore, tmp_path, monkeypatch
+):
+    run_generate("ls8_nbar_scene")
+    snapshot_path = tmp_path / "explorer.snapshot"
+    summary_store.write_snapshot(snapshot_path)
+
+    monkeypatch.setattr(_stores, "explorer_version", "0.0.0-other")
+    assert summary_store.read_snapshot(snapshot_path) == {}
+
+
+def test_unreadable_snapshot(summary_store: SummaryStore, tmp_path):
+    snapshot_path = tmp_path / "explorer.snapshot"
+    for content in (
+        b"",
+        # Old snapshots were pickles.
+        b"\x80\x04K\x01.",
+        b"[]",
+        orjson.dumps(dict(explorer_version=_stores.explorer_version)),
+    ):
+        snapshot_path.write_bytes(content)
+        with pytest.raises(ValueError):
+            summary_store.read_snapshot(snapshot_path)
+
+
 def test_generate_incremental_archivals(run_generate, summary_store: SummaryStore):
     run_generate("ls8_nbar_scene")
     index = summary_store.index
@@ -164,6 +357,45 @@ def test_generate_incremental_archivals(run_generate, summary_store: SummaryStor
     ), "A dataset that was restored from archival was not refreshed by Explorer"
 
 
+def test_idle_products_are_skipped(run_generate, summary_store: SummaryStore):
+    """
+    Products without dataset changes since their last refresh are found in one
+    pre-scan, and have their refresh time bumped.
+    """
+    run_generate("--all")
+    index = summary_store.index
+    # The test datasets were all indexed moments ago.
+    summary_store.dataset_overlap_carefulness = timedelta(0)
+    product_names = {p.name for p in summary_store.all_dataset_types()}
+    summarised = {
+        name for name in product_names if summary_store.get_product_summary(name)
+    }
+    original_refresh = summary_store.get_product_summary("ls8_nbar_albers")
+    original_version = summary_store.get_product_versions()["ls8_nbar_albers"]
+
+    dataset_id = _one_dataset(index, "ls8_nbar_scene")
+    index.datasets.archive([dataset_id])
+    try:
+        idle_products = summary_store.mark_idle_products_refreshed(product_names)
+        assert idle_products == summarised - {"ls8_nbar_scene"}
+
+        bumped_refresh = summary_store.get_product_summary("ls8_nbar_albers")
+        assert bumped_refresh.last_refresh_time > original_refresh.last_refresh_time
+        assert (
+            bumped_refresh.last_successful_summary_time
+            == bumped_refresh.last_refresh_time
+        )
+        # Its summaries are unchanged, so cached responses are still current.
+        versions = summary_store.get_product_versions()
+        assert versions["ls8_nbar_albers"] == original_version
+    finally:
+        index.datasets.restore([dataset_id])
+
+    # A normal run will then refresh only the changed product.
+    run_generate("--all")
+    assert summary_store.mark_idle_products_refreshed(product_names) == summarised
+
+
 def _one_dataset(index: Index, product_name: str):
     [[dataset_id]] = index.datasets.search_returning(
         ("id",), product=product_name, limit=1
@@ -220,6 +452,168 @@ def test_dataset_changing_product(run_generate, summary_store: SummaryStore):
     ), "Expected dataset to be added again after the product changed back"
 
 
+def test_watcher_reports_changed_products(summary_store: SummaryStore):
+    """
+    The change watcher should hear about datasets changed in ODC, batched by product.
+    """
+    index = summary_store.index
+    watcher = DatasetChangeWatcher(summary_store, debounce=timedelta(seconds=0.5))
+    watcher.start()
+    try:
+        assert watcher.is_listening, "Expected init to install the change trigger"
+
+        dataset_id = _one_dataset(index, "ls8_nbar_scene")
+        index.datasets.archive([dataset_id])
+        index.datasets.restore([dataset_id])
+
+        changed_product_ids = next(watcher.batches())
+        assert changed_product_ids == {index.products.get_by_name("ls8_nbar_scene").id}
+    finally:
+        watcher.close()
+
+
+def test_plan_refresh(run_generate, summary_store: SummaryStore):
+    """
+    A refresh plan should report outstanding work without doing any of it.
+    """
+    dataset_count = summary_store.index.datasets.count(product="ls8_nbar_scene")
+
+    plan = summary_store.plan_refresh("ls8_nbar_scene")
+    assert plan.is_new
+    assert plan.scan_changes_since is None
+    assert plan.changed_dataset_count == dataset_count
+    assert sum(count for _, count in plan.months) == dataset_count
+    assert len(plan.months) == 24
+    assert plan.years == [2016, 2017]
+    # No history to estimate from.
+    assert plan.estimated_duration is None
+
+    # Planning (via the cli too) didn't generate anything.
+    run_generate("--plan", "--plan-format", "json", "ls8_nbar_scene")
+    assert summary_store.get_product_summary("ls8_nbar_scene") is None
+
+    run_generate("ls8_nbar_scene")
+
+    # Nothing has changed since, so there's nothing to regenerate.
+    plan = summary_store.plan_refresh("ls8_nbar_scene")
+    assert not plan.is_new
+    assert plan.scan_changes_since is not None
+    assert plan.months == []
+    assert plan.years == []
+    # ... and the previous run gives us history to estimate from.
+    assert plan.estimated_duration is not None
+
+    # Forcing would redo it all.
+    plan = summary_store.plan_refresh("ls8_nbar_scene", force=True)
+    assert plan.changed_dataset_count == dataset_count
+    assert len(plan.months) == 24
+
+
+def test_refresh_profile(summary_store: SummaryStore):
+    """
+    A refresh should measure each of its phases.
+    """
+    profile = RefreshProfile("ls8_nbar_scene", trace_memory=True)
+    summary_store.refresh("ls8_nbar_scene", profile=profile)
+
+    phases = {m.phase for m in profile.phases}
+    assert {
+        "spatial_archival",
+        "spatial_update",
+        "spatial_insert",
+        "linked_products",
+        "fixed_metadata",
+        "regions",
+        "month",
+        "year",
+        "product",
+    } <= phases
+
+    dataset_count = summary_store.index.datasets.count(product="ls8_nbar_scene")
+    [insert] = [m for m in profile.phases if m.phase == "spatial_insert"]
+    assert insert.rows == dataset_count
+    assert all(m.peak_memory_bytes is not None for m in profile.phases)
+    # Tracing is turned off again afterwards.
+    assert not tracemalloc.is_tracing()
+
+    totals = {
+        total.phase: (total, count) for total, count in summarise_phases(profile.phases)
+    }
+    month_total, month_count = totals["month"]
+    assert month_count == 24
+    assert month_total.rows == dataset_count
+    assert totals["product"][0].rows == dataset_count
+
+
+def test_extent_refresh_batches_and_resumes(summary_store: SummaryStore):
+    """
+    Dataset extents are refreshed in committed batches, and an unfinished
+    refresh is resumed.
+    """
+    index = summary_store.index
+    engine = alchemy_engine(index)
+    product = index.products.get_by_name("ls8_nbar_scene")
+    dataset_count = index.datasets.count(product=product.name)
+
+    def spatial_count():
+        return engine.execute(
+            select([func.count()]).where(
+                DATASET_SPATIAL.c.dataset_type_ref == product.id
+            )
+        ).scalar()
+
+    def checkpoint():
+        return engine.execute(
+            select([EXTENT_REFRESH_CHECKPOINT]).where(
+                EXTENT_REFRESH_CHECKPOINT.c.dataset_type_ref == product.id
+            )
+        ).fetchone()
+
+    # Many small batches give the same result as one, and leave no checkpoint.
+    changed = _extents.refresh_spatial_extents(index, product, batch_size=100)
+    assert changed == dataset_count
+    assert spatial_count() == dataset_count
+    assert checkpoint() is None
+
+    # Pretend an earlier full refresh was interrupted halfway.
+    [[last_change_time, last_dataset_id]] = engine.execute(
+        select([_extents.dataset_changed_expression(), ODC_DATASET.c.id])
+        .where(ODC_DATASET.c.dataset_type_ref == product.id)
+        .where(ODC_DATASET.c.archived.is_(None))
+        .order_by(_extents.dataset_changed_expression(), ODC_DATASET.c.id)
+        .offset(dataset_count // 2)
+        .limit(1)
+    ).fetchall()
+    with engine.begin() as conn:
+        _extents._save_checkpoint(
+            conn, product, None, (last_change_time, last_dataset_id), 7
+        )
+
+    # An incremental refresh with nothing new should continue the interrupted one,
+    # (including its unsummarised changes) ...
+    changed = _extents.refresh_spatial_extents(
+        index,
+        product,
+        assume_after_date=summary_store._database_time_now(),
+        batch_size=100,
+    )
+    assert changed == 7 + (dataset_count - dataset_count // 2 - 1)
+    # ... and finish it.
+    assert checkpoint() is None
+    assert spatial_count() == dataset_count
+
+    # A forced refresh doesn't resume one: it starts again from the beginning.
+    with engine.begin() as conn:
+        _extents._save_checkpoint(
+            conn, product, None, (last_change_time, last_dataset_id), 7
+        )
+    changed = _extents.refresh_spatial_extents(
+        index, product, batch_size=100, resume=False
+    )
+    assert changed == dataset_count
+    assert checkpoint() is None
+
+
 def _change_dataset_product(index: Index, dataset_id: UUID, other_product: DatasetType):
     rows_changed = (
         _utils.alchemy_engine(index)
@@ -321,6 +715,73 @@ def test_sampled_product_fixed_fields(summary_store: SummaryStore):
     }
 
 
+@pytest.mark.parametrize(
+    "union_settings",
+    [
+        FootprintUnionSettings(grid_size_metres=30),
+        FootprintUnionSettings(grid_size_metres=30, is_coverage=True),
+    ],
+)
+def test_reduced_footprint_union_matches_exact(
+    summary_store: SummaryStore, union_settings: FootprintUnionSettings
+):
+    """
+    Precision-reduced (and coverage) footprint unions should look the same as an
+    exact union at map scale.
+    """
+    summary_store.refresh_product_extent("ls8_nbar_albers")
+    summariser = summary_store._summariser
+    refresh_time = datetime.now(tz=tzutc())
+
+    exact = summariser.calculate_summary(
+        "ls8_nbar_albers", (2017, 4, None), refresh_time
+    )
+
+    summariser.footprint_union = {"ls8_nbar_albers": union_settings}
+    try:
+        reduced = summariser.calculate_summary(
+            "ls8_nbar_albers", (2017, 4, None), refresh_time
+        )
+    finally:
+        summariser.footprint_union = {}
+
+    assert reduced.dataset_count == exact.dataset_count
+    assert reduced.size_bytes == exact.size_bytes
+    assert reduced.footprint_crs == exact.footprint_crs
+    assert reduced.footprint_geometry.is_valid
+    assert reduced.footprint_geometry.symmetric_difference(
+        exact.footprint_geometry
+    ).area < (exact.footprint_geometry.area * 0.001)
+
+
+def test_invalid_coverage_falls_back_to_union(summary_store: SummaryStore):
+    """
+    Regions that overlap aren't a coverage, so are unioned normally instead.
+    """
+    # Neighbouring Landsat scenes overlap.
+    summary_store.refresh_product_extent("ls8_nbar_scene")
+    summariser = summary_store._summariser
+    refresh_time = datetime.now(tz=tzutc())
+
+    exact = summariser.calculate_summary(
+        "ls8_nbar_scene", (2017, None, None), refresh_time
+    )
+
+    summariser.footprint_union = {
+        "ls8_nbar_scene": FootprintUnionSettings(is_coverage=True)
+    }
+    try:
+        fallback = summariser.calculate_summary(
+            "ls8_nbar_scene", (2017, None, None), refresh_time
+        )
+    finally:
+        summariser.footprint_union = {}
+
+    assert fallback.dataset_count == exact.dataset_count
+    assert fallback.footprint_geometry.is_valid
+    assert fallback.footprint_geometry.equals(exact.footprint_geometry)
+
+
 def test_generate_empty_time(run_generate, summary_store: SummaryStore):
     run_generate("ls8_nbar_albers")
     # No datasets in 2018
@@ -394,6 +855,34 @@ def test_generate_telemetry(run_generate, summary_store: SummaryStore):
     )
 
 
+def test_telemetry_synthesis_only_changed(summary_store: SummaryStore):
+    """
+    Path/row footprints are only synthesized for changed datasets, and
+    shared path/row ranges are only unioned once.
+    """
+    index = summary_store.index
+    product = index.products.get_by_name("ls8_satellite_telemetry_data")
+    dataset_count = index.datasets.count(product=product.name)
+
+    summary_store.refresh_product_extent(product.name)
+
+    _extents._path_row_footprint.cache_clear()
+    assert (
+        _extents._synthesize_path_row_footprints(alchemy_engine(index), product, None)
+        == dataset_count
+    )
+    # Some datasets share a path/row range.
+    assert _extents._path_row_footprint.cache_info().hits > 0
+
+    # Nothing has changed since now.
+    assert (
+        _extents._synthesize_path_row_footprints(
+            alchemy_engine(index), product, summary_store._database_time_now()
+        )
+        == 0
+    )
+
+
 def test_generate_day(run_generate, summary_store: SummaryStore):
     run_generate("ls8_nbar_albers")
 
@@ -32,6 +32,7 @@ extras_require = {
         # Performance
         "ciso8601",
         "bottleneck",
+        "brotli",
         # The default run.sh and docs use gunicorn+meinheld
         "gunicorn>=22.0.0",
         "setproctitle",
@@ -91,7 +92,7 @@ setup(
         "python-dateutil",
         "orjson>=3",
         "sentry-sdk[flask]",
-        "shapely",
+        "shapely>=2",
         "simplekml",
         "sqlalchemy>=1.4",
         "structlog>=20.2.0",